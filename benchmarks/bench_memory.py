@@ -0,0 +1,54 @@
+"""
+統計レコードのメモリ使用量のベンチマーク
+ProcessStat / SystemStat を履歴として保持したときの1件あたりのメモリ使用量を tracemalloc で計測する
+別のコミットで同じスクリプトを実行すれば、レコード表現の変更による差を比較できる
+
+    python benchmarks/bench_memory.py [--count N]
+"""
+import argparse
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pidstat import PidStatFile, SystemStatFile  # noqa: E402
+
+TESTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests")
+
+
+def measure(label: str, factory, count: int) -> float:
+    """factory() で作ったオブジェクトを count 個保持したときの1個あたりのバイト数を表示する"""
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    history = [factory() for _ in range(count)]
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert all(item is not None for item in history)
+    per_object = (after - before) / count
+    print(f"{label:<32s} {per_object:>10,.0f} bytes/sample")
+    return per_object
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark memory used by stat records.")
+    p.add_argument("--count", type=int, default=20000, help="Number of records to keep.")
+    args = p.parse_args()
+
+    with open(os.path.join(TESTS_DIR, "pid1_stat_test_data.txt")) as f:
+        pid_stat = f.read()
+    with open(os.path.join(TESTS_DIR, "sys_stat_test_data.txt")) as f:
+        sys_stat = f.read().splitlines()
+
+    per_process = measure("ProcessStat", lambda: PidStatFile._parse(1, pid_stat), args.count)
+    measure(
+        f"SystemStat ({sum(line.startswith('cpu') for line in sys_stat) - 1} cpus)",
+        lambda: SystemStatFile._parse(sys_stat),
+        args.count // 10,
+    )
+    # 例: 1,000 PID を 1Hz で 5 分間保持した場合
+    print(f"1,000 PIDs x 300 samples: {per_process * 1000 * 300 / 1024 / 1024:,.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
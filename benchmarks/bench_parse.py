@@ -0,0 +1,49 @@
+"""
+/proc/[pid]/stat パーサのベンチマーク
+tests/pid1_stat_test_data.txt を使って、PidStatFile._parse (全フィールド) と
+PidStatFile.parse_fields (必要なフィールドだけ) の1秒あたりのパース回数を比較する
+
+    python benchmarks/bench_parse.py [--number N]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pidstat import PidStatFile  # noqa: E402
+from pidstat import STAT_FIELD_USER, STAT_FIELD_SYSTEM, STAT_FIELD_START_TIME, STAT_FIELD_RSS  # noqa: E402
+
+TEST_STAT_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests", "pid1_stat_test_data.txt"
+)
+
+
+def bench(label: str, func, number: int):
+    # 一番速かった回を採用する
+    best = min(timeit.repeat(func, number=number, repeat=5))
+    print(f"{label:<44s} {number / best:>12,.0f} parses/s")
+    return number / best
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark /proc/[pid]/stat parsers.")
+    p.add_argument("--number", type=int, default=100000, help="Parses per repeat.")
+    args = p.parse_args()
+
+    with open(TEST_STAT_FILE, "rb") as f:
+        data = f.read()
+    text = data.decode()
+
+    cpu_fields = (STAT_FIELD_USER, STAT_FIELD_SYSTEM)
+    sample_fields = (STAT_FIELD_USER, STAT_FIELD_SYSTEM, STAT_FIELD_START_TIME, STAT_FIELD_RSS)
+
+    full = bench("_parse (full ProcessStat)", lambda: PidStatFile._parse(1, text), args.number)
+    fast = bench("parse_fields (utime, stime)", lambda: PidStatFile.parse_fields(data, cpu_fields), args.number)
+    bench("parse_fields (utime, stime, starttime, rss)", lambda: PidStatFile.parse_fields(data, sample_fields), args.number)
+    print(f"speedup (utime, stime): {fast / full:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+ParallelScanner のスケーリングのベンチマーク
+/proc の全PIDを読み込む1 tick の時間を、ワーカー数 1..N とスレッド/プロセスプールで比較する
+PID数が少ない環境では --multiply で同じPIDを繰り返して読み込み数を増やせる
+
+    python benchmarks/bench_scan.py [--max-workers N] [--multiply M] [--ticks T]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pidstat import ParallelScanner, list_pids  # noqa: E402
+
+
+def bench(pids, workers: int, mode: str, ticks: int) -> float:
+    """1 tick の時間(秒)の中央値を返す"""
+    with ParallelScanner(workers, mode) as scanner:
+        # ワーカーの起動時間を含めないように1回空回しする
+        scanner.scan(pids)
+        durations = []
+        for _ in range(ticks):
+            start = time.perf_counter()
+            scanner.scan(pids)
+            durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark parallel /proc scanning.")
+    p.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    p.add_argument("--multiply", type=int, default=1, help="Read every PID this many times per tick.")
+    p.add_argument("--ticks", type=int, default=5)
+    args = p.parse_args()
+
+    pids = list_pids() * args.multiply
+    print(f"{len(pids)} reads per tick")
+    workers_list = sorted({1, 2, 4, 8, 16, 32, args.max_workers} & set(range(1, args.max_workers + 1)))
+    for mode in ParallelScanner.MODES:
+        baseline = None
+        for workers in workers_list:
+            duration = bench(pids, workers, mode, args.ticks)
+            baseline = baseline or duration
+            print(
+                f"{mode:<8s} workers={workers:<3d} {duration * 1000:>9.2f} ms/tick "
+                f"{len(pids) / duration:>12,.0f} reads/s  x{baseline / duration:.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
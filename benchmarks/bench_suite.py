@@ -0,0 +1,169 @@
+"""
+偽の procfs を使ったベンチマーク一式
+benchmarks/fake_procfs.py で作った procfs を読み込み、次の値を測定して JSON で保存する
+- パースのスループット (PidStatFile._parse / parse_fields / SystemStatFile._parse)
+- 1 tick のレイテンシ (AllProcessSampler をキャッシュあり/なし、ThreadSampler)
+- 1 tick で確保したメモリのピーク (tracemalloc) と最大RSS
+
+保存した JSON を比較するとコミット間での性能の劣化がわかる
+
+    python benchmarks/bench_suite.py [--processes 1000,10000] [--threads 4] [--cpus 8] [--output FILE]
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pidstat  # noqa: E402
+from pidstat import AllProcessSampler, ThreadSampler, StatFileCache, PidStatFile, SystemStatFile  # noqa: E402
+from pidstat import STAT_FIELD_USER, STAT_FIELD_SYSTEM, STAT_FIELD_START_TIME  # noqa: E402
+from benchmarks.fake_procfs import make_fake_procfs  # noqa: E402
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def git_commit() -> str:
+    """ベンチマークを取ったコミットを返す。git がなければ空文字列"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def peak_rss_bytes() -> int:
+    # Linux の ru_maxrss は kB 単位
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def bench_parse(root: str, pid: int, number: int) -> Dict[str, float]:
+    """1秒あたりのパース回数を返す"""
+    with open(os.path.join(root, str(pid), "stat"), "rb") as f:
+        data = f.read()
+    with open(os.path.join(root, "stat")) as f:
+        lines = f.read().splitlines()
+    text = data.decode()
+    fields = [STAT_FIELD_USER, STAT_FIELD_SYSTEM, STAT_FIELD_START_TIME]
+    targets = {
+        "pid_stat_parse": lambda: PidStatFile._parse(pid, text),
+        "pid_stat_parse_fields": lambda: PidStatFile.parse_fields(data, fields),
+        "system_stat_parse": lambda: SystemStatFile._parse(lines),
+        "system_stat_parse_cpu_only": lambda: SystemStatFile._parse(lines, cpu_only=True),
+    }
+    # 一番速かった回を採用する
+    return {name: number / min(timeit.repeat(func, number=number, repeat=5)) for name, func in targets.items()}
+
+
+def bench_ticks(sample: Callable[[], object], ticks: int) -> Dict[str, float]:
+    """1 tick のレイテンシと、1 tick で確保したメモリのピークを返す"""
+    # 最初の tick は基準スナップショットとファイルを開く時間を含むので別に測る
+    start = time.perf_counter()
+    sample()
+    first = time.perf_counter() - start
+
+    durations = []
+    for _ in range(ticks):
+        start = time.perf_counter()
+        sample()
+        durations.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    sample()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "first_tick_ms": first * 1000,
+        "median_tick_ms": statistics.median(durations) * 1000,
+        "max_tick_ms": max(durations) * 1000,
+        "tick_alloc_peak_bytes": peak,
+    }
+
+
+def bench_samplers(threads: bool, ticks: int) -> Dict[str, Dict[str, float]]:
+    results = {}
+    results["all_process"] = bench_ticks(AllProcessSampler().sample, ticks)
+    with StatFileCache() as cache:
+        results["all_process_cached"] = bench_ticks(AllProcessSampler(cache).sample, ticks)
+    if threads:
+        with StatFileCache() as cache:
+            results["thread_cached"] = bench_ticks(ThreadSampler(cache=cache, all_processes=True).sample, ticks)
+    return results
+
+
+def run(processes: int, threads: int, cpus: int, ticks: int, number: int) -> Dict[str, object]:
+    with tempfile.TemporaryDirectory(prefix="fake_procfs_") as root:
+        pids = make_fake_procfs(root, processes, threads, cpus)
+        previous_root = pidstat.PROC_ROOT
+        pidstat.set_proc_root(root)
+        try:
+            result = {
+                "processes": processes,
+                "threads": threads,
+                "cpus": cpus,
+                "parse_per_second": bench_parse(root, pids[0], number),
+                "samplers": bench_samplers(threads > 1, ticks),
+                "peak_rss_bytes": peak_rss_bytes(),
+            }
+        finally:
+            pidstat.set_proc_root(previous_root)
+    return result
+
+
+def print_result(result: Dict[str, object]):
+    print(f"processes={result['processes']} threads={result['threads']} cpus={result['cpus']}")
+    for name, value in result["parse_per_second"].items():
+        print(f"  {name:<32s} {value:>12,.0f} parses/s")
+    for name, values in result["samplers"].items():
+        print(
+            f"  {name:<32s} {values['median_tick_ms']:>9.2f} ms/tick "
+            f"(first {values['first_tick_ms']:.2f} ms, max {values['max_tick_ms']:.2f} ms) "
+            f"alloc peak {values['tick_alloc_peak_bytes'] / 1024:,.0f} KiB"
+        )
+    print(f"  {'peak rss':<32s} {result['peak_rss_bytes'] / 1024 / 1024:>9.1f} MiB")
+
+
+def _counts(value: str) -> List[int]:
+    return [int(count) for count in value.split(",")]
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark pidstat against a fake procfs tree.")
+    p.add_argument("--processes", type=_counts, default=[1000, 10000], help="Comma separated process counts.")
+    p.add_argument("--threads", type=int, default=1, help="Threads per process.")
+    p.add_argument("--cpus", type=int, default=8)
+    p.add_argument("--ticks", type=int, default=5)
+    p.add_argument("--number", type=int, default=10000, help="Parses per repetition.")
+    p.add_argument("--output", help="Write the results to this JSON file.")
+    args = p.parse_args()
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "results": [],
+    }
+    for processes in args.processes:
+        result = run(processes, args.threads, args.cpus, args.ticks, args.number)
+        print_result(result)
+        report["results"].append(result)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"saved {args.output}")
+
+
+if __name__ == "__main__":
+    main()
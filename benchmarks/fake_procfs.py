@@ -0,0 +1,183 @@
+"""
+ベンチマークとテスト用の偽の procfs を作る
+pidstat.set_proc_root() で作成したディレクトリを指定すると /proc の代わりに読み込む
+
+    python benchmarks/fake_procfs.py DIR [--processes N] [--threads N] [--cpus N]
+"""
+import argparse
+import os
+import random
+from typing import List, Sequence, Union
+
+# /proc/[pid]/stat の52フィールド(man proc(5) のフィールド番号 - 1 がインデックス)
+_STAT_TEMPLATE = (
+    "1 (systemd) S 0 1 1 0 -1 4194560 7957 334989 123 2354 80 57 951 391 20 0 1 0 92 22347776 3227 "
+    "18446744073709551615 1 1 0 0 0 0 671173123 4096 1260 0 0 0 17 8 0 0 0 0 0 0 0 0 0 0 0 0 0"
+).split()
+
+
+def make_pid_stat(pid: int, tgid: int, threads: int, rng: random.Random, cpus: int) -> str:
+    """/proc/[pid]/stat の1行を作る"""
+    fields = list(_STAT_TEMPLATE)
+    fields[0] = str(pid)
+    fields[1] = f"(worker {tgid})"  # コマンド名に空白を含める
+    fields[2] = rng.choice("RSSSSD")
+    fields[3] = "1"  # 親プロセス
+    fields[4] = str(tgid)  # プロセスグループ
+    fields[5] = str(tgid)  # セッション
+    fields[9] = str(rng.randrange(1 << 20))  # minflt
+    fields[11] = str(rng.randrange(1 << 10))  # majflt
+    fields[13] = str(rng.randrange(1 << 24))  # utime
+    fields[14] = str(rng.randrange(1 << 22))  # stime
+    fields[19] = str(threads)  # num_threads
+    fields[21] = str(rng.randrange(1 << 16))  # starttime
+    fields[22] = str(rng.randrange(1 << 32) & ~0xFFF)  # vsize
+    fields[23] = str(rng.randrange(1 << 18))  # rss
+    fields[38] = str(rng.randrange(cpus))  # processor
+    fields[41] = str(rng.randrange(1 << 10))  # delayacct_blkio_ticks
+    return " ".join(fields) + "\n"
+
+
+def make_system_stat(cpus: int, rng: random.Random) -> str:
+    """/proc/stat の内容を作る"""
+    rows = [[rng.randrange(1 << 24) for _ in range(10)] for _ in range(cpus)]
+    total = [sum(column) for column in zip(*rows)]
+    lines = ["cpu  " + " ".join(map(str, total))]
+    lines += [f"cpu{i} " + " ".join(map(str, row)) for i, row in enumerate(rows)]
+    lines.append("intr " + " ".join(str(rng.randrange(1 << 20)) for _ in range(1024)))
+    lines.append(f"ctxt {rng.randrange(1 << 32)}")
+    lines.append("btime 1747216229")
+    lines.append(f"processes {rng.randrange(1 << 20)}")
+    lines.append("procs_running 1")
+    lines.append("procs_blocked 0")
+    lines.append("softirq " + " ".join(str(rng.randrange(1 << 20)) for _ in range(11)))
+    return "\n".join(lines) + "\n"
+
+
+def make_pid_io(rng: random.Random) -> str:
+    """/proc/[pid]/io の内容を作る"""
+    values = [
+        ("rchar", rng.randrange(1 << 32)),
+        ("wchar", rng.randrange(1 << 32)),
+        ("syscr", rng.randrange(1 << 20)),
+        ("syscw", rng.randrange(1 << 20)),
+        ("read_bytes", rng.randrange(1 << 32) & ~0xFFF),
+        ("write_bytes", rng.randrange(1 << 32) & ~0xFFF),
+        ("cancelled_write_bytes", 0),
+    ]
+    return "".join(f"{name}: {value}\n" for name, value in values)
+
+
+def make_pid_status(pid: int, tgid: int, threads: int, rng: random.Random) -> str:
+    """/proc/[pid]/status の内容を作る(pidstat が使う項目と前後の数行だけ)"""
+    return (
+        f"Name:\tworker {tgid}\n"
+        "State:\tS (sleeping)\n"
+        f"Tgid:\t{tgid}\n"
+        f"Pid:\t{pid}\n"
+        "PPid:\t1\n"
+        f"Threads:\t{threads}\n"
+        f"voluntary_ctxt_switches:\t{rng.randrange(1 << 20)}\n"
+        f"nonvoluntary_ctxt_switches:\t{rng.randrange(1 << 16)}\n"
+    )
+
+
+def make_pid_schedstat(rng: random.Random) -> str:
+    """/proc/[pid]/schedstat の内容を作る"""
+    return f"{rng.randrange(1 << 40)} {rng.randrange(1 << 36)} {rng.randrange(1 << 20)}\n"
+
+
+def write_pid_files(directory: str, pid: int, tgid: int, threads: int, rng: random.Random, cpus: int):
+    """stat, io, status, schedstat を directory に作る"""
+    contents = {
+        "stat": make_pid_stat(pid, tgid, threads, rng, cpus),
+        "io": make_pid_io(rng),
+        "status": make_pid_status(pid, tgid, threads, rng),
+        "schedstat": make_pid_schedstat(rng),
+    }
+    for name, content in contents.items():
+        with open(os.path.join(directory, name), "w") as f:
+            f.write(content)
+
+
+def make_meminfo(mem_total_kb: int) -> str:
+    """/proc/meminfo の内容を作る"""
+    return (
+        f"MemTotal:       {mem_total_kb} kB\n"
+        f"MemFree:        {mem_total_kb // 2} kB\n"
+        f"MemAvailable:   {mem_total_kb * 3 // 4} kB\n"
+        "HugePages_Total:       0\n"
+    )
+
+
+def make_fake_procfs(root: str, processes: int = 1000, threads: int = 1, cpus: int = 8, seed: int = 0) -> List[int]:
+    """
+    root に偽の procfs を作り、作成したプロセスのPIDのリストを返す
+    各プロセスには threads 個のスレッド(/proc/[pid]/task/[tid]/stat)を作る
+    """
+    rng = random.Random(seed)
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, "stat"), "w") as f:
+        f.write(make_system_stat(cpus, rng))
+    with open(os.path.join(root, "meminfo"), "w") as f:
+        f.write(make_meminfo(16 * 1024 * 1024))
+
+    pids = []
+    pid = 1000
+    for _ in range(processes):
+        pids.append(pid)
+        process_dir = os.path.join(root, str(pid))
+        os.makedirs(process_dir, exist_ok=True)
+        write_pid_files(process_dir, pid, pid, threads, rng, cpus)
+        for tid in range(pid, pid + threads):
+            task_dir = os.path.join(process_dir, "task", str(tid))
+            os.makedirs(task_dir, exist_ok=True)
+            write_pid_files(task_dir, tid, pid, threads, rng, cpus)
+        # TID はシステム全体で一意なのでスレッドの分だけ空ける
+        pid += threads
+    return pids
+
+
+def make_fake_cgroupfs(root: str, cgroups: Sequence[str], quota_usec: Union[int, None] = None) -> List[str]:
+    """
+    root に cgroup v2 の偽の cgroupfs を作り、作成した cgroup のリストを返す
+    各 cgroup には cpu.stat と cpu.max を作る(quota_usec が None の場合は制限なし)
+    """
+    cpu_max = f"{'max' if quota_usec is None else quota_usec} 100000\n"
+    for cgroup in cgroups:
+        directory = os.path.join(root, cgroup.strip("/"))
+        os.makedirs(directory, exist_ok=True)
+        write_cgroup_cpu_stat(directory, 0, 0)
+        with open(os.path.join(directory, "cpu.max"), "w") as f:
+            f.write(cpu_max)
+    return list(cgroups)
+
+
+def write_cgroup_cpu_stat(
+    directory: str, user_usec: int, system_usec: int, nr_throttled: int = 0, throttled_usec: int = 0
+):
+    """cgroup の cpu.stat を書き換える(テストで時間を進めるのに使う)"""
+    with open(os.path.join(directory, "cpu.stat"), "w") as f:
+        f.write(
+            f"usage_usec {user_usec + system_usec}\n"
+            f"user_usec {user_usec}\n"
+            f"system_usec {system_usec}\n"
+            f"nr_periods {nr_throttled * 10}\n"
+            f"nr_throttled {nr_throttled}\n"
+            f"throttled_usec {throttled_usec}\n"
+        )
+
+
+def main():
+    p = argparse.ArgumentParser(description="Create a fake procfs tree.")
+    p.add_argument("root")
+    p.add_argument("--processes", type=int, default=1000)
+    p.add_argument("--threads", type=int, default=1)
+    p.add_argument("--cpus", type=int, default=8)
+    args = p.parse_args()
+    pids = make_fake_procfs(args.root, args.processes, args.threads, args.cpus)
+    print(f"created {len(pids)} processes in {args.root}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,56 @@
 import time
 import os
 import argparse
-from typing import Union, List
+import asyncio
+import struct
+import sys
+import heapq
+import math
+import json
+import mmap
+import threading
+from bisect import bisect_left
+from array import array
+import multiprocessing
+from multiprocessing import shared_memory, resource_tracker
+from collections import OrderedDict
+from contextlib import redirect_stdout
+from operator import attrgetter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Union, List, Dict, Set, Tuple, Iterable, Iterator, AsyncIterator, Sequence
+
+try:
+    # NumPy はオプション。ない場合はベクトル化した計算(compute_processor_usages など)が使えないだけ
+    import numpy as np
+except ImportError:
+    np = None
 
 
 CLOCK_TICKS_PER_SECOND = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+# procfs のマウント位置。テストやベンチマークでは set_proc_root() で偽の procfs を指定する
+PROC_ROOT = "/proc"
+
+
+def set_proc_root(path: str):
+    """
+    /proc の代わりに読み込むディレクトリを設定する
+    すでに開いている StatFileCache のファイルには影響しないので、設定後に作り直すこと
+    """
+    global PROC_ROOT
+    PROC_ROOT = path.rstrip("/") or "/"
+
+
+# cgroup v2 のマウント位置。テストでは set_cgroup_root() で偽の cgroupfs を指定する
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+
+def set_cgroup_root(path: str):
+    """/sys/fs/cgroup の代わりに読み込むディレクトリを設定する"""
+    global CGROUP_ROOT
+    CGROUP_ROOT = path.rstrip("/") or "/"
 
 
 def jiffies_to_seconds(jiffies: int) -> float:
@@ -15,6 +61,8 @@ def jiffies_to_seconds(jiffies: int) -> float:
 class ProcessBasicInfo:
     """基本的なプロセス情報"""
 
+    __slots__ = ("pid", "command", "state", "parent_pid", "gid", "session", "tty_device_num", "tty_gid")
+
     def __init__(self):
         self.pid: int = 0 # 1: プロセスID
         self.command: str = ""  # 2: コマンド名 (カッコ付き)
@@ -42,6 +90,8 @@ class ProcessBasicInfo:
 class ProcessCpuTime:
     """[13~16] プロセスCPU時間情報(jiffies単位)"""
 
+    __slots__ = ("user", "system", "child_user", "child_system")
+
     def __init__(self):
         self.user: int = 0 # 13: ユーザーCPU時間
         self.system: int = 0 # 14: システムCPU時間
@@ -72,6 +122,8 @@ class ProcessCpuTime:
 class ProcessResourceStat:
     """[21~24] プロセスの資源に関する情報"""
 
+    __slots__ = ("start_time", "virtual_size", "rss", "rss_limit")
+
     def __init__(self):
         self.start_time: int = 0  # 21: システム起動後のプロセス開始時間 (jiffies)
         self.virtual_size: int = 0  # 22: 仮想メモリサイズ (バイト)
@@ -95,22 +147,47 @@ class ProcessResourceStat:
 
 
 class PageFaultInfo:
-    """[9~12] ベージフォールト関連情報 - 未実装"""
+    """[9~12] ページフォールト関連情報"""
+
+    __slots__ = ("minor_faults", "child_minor_faults", "major_faults", "child_major_faults")
+
+    def __init__(self):
+        self.minor_faults: int = 0  # 10: マイナーフォールト(ディスクからの読み込みなし)の回数
+        self.child_minor_faults: int = 0  # 11: 終了を待った子プロセスのマイナーフォールトの回数
+        self.major_faults: int = 0  # 12: メジャーフォールト(ディスクからの読み込みあり)の回数
+        self.child_major_faults: int = 0  # 13: 終了を待った子プロセスのメジャーフォールトの回数
 
     def __eq__(self, other: object) -> bool:
         if not isinstance(other, PageFaultInfo):
             return False
-        # NOTE: 何もデータを持っていないので同じクラスであればTrue
-        return True
+        return (
+            self.minor_faults == other.minor_faults and
+            self.child_minor_faults == other.child_minor_faults and
+            self.major_faults == other.major_faults and
+            self.child_major_faults == other.child_major_faults
+        )
 
 
 class SchedulingInfo:
-    """[17~20,37] スケジューリング情報 - 未実装"""
+    """[17~19,40] スケジューリング情報"""
+
+    __slots__ = ("priority", "nice", "num_threads", "policy")
+
+    def __init__(self):
+        self.priority: int = 0  # 18: 優先度(通常のプロセスは 20 + nice、リアルタイムは負の値)
+        self.nice: int = 0  # 19: nice値 (-20~19)
+        self.num_threads: int = 0  # 20: スレッド数
+        self.policy: int = 0  # 41: スケジューリングポリシー (SCHED_OTHER=0, SCHED_FIFO=1, ...)
+
     def __eq__(self, other: object) -> bool:
         if not isinstance(other, SchedulingInfo):
             return False
-        # NOTE: 何もデータを持っていないので同じクラスであればTrue
-        return True
+        return (
+            self.priority == other.priority and
+            self.nice == other.nice and
+            self.num_threads == other.num_threads and
+            self.policy == other.policy
+        )
 
 class MemoryAddressInfo:
     """
@@ -118,6 +195,9 @@ class MemoryAddressInfo:
     このブロックの情報はカーネルバージョンによって位置が変わる可能性がある
     man proc(5) を確認する
     """
+
+    __slots__ = ()
+
     def __eq__(self, other: object) -> bool:
         if not isinstance(other, MemoryAddressInfo):
             return False
@@ -128,17 +208,66 @@ class MemoryAddressInfo:
 # NOTE: まだ他にも情報があると思うが省く
 
 
+class ProcessIo:
+    """/proc/[pid]/io の情報(バイト・回数は全てプロセス開始からの累計)"""
+
+    __slots__ = ("rchar", "wchar", "syscr", "syscw", "read_bytes", "write_bytes", "cancelled_write_bytes")
+
+    def __init__(self):
+        self.rchar: int = 0  # read系のシステムコールで読み込んだバイト数(ページキャッシュを含む)
+        self.wchar: int = 0  # write系のシステムコールで書き込んだバイト数(ページキャッシュを含む)
+        self.syscr: int = 0  # read系のシステムコールの回数
+        self.syscw: int = 0  # write系のシステムコールの回数
+        self.read_bytes: int = 0  # ストレージから実際に読み込んだバイト数
+        self.write_bytes: int = 0  # ストレージへの書き込みを発生させたバイト数
+        self.cancelled_write_bytes: int = 0  # 書き込まれる前に取り消されたバイト数(truncate など)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, ProcessIo):
+            return False
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+
+class ProcessSchedStat:
+    """/proc/[pid]/status のコンテキストスイッチ数と /proc/[pid]/schedstat の情報(全て累計)"""
+
+    __slots__ = ("voluntary_switches", "involuntary_switches", "run_time", "wait_time", "timeslices")
+
+    def __init__(self):
+        self.voluntary_switches: int = 0  # 自発的なコンテキストスイッチ(I/O待ちなど)の回数
+        self.involuntary_switches: int = 0  # 横取りされたコンテキストスイッチの回数
+        self.run_time: int = 0  # CPUで実行していた時間 (ナノ秒)
+        self.wait_time: int = 0  # 実行可能だが実行キューで待っていた時間 (ナノ秒)
+        self.timeslices: int = 0  # CPUで実行した回数
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, ProcessSchedStat):
+            return False
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+
 class ProcessStat:
     """/proc/[pid]/stat を解析するクラス"""
 
+    __slots__ = (
+        "basic", "cpu_time", "resource", "page_fault", "scheduling", "memory_address", "io_delay", "io", "sched",
+        "timestamp",
+    )
+
     def __init__(self):
         self.basic: ProcessBasicInfo = ProcessBasicInfo()
         self.cpu_time: ProcessCpuTime = ProcessCpuTime()
         self.resource: ProcessResourceStat = ProcessResourceStat()
 
-        self.page_fault: PageFaultInfo = PageFaultInfo()  # no supported
-        self.scheduling: SchedulingInfo = SchedulingInfo()  # no supported
+        self.page_fault: PageFaultInfo = PageFaultInfo()
+        self.scheduling: SchedulingInfo = SchedulingInfo()
         self.memory_address: MemoryAddressInfo = MemoryAddressInfo()  # no supported
+        # 42: ブロックI/Oの完了を待っていた時間 (delayacct_blkio_ticks, jiffies)
+        self.io_delay: int = 0
+        # /proc/[pid]/io (-d の場合だけ読み込む)
+        self.io: Union[ProcessIo, None] = None
+        # /proc/[pid]/status と /proc/[pid]/schedstat (-w の場合だけ読み込む)
+        self.sched: Union[ProcessSchedStat, None] = None
         # NOTE: 他にも情報があれば追加する
 
         # statファイルを読み込んだときのタイムスタンプ - time.time()
@@ -152,17 +281,80 @@ class ProcessStat:
             self.basic == other.basic and
             self.cpu_time == other.cpu_time and
             self.resource == other.resource and
-            # 空のデータオブジェクトだが比較は行う
-            # これらはすべてTrueになる
             self.page_fault == other.page_fault and
             self.scheduling == other.scheduling and
+            self.io_delay == other.io_delay and
+            # 空のデータオブジェクトだが比較は行う
+            # これはTrueになる
             self.memory_address == other.memory_address
         )
 
 
+# /proc/[pid]/stat のフィールド番号 (man proc(5))
+# PidStatFile.parse_fields() で取り出すフィールドの指定に使う
+STAT_FIELD_STATE = 3
+STAT_FIELD_PARENT_PID = 4
+STAT_FIELD_GID = 5
+STAT_FIELD_SESSION = 6
+STAT_FIELD_MINOR_FAULTS = 10
+STAT_FIELD_MAJOR_FAULTS = 12
+STAT_FIELD_USER = 14
+STAT_FIELD_SYSTEM = 15
+STAT_FIELD_CHILD_USER = 16
+STAT_FIELD_CHILD_SYSTEM = 17
+STAT_FIELD_PRIORITY = 18
+STAT_FIELD_NICE = 19
+STAT_FIELD_NUM_THREADS = 20
+STAT_FIELD_START_TIME = 22
+STAT_FIELD_VIRTUAL_SIZE = 23
+STAT_FIELD_RSS = 24
+STAT_FIELD_POLICY = 41
+STAT_FIELD_IO_DELAY = 42
+
+
 class PidStatFile:
     """/proc/[pid]/stat を読み込むクラス"""
 
+    @staticmethod
+    def parse_fields(data: Union[bytes, bytearray], fields: Sequence[int]) -> Union[Tuple[Union[int, str], ...], None]:
+        """
+        /proc/[pid]/stat の内容(bytes)から指定したフィールドだけを取り出す
+        fields には man proc(5) のフィールド番号(3以降, STAT_FIELD_*)を指定する
+        フィールド3(state)は str、それ以外は int で fields と同じ順番で返す
+        最後の閉じカッコ ')' 以降を、必要なフィールドまでしか分割しない
+        ProcessStat などのオブジェクトは作らない。解析できない場合は None を返す
+        """
+        last_paren_close = data.rfind(b")")
+        if last_paren_close == -1:
+            return None
+        # Field N -> parts[N - 3]、最後の要素は分割されずに残りがまとめて入る
+        parts = data[last_paren_close + 1 :].split(None, max(fields) - 2)
+        try:
+            return tuple(
+                parts[0].decode() if field == STAT_FIELD_STATE else int(parts[field - 3])
+                for field in fields
+            )
+        except (ValueError, IndexError):
+            return None
+
+    @staticmethod
+    def load_fields(pid: int, fields: Sequence[int], quiet: bool = False) -> Union[Tuple[Union[int, str], ...], None]:
+        """
+        /proc/[pid]/stat を読み込み、指定したフィールドだけを返す(parse_fields を参照)
+        プロセスが存在しない、または読み込み・パースに失敗した場合は None を返す
+        """
+        try:
+            with open(f"{PROC_ROOT}/{pid}/stat", "rb") as f:
+                data = f.read()
+        except (FileNotFoundError, ProcessLookupError):
+            if not quiet:
+                print(f"Error: Process with PID {pid} not found.", file=sys.stderr)
+            return None
+        except Exception as e:
+            print(f"Error reading /proc/{pid}/stat for PID {pid}: {e}", file=sys.stderr)
+            return None
+        return PidStatFile.parse_fields(data, fields)
+
     @staticmethod
     def _parse(pid: int, data: str) -> Union[ProcessStat, None]:
         # コマンド名 (comm) はカッコ () で囲まれているため、特殊なパースが必要
@@ -176,7 +368,8 @@ class PidStatFile:
             first_paren_open >= last_paren_close
         ):
             print(
-                f"Error parsing /proc/{pid}/stat format: Could not find command name in parens."
+                f"Error parsing /proc/{pid}/stat format: Could not find command name in parens.",
+                file=sys.stderr,
             )
             return None
 
@@ -186,10 +379,11 @@ class PidStatFile:
             pid_val = int(pid_str)
             if pid_val != pid:  # 一応整合性チェック
                 print(
-                    f"Warning: PID in stat file ({pid_val}) does not match requested PID ({pid})."
+                    f"Warning: PID in stat file ({pid_val}) does not match requested PID ({pid}).",
+                    file=sys.stderr,
                 )
         except ValueError:
-            print(f"Error parsing PID from stat file: '{pid_str}'")
+            print(f"Error parsing PID from stat file: '{pid_str}'", file=sys.stderr)
             return None
 
         # フィールド2 (command) - カッコ内のコマンド文字列
@@ -205,8 +399,11 @@ class PidStatFile:
         # ...
         # Field N           -> stat_fields_after_command[N - 3]
         try:
+            # 各情報は ProcessStat が持っているオブジェクトに直接書き込む(余計な割り当てをしない)
+            process_stat = ProcessStat()
+
             # BasicProcessInfo (Fields 3-8)
-            basic_info = ProcessBasicInfo()
+            basic_info = process_stat.basic
             basic_info.pid = pid_val
             basic_info.command = command_str
             basic_info.state = stat_fields_after_command[0]  # 3
@@ -216,21 +413,31 @@ class PidStatFile:
             basic_info.tty_device_num = int(stat_fields_after_command[4])  # 7
             basic_info.tty_gid = int(stat_fields_after_command[5])  # 8
 
-            # PageFaultInfo (Fields 10-13) - no supported
+            # PageFaultInfo (Fields 10-13)
+            page_fault = process_stat.page_fault
+            page_fault.minor_faults = int(stat_fields_after_command[7])  # 10
+            page_fault.child_minor_faults = int(stat_fields_after_command[8])  # 11
+            page_fault.major_faults = int(stat_fields_after_command[9])  # 12
+            page_fault.child_major_faults = int(stat_fields_after_command[10])  # 13
 
             # ProcessCpuTimes (Fields 14-17)
-            cpu_times = ProcessCpuTime()
+            cpu_times = process_stat.cpu_time
             cpu_times.user = int(stat_fields_after_command[11])  # 14
             cpu_times.system = int(stat_fields_after_command[12])  # 15
             cpu_times.child_user = int(stat_fields_after_command[13])  # 16
             cpu_times.child_system = int(stat_fields_after_command[14])  # 17
 
-            # SchedulingInfo (Fields 18-21, 38) - no supported
+            # SchedulingInfo (Fields 18-20, 41)
+            scheduling = process_stat.scheduling
+            scheduling.priority = int(stat_fields_after_command[15])  # 18
+            scheduling.nice = int(stat_fields_after_command[16])  # 19
+            scheduling.num_threads = int(stat_fields_after_command[17])  # 20
+            scheduling.policy = int(stat_fields_after_command[38])  # 41
 
             # ResourceStats (Fields 22-25)
             # NOTE: Field 22 (starttime) は MemoryStats の一部として扱われることも多い
             # starttime はフィールド番号 22。stat_fields_after_comm のインデックスは 22 - 3 = 19
-            resource_stats = ProcessResourceStat()
+            resource_stats = process_stat.resource
             resource_stats.start_time = int(stat_fields_after_command[19])  # 22
             resource_stats.virtual_size = int(stat_fields_after_command[20])  # 23
             resource_stats.rss = int(stat_fields_after_command[21])  # 24
@@ -238,52 +445,191 @@ class PidStatFile:
 
             # MemoryAddressInfo (Fields 26-28, 45-52など) - no supported
 
-            # 全てを ProcessStat オブジェクトにまとめる
-            process_stat = ProcessStat()
-            process_stat.basic = basic_info
-            process_stat.cpu_time = cpu_times
-            process_stat.resource = resource_stats
+            # delayacct_blkio_ticks (Field 42)
+            process_stat.io_delay = int(stat_fields_after_command[39])  # 42
+
             process_stat.timestamp = time.time()
             return process_stat
 
         except (ValueError, IndexError) as e:
-            print(f"Error parsing fields from /proc/{pid}/stat: {e}")
-            print(f"Line content: {data}")
+            print(f"Error parsing fields from /proc/{pid}/stat: {e}", file=sys.stderr)
             # print(f"Fields after comm: {stat_fields_after_comm}") # デバッグ用
             return None
         except Exception as e:
-            print(f"An unexpected error occurred during parsing: {e}")
+            print(f"An unexpected error occurred during parsing: {e}", file=sys.stderr)
             return None
         
     @staticmethod
-    def _read_stat_file(pid: int) -> str:
+    def _read_stat_file(pid: int, quiet: bool = False) -> str:
         try:
-            with open(f"/proc/{pid}/stat", "r") as f:
+            with open(f"{PROC_ROOT}/{pid}/stat", "r") as f:
                 return f.read()
-        except FileNotFoundError:
-            print(f"Error: Process with PID {pid} not found.")
+        except (FileNotFoundError, ProcessLookupError):
+            # quiet: 読み込み中に終了したプロセスは珍しくないのでエラー表示しない
+            if not quiet:
+                print(f"Error: Process with PID {pid} not found.", file=sys.stderr)
+            return ""
+        except Exception as e:
+            print(f"Error reading /proc/{pid}/stat for PID {pid}: {e}", file=sys.stderr)
+            return ""
+
+    @staticmethod
+    def _read_task_stat_file(pid: int, tid: int, quiet: bool = False) -> str:
+        try:
+            with open(f"{PROC_ROOT}/{pid}/task/{tid}/stat", "r") as f:
+                return f.read()
+        except (FileNotFoundError, ProcessLookupError):
+            # スレッドは頻繁に終了するので quiet の場合はエラー表示しない
+            if not quiet:
+                print(f"Error: Thread with TID {tid} of PID {pid} not found.", file=sys.stderr)
             return ""
         except Exception as e:
-            print(f"Error reading /proc/{pid}/stat for PID {pid}: {e}")
+            print(f"Error reading /proc/{pid}/task/{tid}/stat: {e}", file=sys.stderr)
             return ""
 
     @staticmethod
-    def load(pid: int) -> Union[ProcessStat, None]:
+    def load_task(pid: int, tid: int, quiet: bool = False) -> Union[ProcessStat, None]:
+        """
+        /proc/<pid>/task/<tid>/stat を読み込み、ProcessStat オブジェクトとしてパースする。
+        フォーマットは /proc/<pid>/stat と同じで、CPU時間などはスレッド単位の値になる。
+        スレッドが存在しない、または読み込み・パースに失敗した場合は None を返す。
+        """
+        contents = PidStatFile._read_task_stat_file(pid, tid, quiet)
+        if contents == "":
+            return None
+        return PidStatFile._parse(tid, contents)
+
+    @staticmethod
+    def load(pid: int, quiet: bool = False) -> Union[ProcessStat, None]:
         """
         指定したPIDの /proc/<pid>/stat ファイルを読み込み、ProcessStat オブジェクトとしてパースする。
         プロセスが存在しない、または読み込み・パースに失敗した場合は None を返す。
+        quiet=True の場合はプロセスが存在しないときのエラー表示を行わない。
         """
-        contents = PidStatFile._read_stat_file(pid)
+        contents = PidStatFile._read_stat_file(pid, quiet)
         if contents == "":
             return None
         return PidStatFile._parse(pid, contents)
 
 
+class PidIoFile:
+    """
+    /proc/[pid]/io を読み込むクラス
+    他のユーザーのプロセスの io は読み込み権限がない(EACCES)ので PermissionError をそのまま送出する
+    """
+
+    @staticmethod
+    def _parse(data: str) -> ProcessIo:
+        process_io = ProcessIo()
+        for line in data.splitlines():
+            # 例: "read_bytes: 4096"
+            name, _, value = line.partition(":")
+            if name in ProcessIo.__slots__:
+                setattr(process_io, name, int(value))
+        return process_io
+
+    @staticmethod
+    def _load(path: str, pid: int, quiet: bool) -> Union[ProcessIo, None]:
+        try:
+            with open(path, "r") as f:
+                data = f.read()
+        except (FileNotFoundError, ProcessLookupError):
+            if not quiet:
+                print(f"Error: Process with PID {pid} not found.", file=sys.stderr)
+            return None
+        except PermissionError:
+            raise
+        except OSError as e:
+            if not quiet:
+                print(f"Error reading {path} for PID {pid}: {e}", file=sys.stderr)
+            return None
+        try:
+            return PidIoFile._parse(data)
+        except ValueError as e:
+            print(f"Error parsing {path}: {e}", file=sys.stderr)
+            return None
+
+    @staticmethod
+    def load(pid: int, quiet: bool = False) -> Union[ProcessIo, None]:
+        """
+        /proc/[pid]/io を読み込み ProcessIo として返す
+        プロセスが存在しない、または読み込み・パースに失敗した場合は None を返す
+        """
+        return PidIoFile._load(f"{PROC_ROOT}/{pid}/io", pid, quiet)
+
+    @staticmethod
+    def load_task(pid: int, tid: int, quiet: bool = False) -> Union[ProcessIo, None]:
+        """/proc/[pid]/task/[tid]/io を読み込み ProcessIo として返す"""
+        return PidIoFile._load(f"{PROC_ROOT}/{pid}/task/{tid}/io", tid, quiet)
+
+
+class PidSchedFile:
+    """/proc/[pid]/status のコンテキストスイッチ数と /proc/[pid]/schedstat を読み込むクラス"""
+
+    @staticmethod
+    def _parse(status: str, schedstat: str) -> ProcessSchedStat:
+        sched = ProcessSchedStat()
+        # コンテキストスイッチの行は status の末尾にある
+        for line in reversed(status.splitlines()):
+            name, _, value = line.partition(":")
+            if name == "voluntary_ctxt_switches":
+                sched.voluntary_switches = int(value)
+                break
+            if name == "nonvoluntary_ctxt_switches":
+                sched.involuntary_switches = int(value)
+        # 例: "1234567 89012 34" (実行時間 待ち時間 実行回数)
+        run_time, wait_time, timeslices = schedstat.split()[:3]
+        sched.run_time = int(run_time)
+        sched.wait_time = int(wait_time)
+        sched.timeslices = int(timeslices)
+        return sched
+
+    @staticmethod
+    def _load(directory: str, pid: int, quiet: bool) -> Union[ProcessSchedStat, None]:
+        try:
+            with open(f"{directory}/status", "r") as f:
+                status = f.read()
+            with open(f"{directory}/schedstat", "r") as f:
+                schedstat = f.read()
+        except (FileNotFoundError, ProcessLookupError):
+            # schedstat はカーネルの設定(CONFIG_SCHED_INFO)によっては存在しない
+            if not quiet:
+                print(f"Error: Process with PID {pid} not found.", file=sys.stderr)
+            return None
+        except OSError as e:
+            if not quiet:
+                print(f"Error reading {directory}/status for PID {pid}: {e}", file=sys.stderr)
+            return None
+        try:
+            return PidSchedFile._parse(status, schedstat)
+        except ValueError as e:
+            print(f"Error parsing {directory}/schedstat: {e}", file=sys.stderr)
+            return None
+
+    @staticmethod
+    def load(pid: int, quiet: bool = False) -> Union[ProcessSchedStat, None]:
+        """
+        /proc/[pid]/status と /proc/[pid]/schedstat を読み込み ProcessSchedStat として返す
+        プロセスが存在しない、または読み込み・パースに失敗した場合は None を返す
+        """
+        return PidSchedFile._load(f"{PROC_ROOT}/{pid}", pid, quiet)
+
+    @staticmethod
+    def load_task(pid: int, tid: int, quiet: bool = False) -> Union[ProcessSchedStat, None]:
+        """/proc/[pid]/task/[tid]/status と schedstat を読み込み ProcessSchedStat として返す"""
+        return PidSchedFile._load(f"{PROC_ROOT}/{pid}/task/{tid}", tid, quiet)
+
+
 class SystemCpuTime:
     """
     /prc/statのCPU時間の統計(jiffies単位)
     """
 
+    __slots__ = (
+        "user", "nice", "system", "idle", "iowait",
+        "irq", "softirq", "steal", "guest", "guest_nice",
+    )
+
     def __init__(self):
         self.user: int = 0  # ユーザーCPU時間
         self.nice: int = 0  # ユーザーCPU時間(優先度低)
@@ -299,19 +645,18 @@ class SystemCpuTime:
     @property
     def total(self) -> int:
         """合計CPU時間をjiffies単位で返す"""
-        return sum(
-            [
-                self.user,
-                self.nice,
-                self.system,
-                self.idle,
-                self.iowait,
-                self.irq,
-                self.softirq,
-                self.steal,
-                self.guest,
-                self.guest_nice,
-            ]
+        # NOTE: コア数分呼ばれるのでリストを作らずに足す
+        return (
+            self.user +
+            self.nice +
+            self.system +
+            self.idle +
+            self.iowait +
+            self.irq +
+            self.softirq +
+            self.steal +
+            self.guest +
+            self.guest_nice
         )
 
     @property
@@ -350,20 +695,57 @@ class SystemStat:
     """
     システム全体の情報を表すクラス
     """
+
+    __slots__ = (
+        "cpu_time", "processor_times",
+        "ctxt", "btime", "processes", "procs_running", "procs_blocked",
+        "_intr_line", "_intr", "_softirq_line", "_softirq",
+        "timestamp",
+    )
+
     def __init__(self):
         self.cpu_time: SystemCpuTime = SystemCpuTime()
         self.processor_times: List[SystemCpuTime] = []
-        # NOTE: 他にもあるが省略(割り込み回数、コンテキストスイッチの回数...)
+        self.ctxt: int = 0  # 起動後のコンテキストスイッチの回数
+        self.btime: int = 0  # 起動時刻 (エポック秒)
+        self.processes: int = 0  # 起動後に作成されたプロセス(スレッド)の数
+        self.procs_running: int = 0  # 実行可能状態のプロセス(スレッド)の数
+        self.procs_blocked: int = 0  # I/O待ちでブロックしているプロセス(スレッド)の数
+        # intr, softirq の行は長いので、アクセスされるまで分割しない
+        self._intr_line: str = ""
+        self._intr: Union[List[int], None] = None
+        self._softirq_line: str = ""
+        self._softirq: Union[List[int], None] = None
 
         # statファイルを読み込んだときのタイムスタンプ(time.time())
         self.timestamp: float = 0.0
-    
+
+    @property
+    def intr(self) -> List[int]:
+        """割り込み回数 [合計, 割り込み番号0, 1, ...] (最初のアクセス時に解析する)"""
+        if self._intr is None:
+            self._intr = [int(value) for value in self._intr_line.split()]
+        return self._intr
+
+    @property
+    def softirq(self) -> List[int]:
+        """ソフトウェア割り込み回数 [合計, 種類0, 1, ...] (最初のアクセス時に解析する)"""
+        if self._softirq is None:
+            self._softirq = [int(value) for value in self._softirq_line.split()]
+        return self._softirq
+
     def __eq__(self, other: object) -> bool:
         if not isinstance(other, SystemStat):
             return False
+        # NOTE: intr, softirq は比較しない
         return (
             self.cpu_time == other.cpu_time and
-            self.processor_times == other.processor_times
+            self.processor_times == other.processor_times and
+            self.ctxt == other.ctxt and
+            self.btime == other.btime and
+            self.processes == other.processes and
+            self.procs_running == other.procs_running and
+            self.procs_blocked == other.procs_blocked
         )
 
 
@@ -375,10 +757,10 @@ class SystemStatFile:
     @staticmethod
     def _read_lines() -> List[str]:
         try:
-            with open("/proc/stat", "r") as f:
+            with open(f"{PROC_ROOT}/stat", "r") as f:
                 return f.readlines()
         except FileNotFoundError:
-            print("Error: /proc/stat not found.")
+            print("Error: /proc/stat not found.", file=sys.stderr)
             return []
 
     @staticmethod
@@ -399,34 +781,53 @@ class SystemStatFile:
         return time_stats
 
     @staticmethod
-    def _parse(lines: List[str]) -> Union[SystemStat, None]:
-        """/proc/stat を解析する"""
+    def _parse(lines: List[str], cpu_only: bool = False) -> Union[SystemStat, None]:
+        """
+        /proc/stat を解析する
+        cpu_only=True の場合は cpu の行が終わったところで解析を打ち切る
+        """
 
         total_processors: Union[SystemCpuTime, None] = None
         processors: list[SystemCpuTime] = []
+        system_stat = SystemStat()
 
         for line in lines:
-            parts = line.split()
-            # 空行はスキップ
-            if not parts:
+            # cpu の行だけ分割する
+            if line.startswith("cpu"):
+                parts = line.split()
+                # 全CPU合計の行
+                if parts[0] == "cpu":
+                    total_processors = SystemStatFile._set_cpu_times(parts)
+                # 各CPUの行
+                else:
+                    cpu_stat = SystemStatFile._set_cpu_times(parts)
+                    processors.append(cpu_stat)
                 continue
 
-            keyword = parts[0]
-            # 全CPU合計の行
-            if keyword == "cpu":
-                total_processors = SystemStatFile._set_cpu_times(parts)
-            # 各CPUの行
-            elif keyword.startswith("cpu"):
-                cpu_stat = SystemStatFile._set_cpu_times(parts)
-                processors.append(cpu_stat)
-            # NOTE: その他の情報については省略
-            else:
-                pass
+            # cpu の行は先頭にまとまっているので、それ以外の行が出てきたら終わり
+            if cpu_only and total_processors is not None:
+                break
+
+            keyword, _, value = line.partition(" ")
+            if keyword == "intr":
+                system_stat._intr_line = value
+            elif keyword == "ctxt":
+                system_stat.ctxt = int(value)
+            elif keyword == "btime":
+                system_stat.btime = int(value)
+            elif keyword == "processes":
+                system_stat.processes = int(value)
+            elif keyword == "procs_running":
+                system_stat.procs_running = int(value)
+            elif keyword == "procs_blocked":
+                system_stat.procs_blocked = int(value)
+            elif keyword == "softirq":
+                system_stat._softirq_line = value
+            # NOTE: 空行やその他の情報については省略
         if total_processors is None:
-            print("Error: Could not find 'cpu' line in /proc/stat.")
+            print("Error: Could not find 'cpu' line in /proc/stat.", file=sys.stderr)
             return None  # 全体合計の行がない場合は解析失敗とみなす
 
-        system_stat = SystemStat()
         system_stat.cpu_time = total_processors
         system_stat.processor_times = processors
         system_stat.timestamp = time.time()
@@ -434,21 +835,386 @@ class SystemStatFile:
         return system_stat
 
     @staticmethod
-    def load() -> Union[SystemStat, None]:
+    def load(cpu_only: bool = False) -> Union[SystemStat, None]:
         """
         /proc/stat を読み込む/解析する
+        cpu_only=True の場合はCPU時間だけを解析する
         失敗の場合はNoneを返す
         """
         lines = SystemStatFile._read_lines()
         if not lines:
             return None
-        return SystemStatFile._parse(lines)
+        return SystemStatFile._parse(lines, cpu_only)
+
+
+class MemInfoFile:
+    """/proc/meminfo を読み込むクラス"""
+
+    @staticmethod
+    def load() -> Union[Dict[str, int], None]:
+        """
+        項目名 -> 値 の辞書を返す。単位が kB の項目はバイトに変換する
+        読み込みに失敗した場合は None を返す
+        """
+        try:
+            with open(f"{PROC_ROOT}/meminfo", "r") as f:
+                lines = f.readlines()
+        except OSError as e:
+            print(f"Error reading /proc/meminfo: {e}", file=sys.stderr)
+            return None
+        meminfo: Dict[str, int] = {}
+        for line in lines:
+            # 例: "MemTotal:       16318588 kB"
+            name, _, value = line.partition(":")
+            parts = value.split()
+            if not parts:
+                continue
+            try:
+                number = int(parts[0])
+            except ValueError:
+                continue
+            meminfo[name] = number * 1024 if parts[-1] == "kB" else number
+        return meminfo
+
+    @staticmethod
+    def load_mem_total() -> int:
+        """物理メモリの総量(バイト)を返す。読み込めない場合は 0"""
+        meminfo = MemInfoFile.load()
+        if meminfo is None:
+            return 0
+        return meminfo.get("MemTotal", 0)
+
+
+class _CachedStatFile:
+    """StatFileCache が保持する開いたままのstatファイル"""
+
+    __slots__ = ("fd", "start_time")
+
+    def __init__(self, fd: int):
+        self.fd: int = fd
+        # 最初に読み込んだときのプロセス開始時間(PID再利用の検出に使う)
+        self.start_time: Union[int, None] = None
+
+
+def _default_max_files() -> int:
+    """StatFileCache が開いておくファイル数の既定値(ファイルディスクリプタ上限の半分)"""
+    try:
+        import resource
+        soft_limit, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    except (ImportError, ValueError, OSError):
+        return 512
+    if soft_limit == resource.RLIM_INFINITY:
+        return 65536
+    return max(16, soft_limit // 2)
+
+
+class StatFileCache:
+    """
+    /proc/[pid]/stat と /proc/stat を開いたままにして再利用するキャッシュ
+    毎回 open/close せず、os.preadv でオフセット0から使い回しのバッファに読み込む
+    開いておくファイルの数は LRU で max_files 個までに制限する
+    stats を指定した場合は読み込みとパースにかかった時間を SelfStats に加算する
+    """
+
+    def __init__(self, max_files: Union[int, None] = None, stats: Union["SelfStats", None] = None):
+        self.max_files: int = max_files if max_files is not None else _default_max_files()
+        self.stats = stats
+        # PID -> 開いているファイル (先頭が最も長く使われていないもの)
+        self._files: "OrderedDict[int, _CachedStatFile]" = OrderedDict()
+        # /proc/[pid]/stat は1行なので通常はこのサイズで足りる。足りなければ拡張する
+        self._buffer = bytearray(1024)
+        self._system_fd: int = -1
+        self._system_buffer = bytearray(16384)
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def __enter__(self) -> "StatFileCache":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @staticmethod
+    def _pread(fd: int, buffer: bytearray) -> Tuple[bytearray, int]:
+        """fd の内容を先頭から buffer に読み込む。入りきらない場合は buffer を拡張して読み直す"""
+        while True:
+            size = os.preadv(fd, [buffer], 0)
+            if size < len(buffer):
+                return buffer, size
+            buffer = bytearray(len(buffer) * 2)
+
+    def _read(self, pid: int, cached: _CachedStatFile, quiet: bool) -> int:
+        """キャッシュしているファイルをバッファに読み込み、読み込んだサイズを返す(失敗した場合は0)"""
+        try:
+            self._buffer, size = self._pread(cached.fd, self._buffer)
+        except (FileNotFoundError, ProcessLookupError):
+            # プロセスが終了している
+            return 0
+        except OSError as e:
+            if not quiet:
+                print(f"Error reading /proc/{pid}/stat for PID {pid}: {e}", file=sys.stderr)
+            return 0
+        return size
+
+    def _read_process(self, pid: int, cached: _CachedStatFile, quiet: bool) -> Union[ProcessStat, None]:
+        stats = self.stats
+        if stats is None:
+            size = self._read(pid, cached, quiet)
+            if size == 0:
+                return None
+            return PidStatFile._parse(pid, str(memoryview(self._buffer)[:size], "utf-8", "replace"))
+
+        start = time.perf_counter()
+        size = self._read(pid, cached, quiet)
+        read_end = time.perf_counter()
+        stats.read_seconds += read_end - start
+        if size == 0:
+            return None
+        process_stat = PidStatFile._parse(pid, str(memoryview(self._buffer)[:size], "utf-8", "replace"))
+        stats.parse_seconds += time.perf_counter() - read_end
+        return process_stat
+
+    def _read_fields(
+        self, pid: int, cached: _CachedStatFile, fields: Sequence[int], quiet: bool
+    ) -> Union[Tuple[Union[int, str], ...], None]:
+        size = self._read(pid, cached, quiet)
+        if size == 0:
+            return None
+        return PidStatFile.parse_fields(self._buffer[:size], fields)
+
+    def _open(self, pid: int, quiet: bool, tgid: Union[int, None] = None) -> Union[_CachedStatFile, None]:
+        path = f"{PROC_ROOT}/{pid}/stat" if tgid is None else f"{PROC_ROOT}/{tgid}/task/{pid}/stat"
+        try:
+            fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+        except (FileNotFoundError, ProcessLookupError):
+            if not quiet:
+                print(f"Error: Process with PID {pid} not found.", file=sys.stderr)
+            return None
+        except OSError as e:
+            print(f"Error reading {path} for PID {pid}: {e}", file=sys.stderr)
+            return None
+
+        # 上限を超える場合は最も長く使われていないファイルを閉じる
+        while len(self._files) >= self.max_files:
+            _, evicted = self._files.popitem(last=False)
+            os.close(evicted.fd)
+
+        cached = _CachedStatFile(fd)
+        self._files[pid] = cached
+        return cached
+
+    def discard(self, pid: int):
+        """PIDのファイルを閉じてキャッシュから削除する"""
+        cached = self._files.pop(pid, None)
+        if cached is not None:
+            os.close(cached.fd)
+
+    def load_process(
+        self, pid: int, quiet: bool = False, tgid: Union[int, None] = None
+    ) -> Union[ProcessStat, None]:
+        """
+        /proc/[pid]/stat を読み込み ProcessStat として返す(PidStatFile.load と同じ)
+        tgid を指定した場合は pid をスレッドIDとして /proc/[tgid]/task/[pid]/stat を読み込む
+        プロセスが存在しない、または読み込み・パースに失敗した場合は None を返す
+        """
+        cached = self._files.get(pid)
+        if cached is not None:
+            self._files.move_to_end(pid)
+            process_stat = self._read_process(pid, cached, quiet)
+            if process_stat is not None and process_stat.resource.start_time == cached.start_time:
+                return process_stat
+            # 読み込めない or 開始時間が変わった -> 終了したか、PIDが再利用された
+            # 同じPIDの新しいプロセスがあるかもしれないので開き直す
+            self.discard(pid)
+
+        cached = self._open(pid, quiet, tgid)
+        if cached is None:
+            return None
+        process_stat = self._read_process(pid, cached, quiet)
+        if process_stat is None:
+            self.discard(pid)
+            return None
+        cached.start_time = process_stat.resource.start_time
+        return process_stat
+
+    def load_fields(
+        self, pid: int, fields: Sequence[int], quiet: bool = False
+    ) -> Union[Tuple[Union[int, str], ...], None]:
+        """
+        /proc/[pid]/stat を読み込み、指定したフィールドだけを返す(PidStatFile.load_fields と同じ)
+        PID再利用の検出のため、内部では開始時間(フィールド22)も一緒に取り出す
+        """
+        request = list(fields)
+        request.append(STAT_FIELD_START_TIME)
+        cached = self._files.get(pid)
+        if cached is not None:
+            self._files.move_to_end(pid)
+            values = self._read_fields(pid, cached, request, quiet)
+            if values is not None and values[-1] == cached.start_time:
+                return values[:-1]
+            self.discard(pid)
+
+        cached = self._open(pid, quiet)
+        if cached is None:
+            return None
+        values = self._read_fields(pid, cached, request, quiet)
+        if values is None:
+            self.discard(pid)
+            return None
+        cached.start_time = values[-1]  # type: ignore
+        return values[:-1]
+
+    def load_system(self, cpu_only: bool = False) -> Union[SystemStat, None]:
+        """/proc/stat を読み込み SystemStat として返す(SystemStatFile.load と同じ)"""
+        stats = self.stats
+        if stats is not None:
+            start = time.perf_counter()
+        try:
+            if self._system_fd < 0:
+                self._system_fd = os.open(f"{PROC_ROOT}/stat", os.O_RDONLY | os.O_CLOEXEC)
+            self._system_buffer, size = self._pread(self._system_fd, self._system_buffer)
+        except OSError as e:
+            print(f"Error reading /proc/stat: {e}", file=sys.stderr)
+            return None
+        if stats is not None:
+            read_end = time.perf_counter()
+            stats.read_seconds += read_end - start
+        if cpu_only:
+            # cpu の行の直後にある intr の行以降はデコードもしない
+            end = self._system_buffer.find(b"\nintr ", 0, size)
+            if end != -1:
+                size = end
+        lines = str(memoryview(self._system_buffer)[:size], "ascii").splitlines()
+        if not lines:
+            return None
+        system_stat = SystemStatFile._parse(lines, cpu_only)
+        if stats is not None:
+            stats.parse_seconds += time.perf_counter() - read_end
+        return system_stat
+
+    def close(self):
+        """開いている全てのファイルを閉じる"""
+        while self._files:
+            _, cached = self._files.popitem()
+            os.close(cached.fd)
+        if self._system_fd >= 0:
+            os.close(self._system_fd)
+            self._system_fd = -1
 
 
 class MeasurementResult:
+    __slots__ = (
+        "pid", "tgid", "usage_percent", "timestamp",
+        "minor_faults_per_second", "major_faults_per_second", "virtual_size", "rss", "memory_percent",
+        "read_kb_per_second", "write_kb_per_second", "cancelled_write_kb_per_second", "iops", "io_delay",
+        "voluntary_switches_per_second", "involuntary_switches_per_second", "wait_percent",
+    )
+
     def __init__(self):
+        self.pid = 0
+        # スレッドグループID(プロセスの場合は pid と同じ、スレッドの場合は所属するプロセスのPID)
+        self.tgid = 0
         self.usage_percent = 0.0
         self.timestamp = 0.0
+        # メモリ (-r)。CPU使用率と同じ /proc/[pid]/stat の読み込みから計算する
+        self.minor_faults_per_second = 0.0
+        self.major_faults_per_second = 0.0
+        self.virtual_size = 0  # バイト
+        self.rss = 0  # バイト
+        self.memory_percent = 0.0  # 物理メモリ(MemTotal)に対する RSS の割合
+        # I/O (-d)。/proc/[pid]/io を読み込めないプロセスは -1
+        self.read_kb_per_second = 0.0
+        self.write_kb_per_second = 0.0
+        self.cancelled_write_kb_per_second = 0.0
+        self.iops = 0.0  # read/write系のシステムコールの回数/秒
+        self.io_delay = 0  # 計測区間中にブロックI/Oを待っていた時間 (jiffies)
+        # スケジューリング (-w)。/proc/[pid]/schedstat を読み込めないプロセスは -1
+        self.voluntary_switches_per_second = 0.0
+        self.involuntary_switches_per_second = 0.0
+        self.wait_percent = 0.0  # 計測区間のうち実行キューで待っていた時間の割合
+
+
+def _calc_usage_percent(
+    process_stat1: ProcessStat,
+    process_stat2: ProcessStat,
+    system_stat1: SystemStat,
+    system_stat2: SystemStat,
+) -> float:
+    """2時点のスナップショットからプロセスのCPU使用率(%)を計算する"""
+    # --- CPU時間の変化量を計算(jiffies) ---
+    proc_time_diff = (
+        process_stat2.cpu_time.total_cpu_time - process_stat1.cpu_time.total_cpu_time
+    )
+    system_time_diff = system_stat2.cpu_time.total - system_stat1.cpu_time.total
+
+    # --- CPU使用率を計算(%) ---
+    # 変化量が0 -> CPU使用率0%
+    if system_time_diff == 0:
+        return 0.0
+    return (proc_time_diff / system_time_diff) * 100
+
+
+def _calc_memory(
+    result: MeasurementResult, process_stat1: ProcessStat, process_stat2: ProcessStat, mem_total: int
+):
+    """2時点のスナップショットからページフォールトの頻度とメモリ使用量を result に書き込む"""
+    elapsed = process_stat2.timestamp - process_stat1.timestamp
+    if elapsed > 0:
+        page_fault1 = process_stat1.page_fault
+        page_fault2 = process_stat2.page_fault
+        result.minor_faults_per_second = (page_fault2.minor_faults - page_fault1.minor_faults) / elapsed
+        result.major_faults_per_second = (page_fault2.major_faults - page_fault1.major_faults) / elapsed
+    result.virtual_size = process_stat2.resource.virtual_size
+    result.rss = process_stat2.resource.rss * PAGE_SIZE
+    if mem_total > 0:
+        result.memory_percent = result.rss / mem_total * 100
+
+
+def _calc_io(result: MeasurementResult, process_stat1: ProcessStat, process_stat2: ProcessStat):
+    """2時点のスナップショットからI/Oの頻度を result に書き込む。io がない場合は -1 にする"""
+    result.io_delay = process_stat2.io_delay - process_stat1.io_delay
+    io1 = process_stat1.io
+    io2 = process_stat2.io
+    elapsed = process_stat2.timestamp - process_stat1.timestamp
+    if io1 is None or io2 is None or elapsed <= 0:
+        result.read_kb_per_second = -1.0
+        result.write_kb_per_second = -1.0
+        result.cancelled_write_kb_per_second = -1.0
+        result.iops = -1.0
+        return
+    result.read_kb_per_second = (io2.read_bytes - io1.read_bytes) / 1024 / elapsed
+    result.write_kb_per_second = (io2.write_bytes - io1.write_bytes) / 1024 / elapsed
+    result.cancelled_write_kb_per_second = (io2.cancelled_write_bytes - io1.cancelled_write_bytes) / 1024 / elapsed
+    result.iops = (io2.syscr + io2.syscw - io1.syscr - io1.syscw) / elapsed
+
+
+def _calc_sched(result: MeasurementResult, process_stat1: ProcessStat, process_stat2: ProcessStat):
+    """2時点のスナップショットからコンテキストスイッチの頻度と %wait を result に書き込む"""
+    sched1 = process_stat1.sched
+    sched2 = process_stat2.sched
+    elapsed = process_stat2.timestamp - process_stat1.timestamp
+    if sched1 is None or sched2 is None or elapsed <= 0:
+        result.voluntary_switches_per_second = -1.0
+        result.involuntary_switches_per_second = -1.0
+        result.wait_percent = -1.0
+        return
+    result.voluntary_switches_per_second = (sched2.voluntary_switches - sched1.voluntary_switches) / elapsed
+    result.involuntary_switches_per_second = (sched2.involuntary_switches - sched1.involuntary_switches) / elapsed
+    result.wait_percent = (sched2.wait_time - sched1.wait_time) / (elapsed * 1e9) * 100
+
+
+def _calc_cpu_usage_percent(cpu_time1: SystemCpuTime, cpu_time2: SystemCpuTime) -> float:
+    """2時点の SystemCpuTime からCPU使用率(%)を計算する"""
+    # total_busy は total - idle なので total は1回だけ計算する
+    total_time_diff = cpu_time2.total - cpu_time1.total
+    busy_time_diff = total_time_diff - (cpu_time2.idle - cpu_time1.idle)
+
+    # 変化量が0 -> CPU使用率0%
+    if total_time_diff == 0:
+        return 0.0
+    return (busy_time_diff / total_time_diff) * 100
+
 
 def measure_process_stat(pid: int, delay: float = 1.0) -> Union[MeasurementResult, None]:
     """
@@ -470,74 +1236,2110 @@ def measure_process_stat(pid: int, delay: float = 1.0) -> Union[MeasurementResul
     if process_stat2 is None or system_stat2 is None:
         return None
 
-    # --- CPU時間の変化量を計算(jiffies) ---
-    proc_time_diff = (
-        process_stat2.cpu_time.total_cpu_time - process_stat1.cpu_time.total_cpu_time
-    )
-    system_time_diff = system_stat2.cpu_time.total - system_stat1.cpu_time.total
-
-
-    # --- CPU使用率を計算(%) ---
     result = MeasurementResult()
-    # 変化量が0 -> CPU使用率0%
-    if system_time_diff == 0:
-        result.usage_percent = 0.0
-    else:
-        result.usage_percent = (proc_time_diff / system_time_diff) * 100
+    result.pid = pid
+    result.usage_percent = _calc_usage_percent(
+        process_stat1, process_stat2, system_stat1, system_stat2
+    )
     result.timestamp = system_stat2.timestamp
     return result
 
-def measure_cpu_usage_percent(delay: float = 1.0) -> Union[float, None]:
-    # --- 時点 t1 のデータを取得 ---
-    system_stat1 = SystemStatFile.load()
-    if system_stat1 is None:
-        return None
-    
-    # ...
-    time.sleep(delay)
 
-    # --- 時点 t2 のデータを取得 ---
+class TopK:
+    """
+    値が大きい上位 k 件の MeasurementResult を保持する (--top)
+    サイズ k の最小ヒープで、先頭(k 番目)より小さい結果は比較1回で捨てるので
+    N 件を追加する計算量は O(N log k)
+    """
+
+    # --sort の名前 -> MeasurementResult の属性
+    KEYS = {
+        "cpu": "usage_percent",
+        "rss": "rss",
+        "minflt": "minor_faults_per_second",
+        "majflt": "major_faults_per_second",
+    }
+
+    def __init__(self, k: int, key: str = "cpu"):
+        if k < 1:
+            raise ValueError("k must be >= 1")
+        if key not in self.KEYS:
+            raise ValueError(f"unknown key: '{key}'")
+        self.k = k
+        self.key = key
+        self._attribute = self.KEYS[key]
+        # (値, PID, 結果) の最小ヒープ。PIDは一意なので結果同士が比較されることはない
+        self._heap: List[Tuple[float, int, MeasurementResult]] = []
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def clear(self):
+        self._heap.clear()
+
+    def push(self, result: MeasurementResult):
+        """結果を追加する。上位 k 件に入らない場合は何もしない"""
+        value = getattr(result, self._attribute)
+        heap = self._heap
+        if len(heap) < self.k:
+            heapq.heappush(heap, (value, result.pid, result))
+        elif value > heap[0][0]:
+            heapq.heapreplace(heap, (value, result.pid, result))
+
+    def items(self) -> List[MeasurementResult]:
+        """上位 k 件を値の大きい順に返す"""
+        return [entry[2] for entry in sorted(self._heap, reverse=True)]
+
+
+class _TreeNode:
+    """ProcessTree が保持するプロセスの情報"""
+
+    __slots__ = ("parent", "group", "session", "start_time", "cpu_time", "delta", "subtree")
+
+    def __init__(self):
+        self.parent: int = 0
+        self.group: int = 0
+        self.session: int = 0
+        self.start_time: int = 0
+        # 前回の tick の合計CPU時間 (jiffies)
+        self.cpu_time: int = 0
+        # 直近の tick でのCPU時間の増分 (jiffies)
+        self.delta: int = 0
+        # 自分と全ての子孫の delta の合計
+        self.subtree: int = 0
+
+
+class ProcessTree:
+    """
+    プロセスツリー(あるPIDとその全ての子孫)・プロセスグループ・セッションごとにCPU使用率を集計する
+    Sampler(tree=...) に渡すと、sample() で読み込んだ ProcessStat から親子関係の索引を差分で更新する
+    毎回 /proc から作り直さず、CPU時間の増分が前回の tick から変わったプロセスについてだけ
+    祖先の subtree とグループ・セッションの合計を更新する
+    """
+
+    # 親から切り離され、まだつなぎ直していないノードの parent
+    ORPHAN = -1
+
+    def __init__(self):
+        self._nodes: Dict[int, _TreeNode] = {}
+        # 親のPID -> 子のPID (親をまだ読み込んでいない場合もある)
+        self._children: Dict[int, Set[int]] = {}
+        # プロセスグループ・セッション -> delta の合計とプロセス数
+        self._group_delta: Dict[int, int] = {}
+        self._group_size: Dict[int, int] = {}
+        self._session_delta: Dict[int, int] = {}
+        self._session_size: Dict[int, int] = {}
+        # 直近の tick のシステム全体のCPU時間の増分 (Sampler が設定する)
+        self.system_time_diff: int = 0
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def __contains__(self, pid: object) -> bool:
+        return pid in self._nodes
+
+    def children(self, pid: int) -> Set[int]:
+        """pid の子プロセスのPID(コピーを返す)"""
+        return set(self._children.get(pid, ()))
+
+    def _propagate(self, parent: int, diff: int):
+        """parent から根までの祖先の subtree に diff を加える"""
+        nodes = self._nodes
+        node = nodes.get(parent)
+        # 親子関係は循環しないように管理しているが、念のため辿る回数をノード数までにする
+        for _ in range(len(nodes)):
+            if node is None:
+                return
+            node.subtree += diff
+            node = nodes.get(node.parent)
+
+    @staticmethod
+    def _add(totals: Dict[int, int], sizes: Dict[int, int], key: int, delta: int, size: int):
+        """グループ・セッションの合計を更新する。プロセスがいなくなったキーは削除する"""
+        count = sizes.get(key, 0) + size
+        if count == 0:
+            sizes.pop(key, None)
+            totals.pop(key, None)
+            return
+        sizes[key] = count
+        totals[key] = totals.get(key, 0) + delta
+
+    def _insert(self, pid: int, process_stat: ProcessStat) -> _TreeNode:
+        """ノードを追加する。親にはまだつながない(parent は ORPHAN)"""
+        basic = process_stat.basic
+        node = _TreeNode()
+        node.parent = ProcessTree.ORPHAN
+        node.group = basic.gid
+        node.session = basic.session
+        node.start_time = process_stat.resource.start_time
+        node.cpu_time = process_stat.cpu_time.total_cpu_time
+        # 先に読み込まれた子がいればその分を含める
+        nodes = self._nodes
+        for child in self._children.get(pid, ()):
+            child_node = nodes.get(child)
+            if child_node is not None:
+                node.subtree += child_node.subtree
+        nodes[pid] = node
+        self._add(self._group_delta, self._group_size, node.group, 0, 1)
+        self._add(self._session_delta, self._session_size, node.session, 0, 1)
+        return node
+
+    def _detach(self, pid: int, node: _TreeNode):
+        """node を親から切り離す(祖先の subtree から node の subtree を引く)"""
+        self._propagate(node.parent, -node.subtree)
+        siblings = self._children.get(node.parent)
+        if siblings is not None:
+            siblings.discard(pid)
+            if not siblings:
+                del self._children[node.parent]
+        node.parent = ProcessTree.ORPHAN
+
+    def _attach(self, pid: int, node: _TreeNode, parents: Dict[int, int]):
+        """
+        切り離されている node を parents[pid] の子にする(祖先の subtree に node の subtree を加える)
+        parents は今回の tick の親で、つなぐと循環してしまう場合は切り離したままにする
+        """
+        nodes = self._nodes
+        parent = parents[pid]
+        ancestor = parent
+        for _ in range(len(nodes)):
+            if ancestor == pid:
+                # 古い情報のノードが残っていて循環する。次の tick でつなぎ直す
+                parents[pid] = ProcessTree.ORPHAN
+                return
+            ancestor_node = nodes.get(ancestor)
+            if ancestor_node is None:
+                break
+            ancestor = parents.get(ancestor, ancestor_node.parent)
+        node.parent = parent
+        self._children.setdefault(parent, set()).add(pid)
+        self._propagate(parent, node.subtree)
+
+    def update(self, pid: int, process_stat: ProcessStat):
+        """読み込んだ ProcessStat で索引と集計を更新する(1プロセスだけの update_all)"""
+        self.update_all({pid: process_stat})
+
+    def update_all(self, processes: Dict[int, ProcessStat]):
+        """
+        1 tick 分の ProcessStat で索引と集計を更新する
+        PIDの再利用や親の変更で途中の状態に循環ができないように、次の順番で更新する
+        1. 再利用されたPIDの古いノードを削除し、親が変わったノードを古い親から切り離す
+        2. 新しいノードを追加し、切り離したノードを全て今回の tick の親につなぐ
+        3. CPU時間の増分を祖先とグループ・セッションの合計に加える
+        """
+        nodes = self._nodes
+        # 切り離したノードのPID -> 今回の tick の親
+        parents: Dict[int, int] = {}
+        for pid, process_stat in processes.items():
+            node = nodes.get(pid)
+            if node is not None and node.start_time != process_stat.resource.start_time:
+                # PIDが再利用された別プロセス
+                self.remove(pid)
+        for pid, process_stat in processes.items():
+            node = nodes.get(pid)
+            if node is not None and node.parent != process_stat.basic.parent_pid:
+                # 親が終了して init などに引き取られた(remove で親を失った子も含む)
+                self._detach(pid, node)
+                parents[pid] = process_stat.basic.parent_pid
+
+        inserted: Set[int] = set()
+        for pid, process_stat in processes.items():
+            basic = process_stat.basic
+            node = nodes.get(pid)
+            if node is None:
+                self._insert(pid, process_stat)
+                inserted.add(pid)
+                parents[pid] = basic.parent_pid
+                continue
+            if node.group != basic.gid:
+                self._add(self._group_delta, self._group_size, node.group, -node.delta, -1)
+                node.group = basic.gid
+                self._add(self._group_delta, self._group_size, node.group, node.delta, 1)
+            if node.session != basic.session:
+                self._add(self._session_delta, self._session_size, node.session, -node.delta, -1)
+                node.session = basic.session
+                self._add(self._session_delta, self._session_size, node.session, node.delta, 1)
+        # つなぐ順番によらず結果は同じ: まだつないでいない祖先で止まった分は、その祖先をつなぐときに加わる
+        for pid in list(parents):
+            self._attach(pid, nodes[pid], parents)
+
+        for pid, process_stat in processes.items():
+            if pid in inserted:
+                continue
+            node = nodes[pid]
+            cpu_time = process_stat.cpu_time.total_cpu_time
+            delta = cpu_time - node.cpu_time
+            node.cpu_time = cpu_time
+            diff = delta - node.delta
+            if diff == 0:
+                # 増分が前回と同じ(アイドルのプロセスは 0 のまま)なので集計は変わらない
+                continue
+            node.delta = delta
+            node.subtree += diff
+            self._propagate(node.parent, diff)
+            self._group_delta[node.group] += diff
+            self._session_delta[node.session] += diff
+
+    def remove(self, pid: int):
+        """終了したプロセスを削除する。子孫の分も祖先の subtree から引く"""
+        node = self._nodes.pop(pid, None)
+        if node is None:
+            return
+        self._detach(pid, node)
+        self._add(self._group_delta, self._group_size, node.group, -node.delta, -1)
+        self._add(self._session_delta, self._session_size, node.session, -node.delta, -1)
+        # 子は古い親の subtree と一緒に祖先から引かれている。次に読み込んだときに新しい親につなぐ
+        nodes = self._nodes
+        for child in self._children.pop(pid, ()):
+            child_node = nodes.get(child)
+            if child_node is not None:
+                child_node.parent = ProcessTree.ORPHAN
+
+    def _percent(self, jiffies: int) -> float:
+        if self.system_time_diff == 0:
+            return 0.0
+        return jiffies / self.system_time_diff * 100
+
+    def tree_usage_percent(self, pid: int) -> Union[float, None]:
+        """pid とその全ての子孫のCPU使用率(%)の合計。pid がない場合は None"""
+        node = self._nodes.get(pid)
+        if node is None:
+            return None
+        return self._percent(node.subtree)
+
+    def group_usages_percent(self) -> Dict[int, float]:
+        """プロセスグループID -> CPU使用率(%)の合計"""
+        return {group: self._percent(delta) for group, delta in self._group_delta.items()}
+
+    def session_usages_percent(self) -> Dict[int, float]:
+        """セッションID -> CPU使用率(%)の合計"""
+        return {session: self._percent(delta) for session, delta in self._session_delta.items()}
+
+
+class Sampler:
+    """
+    複数PIDのCPU使用率をまとめて計測するクラス
+    1回のサンプリング(tick)で /proc/stat を1回、各 /proc/[pid]/stat を1回ずつ読み込み、
+    全PIDの結果を同じ計測区間から計算する
+    """
+
+    def __init__(
+        self,
+        pids: Iterable[int] = (),
+        cache: Union[StatFileCache, None] = None,
+        scanner: Union["ParallelScanner", None] = None,
+        shared_system: Union["SharedSystemStat", None] = None,
+        io: bool = False,
+        sched: bool = False,
+        tree: Union[ProcessTree, None] = None,
+        top: Union[TopK, None] = None,
+        memory: bool = False,
+    ):
+        self._pids: Set[int] = set(pids)
+        # 指定された場合はファイルを開いたままにして読み込む
+        self._cache = cache
+        # 指定された場合は /proc/[pid]/stat を並列に読み込む(cache より優先)
+        self._scanner = scanner
+        # 指定された場合は /proc/stat のスナップショットを他の Sampler と共有する
+        self._shared_system = shared_system
+        # 前回サンプリング時のスナップショット
+        self._prev_system: Union[SystemStat, None] = None
+        self._prev_processes: Dict[int, ProcessStat] = {}
+        # 直前の sample() で計算したシステム全体のCPU使用率(%)
+        self.system_usage_percent: Union[float, None] = None
+        # True の場合はページフォルト・VSZ・RSS・%MEM も計算する (-r)
+        self.memory = memory
+        # %MEM の計算に使う物理メモリの総量(バイト)。最初に必要になったときに1回だけ読み込む
+        self._mem_total: Union[int, None] = None
+        # True の場合は /proc/[pid]/io も読み込む (-d)
+        self.io = io
+        # /proc/[pid]/io の読み込み権限がなかったPID。PIDが消えるまで読み込みを試さない
+        self._io_denied: Set[int] = set()
+        self._io_warned = False
+        # True の場合は /proc/[pid]/status と /proc/[pid]/schedstat も読み込む (-w)
+        self.sched = sched
+        # 指定された場合はプロセスツリー・グループ・セッションごとの集計を更新する
+        self.tree = tree
+        # 指定された場合は sample() のたびに上位 k 件を選び直す
+        self.top = top
+        # 読み込めなかったことを報告済みのPID。tick ごとに同じエラーを表示しない
+        self._missing: Set[int] = set()
+
+    @property
+    def pids(self) -> Set[int]:
+        """計測対象のPID(コピーを返す)"""
+        return set(self._pids)
+
+    @property
+    def last_system(self) -> Union[SystemStat, None]:
+        """直前の sample() で読み込んだ SystemStat"""
+        return self._prev_system
+
+    @property
+    def last_processes(self) -> Dict[int, ProcessStat]:
+        """直前の sample() で読み込んだ PID -> ProcessStat (変更しないこと)"""
+        return self._prev_processes
+
+    def add_pid(self, pid: int):
+        """計測対象のPIDを追加する(次回のサンプリングから有効)"""
+        self._pids.add(pid)
+
+    def remove_pid(self, pid: int):
+        """計測対象のPIDを削除する"""
+        self._pids.discard(pid)
+        self._missing.discard(pid)
+        self._forget(pid)
+
+    def _forget(self, pid: int):
+        self._prev_processes.pop(pid, None)
+        self._io_denied.discard(pid)
+        if self.tree is not None:
+            self.tree.remove(pid)
+        if self._cache is not None:
+            self._cache.discard(pid)
+        if self._scanner is not None:
+            self._scanner.discard(pid)
+
+    def close(self):
+        """渡された StatFileCache と ParallelScanner も含めて、開いているファイルとワーカーを閉じる"""
+        if self._scanner is not None:
+            self._scanner.close()
+        if self._cache is not None:
+            self._cache.close()
+
+    def _target_pids(self) -> List[int]:
+        # 実行中にPIDが追加・削除されても影響を受けないようにコピーしてから回す
+        return list(self._pids)
+
+    def _load_system(self) -> Union[SystemStat, None]:
+        # プロセスのCPU使用率の計算に必要なのはCPU時間だけ
+        if self._shared_system is not None:
+            return self._shared_system.load()
+        if self._cache is not None:
+            return self._cache.load_system(cpu_only=True)
+        return SystemStatFile.load(cpu_only=True)
+
+    def _load_process(self, pid: int) -> Union[ProcessStat, None]:
+        # 指定されたPIDが終了したことは _report_missing で1回だけ表示する
+        if self._cache is not None:
+            return self._cache.load_process(pid, quiet=True)
+        return PidStatFile.load(pid, quiet=True)
+
+    def _report_missing(self, loaded: Dict[int, ProcessStat]):
+        """指定されたPIDのうち読み込めなかったものを、PIDごとに1回だけ標準エラー出力に表示する"""
+        missing = self._missing
+        for pid in self._pids:
+            if pid in loaded:
+                missing.discard(pid)
+            elif pid not in missing:
+                print(f"Error: Process with PID {pid} not found.", file=sys.stderr)
+                missing.add(pid)
+
+    def _load_io(self, pid: int) -> Union[ProcessIo, None]:
+        return PidIoFile.load(pid, quiet=True)
+
+    def _attach_io(self, loaded: Dict[int, ProcessStat]):
+        """読み込んだ ProcessStat に /proc/[pid]/io を読み込んで追加する"""
+        denied = self._io_denied
+        for pid, process_stat in loaded.items():
+            if pid in denied:
+                continue
+            try:
+                process_stat.io = self._load_io(pid)
+            except PermissionError:
+                # 他のユーザーのプロセス。tick ごとに表示しないよう、最初の1回だけ警告する
+                if not self._io_warned:
+                    print(
+                        f"Warning: permission denied reading /proc/{pid}/io; "
+                        "I/O of such processes is reported as -1.",
+                        file=sys.stderr,
+                    )
+                    self._io_warned = True
+                denied.add(pid)
+
+    def _load_sched(self, pid: int) -> Union[ProcessSchedStat, None]:
+        return PidSchedFile.load(pid, quiet=True)
+
+    def _attach_sched(self, loaded: Dict[int, ProcessStat]):
+        """読み込んだ ProcessStat に /proc/[pid]/status と schedstat の情報を追加する"""
+        for pid, process_stat in loaded.items():
+            process_stat.sched = self._load_sched(pid)
+
+    def _stats(self) -> Union["SelfStats", None]:
+        return self._cache.stats if self._cache is not None else None
+
+    def _load_processes(self, pids: List[int]) -> Dict[int, ProcessStat]:
+        """対象のPIDを全て読み込む。読み込めなかったPIDは結果に含まれない"""
+        if self._scanner is not None:
+            stats = self._stats()
+            if stats is None:
+                return self._scanner.scan(pids)
+            # ワーカー内では読み込みとパースを分けて計測できないので、scan 全体を読み込みとして加算する
+            start = time.perf_counter()
+            scanned = self._scanner.scan(pids)
+            stats.read_seconds += time.perf_counter() - start
+            return scanned
+        loaded: Dict[int, ProcessStat] = {}
+        for pid in pids:
+            process_stat = self._load_process(pid)
+            if process_stat is not None:
+                loaded[pid] = process_stat
+        return loaded
+
+    def sample(self) -> Dict[int, MeasurementResult]:
+        """
+        前回の sample() 呼び出しからのCPU使用率をPIDごとに計算する
+        初回(または追加直後のPID)は基準となるスナップショットを取得するだけなので結果に含まれない
+        """
+        system_stat = self._load_system()
+        if system_stat is None:
+            return {}
+
+        prev_system = self._prev_system
+        # 前回の ProcessStat を保持するテーブル
+        # 毎回作り直さず、読み込めたPIDは上書き・消えたPIDは削除する
+        table = self._prev_processes
+        results: Dict[int, MeasurementResult] = {}
+        loaded = self._load_processes(self._target_pids())
+        self._report_missing(loaded)
+        if self.io or self.sched:
+            # io, sched, status はパースが軽いので、読み込みとしてまとめて加算する
+            stats = self._stats()
+            start = time.perf_counter() if stats is not None else 0.0
+            if self.io:
+                self._attach_io(loaded)
+            if self.sched:
+                self._attach_sched(loaded)
+            if stats is not None:
+                stats.read_seconds += time.perf_counter() - start
+        memory = self.memory
+        mem_total = 0
+        if memory and prev_system is not None:
+            if self._mem_total is None:
+                self._mem_total = MemInfoFile.load_mem_total()
+            mem_total = self._mem_total
+        tree = self.tree
+        top = self.top
+        if top is not None:
+            top.clear()
+
+        for pid, process_stat in loaded.items():
+            prev = table.get(pid)
+            table[pid] = process_stat
+
+            if prev is None or prev_system is None:
+                continue
+            # 開始時間が違う -> PIDが再利用された別プロセスなので差分は取れない
+            if prev.resource.start_time != process_stat.resource.start_time:
+                continue
+
+            result = MeasurementResult()
+            result.pid = pid
+            result.tgid = pid
+            result.usage_percent = _calc_usage_percent(
+                prev, process_stat, prev_system, system_stat
+            )
+            if memory:
+                _calc_memory(result, prev, process_stat, mem_total)
+            if self.io:
+                _calc_io(result, prev, process_stat)
+            if self.sched:
+                _calc_sched(result, prev, process_stat)
+            result.timestamp = system_stat.timestamp
+            results[pid] = result
+            if top is not None:
+                top.push(result)
+
+        # テーブルの件数が今回読み込めた件数より多い
+        # -> 終了した(読み込めなかった)か、対象から外れたPIDが残っている
+        if len(table) > len(loaded):
+            for pid in [pid for pid in table if pid not in loaded]:
+                self._forget(pid)
+        if tree is not None:
+            # 終了したプロセスを削除してから、今回の tick の親子関係でまとめて更新する
+            tree.update_all(loaded)
+
+        if prev_system is not None:
+            self.system_usage_percent = _calc_cpu_usage_percent(
+                prev_system.cpu_time, system_stat.cpu_time
+            )
+            if tree is not None:
+                tree.system_time_diff = system_stat.cpu_time.total - prev_system.cpu_time.total
+        self._prev_system = system_stat
+        return results
+
+    def measure(self, delay: float = 1.0) -> Dict[int, MeasurementResult]:
+        """
+        t1 のスナップショットを取得し、delay 秒後の t2 との差分から全PIDのCPU使用率を計測する
+        PIDの数に関係なく sleep は1回だけ
+        """
+        self.sample()
+        time.sleep(delay)
+        return self.sample()
+
+
+def list_pids() -> List[int]:
+    """
+    /proc に存在する全プロセスのPIDを返す
+    ディレクトリ名が数字のものだけを対象にする(stat()は呼ばない)
+    """
+    try:
+        names = os.listdir(PROC_ROOT)
+    except OSError as e:
+        print(f"Error listing /proc: {e}", file=sys.stderr)
+        return []
+    return [int(name) for name in names if name.isdigit()]
+
+
+class AllProcessSampler(Sampler):
+    """
+    /proc に存在する全プロセスを対象にする Sampler (-p ALL)
+    tick ごとに /proc を列挙し、新しいPIDは追加・終了したPIDは削除する
+    """
+
+    def __init__(
+        self,
+        cache: Union[StatFileCache, None] = None,
+        scanner: Union["ParallelScanner", None] = None,
+        io: bool = False,
+        sched: bool = False,
+        tree: Union[ProcessTree, None] = None,
+        memory: bool = False,
+    ):
+        super().__init__(cache=cache, scanner=scanner, io=io, sched=sched, tree=tree, memory=memory)
+
+    def _target_pids(self) -> List[int]:
+        return list_pids()
+
+
+# プロセスプールのワーカーごとの StatFileCache (_init_worker で作る)
+_worker_cache: Union[StatFileCache, None] = None
+
+
+def _init_worker(proc_root: str):
+    """
+    プロセスプールのワーカーの初期化
+    spawn/forkserver で起動したワーカーには親の PROC_ROOT が引き継がれないので引数で受け取る
+    """
+    global _worker_cache
+    set_proc_root(proc_root)
+    _worker_cache = StatFileCache()
+
+
+def _load_shard(
+    pids: List[int], cache: Union[StatFileCache, None] = None, discarded: Sequence[int] = ()
+) -> List[ProcessStat]:
+    """
+    ParallelScanner のワーカーで実行する処理(プロセスプールで使うためモジュールレベルに置く)
+    cache を省略した場合はワーカーの StatFileCache を使い、先に discarded のPIDのファイルを閉じる
+    列挙してから読み込むまでに終了するプロセスは普通にあるのでエラー表示しない
+    (指定されたPIDが終了したことは Sampler._report_missing が表示する)
+    """
+    if cache is None:
+        cache = _worker_cache
+        if cache is not None:
+            for pid in discarded:
+                cache.discard(pid)
+    loaded = []
+    for pid in pids:
+        if cache is not None:
+            process_stat = cache.load_process(pid, quiet=True)
+        else:
+            process_stat = PidStatFile.load(pid, quiet=True)
+        if process_stat is not None:
+            loaded.append(process_stat)
+    return loaded
+
+
+def _worker_open_pids() -> List[int]:
+    """プロセスプールのワーカーの StatFileCache が開いているPID"""
+    return sorted(_worker_cache._files) if _worker_cache is not None else []
+
+
+class ParallelScanner:
+    """
+    多数のPIDの /proc/[pid]/stat を分割(シャード)して並列に読み込み・解析する
+    - mode="thread": スレッドプール。ファイルの読み込み(システムコール)中は GIL が解放される
+    - mode="process": プロセスプール。解析が GIL で律速する場合に使う
+    結果は1つの辞書にまとめ、全PIDで同じタイムスタンプにする
+    PIDは pid % shards でシャードに分けるので、同じPIDは毎回同じシャードで読み込まれる
+    スレッドプールではシャードごと、プロセスプールではワーカーごとに StatFileCache でファイルを開いたままにする
+    プロセスプールはワーカーごとに1プロセスのプールを作り、同じPIDを毎回同じワーカーに送る
+    """
+
+    MODES = ("thread", "process")
+
+    def __init__(self, workers: Union[int, None] = None, mode: str = "thread", shards_per_worker: int = 4):
+        if mode not in ParallelScanner.MODES:
+            raise ValueError(f"mode must be one of {ParallelScanner.MODES}")
+        self.workers: int = workers if workers is not None else (os.cpu_count() or 1)
+        if self.workers < 1:
+            raise ValueError("workers must be >= 1")
+        self.mode: str = mode
+        # ワーカー間の負荷の偏りを減らすため、ワーカー数より多めに分割する
+        self.shards: int = self.workers * max(1, shards_per_worker)
+        self._executor: Union[Executor, None] = None
+        # mode="process" のワーカーごとのプールと、次の scan でワーカーに閉じさせるPID
+        self._executors: List[ProcessPoolExecutor] = []
+        self._discarded: List[List[int]] = [[] for _ in range(self.workers)]
+        # シャードごとの StatFileCache。1つのシャードを同時に読み込むのは1スレッドだけなのでロックは不要
+        # プロセスプールでも、ワーカーを使わずに読み込む場合(PIDが少ない場合)に使う
+        max_files = max(16, _default_max_files() // self.shards)
+        self._caches: List[StatFileCache] = [StatFileCache(max_files) for _ in range(self.shards)]
+
+    def __enter__(self) -> "ParallelScanner":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="pidstat-scan")
+        return self._executor
+
+    def _get_executors(self) -> List[ProcessPoolExecutor]:
+        if not self._executors:
+            context: multiprocessing.context.BaseContext = multiprocessing.get_context()
+            if context.get_start_method() == "fork":
+                # 2つ目以降のプールは先に起動したプールの管理スレッドがある状態で fork することになるので避ける
+                context = multiprocessing.get_context("forkserver")
+            self._executors = [
+                ProcessPoolExecutor(1, mp_context=context, initializer=_init_worker, initargs=(PROC_ROOT,))
+                for _ in range(self.workers)
+            ]
+        return self._executors
+
+    def _scan_processes(self, pids: Sequence[int]) -> List[ProcessStat]:
+        """ワーカーのキャッシュが当たるよう、pid % workers で決まるワーカーで読み込む"""
+        # shards は workers の倍数なので、同じシャードのPIDは同じワーカーに送られる
+        groups: List[List[int]] = [[] for _ in range(self.workers)]
+        for pid in pids:
+            groups[pid % self.workers].append(pid)
+        futures = []
+        for executor, group, discarded in zip(self._get_executors(), groups, self._discarded):
+            futures.append(executor.submit(_load_shard, group, None, list(discarded)))
+            discarded.clear()
+        stats: List[ProcessStat] = []
+        for future in futures:
+            stats.extend(future.result())
+        return stats
+
+    def scan(self, pids: Sequence[int]) -> Dict[int, ProcessStat]:
+        """PIDを読み込み、PID -> ProcessStat の辞書を返す。読み込めなかったPIDは含まれない"""
+        # 飛び飛びに分割する(PIDの大きさとプロセスの種類の偏りを均す)
+        shards: List[List[int]] = [[] for _ in range(self.shards)]
+        for pid in pids:
+            shards[pid % self.shards].append(pid)
+        stats: List[ProcessStat] = []
+        if self.workers == 1 or len(pids) < self.shards:
+            for shard, cache in zip(shards, self._caches):
+                stats.extend(_load_shard(shard, cache))
+        elif self.mode == "process":
+            stats = self._scan_processes(pids)
+        else:
+            for shard_stats in self._get_executor().map(_load_shard, shards, self._caches):
+                stats.extend(shard_stats)
+
+        timestamp = time.time()
+        loaded: Dict[int, ProcessStat] = {}
+        for process_stat in stats:
+            process_stat.timestamp = timestamp
+            loaded[process_stat.basic.pid] = process_stat
+        return loaded
+
+    def discard(self, pid: int):
+        """
+        PIDのファイルを閉じる
+        プロセスプールのワーカーが開いたファイルは、次の scan でそのワーカーが閉じる
+        """
+        self._caches[pid % self.shards].discard(pid)
+        if self._executors:
+            self._discarded[pid % self.workers].append(pid)
+
+    def close(self):
+        """ワーカーを終了し、開いている全てのファイルを閉じる"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        for executor in self._executors:
+            executor.shutdown()
+        self._executors = []
+        for discarded in self._discarded:
+            discarded.clear()
+        for cache in self._caches:
+            cache.close()
+
+
+def list_tids(pid: int) -> List[int]:
+    """/proc/[pid]/task を1回だけ列挙し、プロセスの全スレッドのIDを返す"""
+    try:
+        names = os.listdir(f"{PROC_ROOT}/{pid}/task")
+    except OSError:
+        # プロセスが終了している
+        return []
+    return [int(name) for name in names if name.isdigit()]
+
+
+class ThreadSampler(Sampler):
+    """
+    スレッドごとのCPU使用率を計測する Sampler (-t)
+    tick ごとに各プロセスの /proc/[pid]/task を1回だけ列挙し、/proc/[pid]/task/[tid]/stat を読み込む
+    結果はTIDをキーにした辞書で、MeasurementResult.tgid に所属するプロセスのPIDが入る
+    all_processes=True の場合は /proc の全プロセスのスレッドを対象にする
+    """
+
+    def __init__(
+        self,
+        pids: Iterable[int] = (),
+        cache: Union[StatFileCache, None] = None,
+        all_processes: bool = False,
+        io: bool = False,
+        sched: bool = False,
+        memory: bool = False,
+    ):
+        super().__init__(pids, cache, io=io, sched=sched, memory=memory)
+        self.all_processes = all_processes
+        # TID -> 所属するプロセスのPID (今回の tick で列挙したもの)
+        self._tgids: Dict[int, int] = {}
+
+    def _target_pids(self) -> List[int]:
+        tgids = self._tgids
+        tgids.clear()
+        pids = list_pids() if self.all_processes else list(self._pids)
+        for pid in pids:
+            for tid in list_tids(pid):
+                tgids[tid] = pid
+        return list(tgids)
+
+    def _load_process(self, pid: int) -> Union[ProcessStat, None]:
+        tgid = self._tgids[pid]
+        if self._cache is not None:
+            return self._cache.load_process(pid, quiet=True, tgid=tgid)
+        return PidStatFile.load_task(tgid, pid, quiet=True)
+
+    def _load_io(self, pid: int) -> Union[ProcessIo, None]:
+        return PidIoFile.load_task(self._tgids[pid], pid, quiet=True)
+
+    def _load_sched(self, pid: int) -> Union[ProcessSchedStat, None]:
+        return PidSchedFile.load_task(self._tgids[pid], pid, quiet=True)
+
+    def sample(self) -> Dict[int, MeasurementResult]:
+        results = super().sample()
+        tgids = self._tgids
+        for tid, result in results.items():
+            result.tgid = tgids[tid]
+        return results
+
+
+class CgroupCpuStat:
+    """cgroup v2 の cpu.stat と cpu.max の情報(時間はマイクロ秒、回数と時間は全て累計)"""
+
+    __slots__ = (
+        "usage_usec", "user_usec", "system_usec", "nr_periods", "nr_throttled", "throttled_usec",
+        "quota_usec", "period_usec", "timestamp",
+    )
+
+    def __init__(self):
+        self.usage_usec: int = 0  # cgroup 内の全プロセスのCPU時間(終了したプロセスの分も含む)
+        self.user_usec: int = 0
+        self.system_usec: int = 0
+        self.nr_periods: int = 0  # 経過した cpu.max の期間の数
+        self.nr_throttled: int = 0  # クォータを使い切って止められた期間の数
+        self.throttled_usec: int = 0  # 止められていた時間
+        # cpu.max: period_usec ごとに quota_usec まで使える。制限がない場合(max)は None
+        self.quota_usec: Union[int, None] = None
+        self.period_usec: int = 100000
+        # 読み込んだときのタイムスタンプ - time.time()
+        self.timestamp: float = 0.0
+
+
+class CgroupStatFile:
+    """cgroup v2 の cpu.stat と cpu.max を読み込むクラス"""
+
+    @staticmethod
+    def path(cgroup: str) -> str:
+        """cgroup のパス(CGROUP_ROOT からの相対パスまたは絶対パス)をディレクトリのパスにする"""
+        if cgroup.startswith(CGROUP_ROOT + "/") or cgroup == CGROUP_ROOT:
+            return cgroup
+        return f"{CGROUP_ROOT}/{cgroup.strip('/')}".rstrip("/")
+
+    @staticmethod
+    def _parse(cpu_stat: str, cpu_max: Union[str, None]) -> CgroupCpuStat:
+        stat = CgroupCpuStat()
+        for line in cpu_stat.splitlines():
+            # 例: "usage_usec 123456"
+            name, _, value = line.partition(" ")
+            if name in CgroupCpuStat.__slots__:
+                setattr(stat, name, int(value))
+        if cpu_max is not None:
+            # 例: "50000 100000" または "max 100000"
+            quota, _, period = cpu_max.strip().partition(" ")
+            stat.quota_usec = None if quota == "max" else int(quota)
+            if period:
+                stat.period_usec = int(period)
+        return stat
+
+    @staticmethod
+    def load(cgroup: str, quiet: bool = False) -> Union[CgroupCpuStat, None]:
+        """
+        cgroup の cpu.stat と cpu.max を読み込み CgroupCpuStat として返す
+        ルートの cgroup には cpu.max がないので制限なしとして扱う
+        cgroup が存在しない、または読み込み・パースに失敗した場合は None を返す
+        """
+        directory = CgroupStatFile.path(cgroup)
+        try:
+            with open(f"{directory}/cpu.stat", "r") as f:
+                cpu_stat = f.read()
+        except FileNotFoundError:
+            if not quiet:
+                print(f"Error: cgroup {cgroup} not found or the cpu controller is not enabled.", file=sys.stderr)
+            return None
+        except OSError as e:
+            if not quiet:
+                print(f"Error reading {directory}/cpu.stat: {e}", file=sys.stderr)
+            return None
+        try:
+            with open(f"{directory}/cpu.max", "r") as f:
+                cpu_max: Union[str, None] = f.read()
+        except OSError:
+            cpu_max = None
+        try:
+            stat = CgroupStatFile._parse(cpu_stat, cpu_max)
+        except ValueError as e:
+            print(f"Error parsing {directory}/cpu.stat: {e}", file=sys.stderr)
+            return None
+        stat.timestamp = time.time()
+        return stat
+
+
+class CgroupResult:
+    """CgroupSampler の計測結果"""
+
+    __slots__ = (
+        "cgroup", "usage_percent", "user_percent", "system_percent", "quota_percent",
+        "throttled_per_second", "throttled_percent", "timestamp",
+    )
+
+    def __init__(self):
+        self.cgroup: str = ""
+        # システム全体のCPU時間(全CPUの合計)に対する割合 (%CPU と同じ基準)
+        self.usage_percent: float = 0.0
+        self.user_percent: float = 0.0
+        self.system_percent: float = 0.0
+        # cpu.max のクォータに対する割合。制限がない場合は None
+        self.quota_percent: Union[float, None] = None
+        # クォータを使い切って止められた期間の数/秒と、止められていた時間の割合
+        self.throttled_per_second: float = 0.0
+        self.throttled_percent: float = 0.0
+        self.timestamp: float = 0.0
+
+
+def _calc_cgroup(cgroup: str, stat1: CgroupCpuStat, stat2: CgroupCpuStat, system_time_diff: int) -> CgroupResult:
+    """2時点の cpu.stat と /proc/stat のCPU時間の増分(jiffies)から使用率を計算する"""
+    result = CgroupResult()
+    result.cgroup = cgroup
+    result.timestamp = stat2.timestamp
+    system_usec = jiffies_to_seconds(system_time_diff) * 1e6
+    if system_usec > 0:
+        result.usage_percent = (stat2.usage_usec - stat1.usage_usec) / system_usec * 100
+        result.user_percent = (stat2.user_usec - stat1.user_usec) / system_usec * 100
+        result.system_percent = (stat2.system_usec - stat1.system_usec) / system_usec * 100
+    elapsed = stat2.timestamp - stat1.timestamp
+    if elapsed > 0:
+        elapsed_usec = elapsed * 1e6
+        if stat2.quota_usec is not None and stat2.period_usec > 0:
+            # 経過時間の間に使えたCPU時間 = 経過時間 * quota / period
+            allowed_usec = elapsed_usec * stat2.quota_usec / stat2.period_usec
+            result.quota_percent = (stat2.usage_usec - stat1.usage_usec) / allowed_usec * 100
+        result.throttled_per_second = (stat2.nr_throttled - stat1.nr_throttled) / elapsed
+        result.throttled_percent = (stat2.throttled_usec - stat1.throttled_usec) / elapsed_usec * 100
+    return result
+
+
+class CgroupSampler:
+    """
+    cgroup v2 ごとのCPU使用率を計測する (--cgroup)
+    1回のサンプリングで /proc/stat を1回、各 cgroup の cpu.stat と cpu.max を1回ずつ読み込む
+    cpu.stat はカーネルが cgroup ごとに集計しているので、プロセスの数に関係なく読み込みは一定で、
+    計測区間中に終了したプロセスのCPU時間も含まれる
+    """
+
+    def __init__(
+        self,
+        cgroups: Iterable[str] = (),
+        cache: Union[StatFileCache, None] = None,
+        shared_system: Union["SharedSystemStat", None] = None,
+    ):
+        self._cgroups: List[str] = []
+        for cgroup in cgroups:
+            self.add_cgroup(cgroup)
+        self._cache = cache
+        self._shared_system = shared_system
+        self._prev_system: Union[SystemStat, None] = None
+        self._prev_stats: Dict[str, CgroupCpuStat] = {}
+        # 読み込めなかった cgroup。エラーは読み込めるようになるまで1回だけ表示する
+        self._missing: Set[str] = set()
+
+    @property
+    def cgroups(self) -> List[str]:
+        """計測対象の cgroup (コピーを返す)"""
+        return list(self._cgroups)
+
+    def add_cgroup(self, cgroup: str):
+        """計測対象の cgroup を追加する(次回のサンプリングから有効)"""
+        if cgroup not in self._cgroups:
+            self._cgroups.append(cgroup)
+
+    def remove_cgroup(self, cgroup: str):
+        """計測対象の cgroup を削除する"""
+        if cgroup in self._cgroups:
+            self._cgroups.remove(cgroup)
+        self._prev_stats.pop(cgroup, None)
+        self._missing.discard(cgroup)
+
+    def _load_system(self) -> Union[SystemStat, None]:
+        if self._shared_system is not None:
+            return self._shared_system.load()
+        if self._cache is not None:
+            return self._cache.load_system(cpu_only=True)
+        return SystemStatFile.load(cpu_only=True)
+
+    def sample(self) -> Dict[str, CgroupResult]:
+        """
+        前回の sample() 呼び出しからのCPU使用率を cgroup ごとに計算する
+        初回(または追加直後の cgroup)は基準となるスナップショットを取得するだけなので結果に含まれない
+        """
+        system_stat = self._load_system()
+        if system_stat is None:
+            return {}
+        prev_system = self._prev_system
+        prev_stats = self._prev_stats
+        missing = self._missing
+        results: Dict[str, CgroupResult] = {}
+        for cgroup in self._cgroups:
+            stat = CgroupStatFile.load(cgroup, quiet=cgroup in missing)
+            prev = prev_stats.pop(cgroup, None)
+            if stat is None:
+                missing.add(cgroup)
+                continue
+            missing.discard(cgroup)
+            prev_stats[cgroup] = stat
+            if prev is None or prev_system is None:
+                continue
+            results[cgroup] = _calc_cgroup(
+                cgroup, prev, stat, system_stat.cpu_time.total - prev_system.cpu_time.total
+            )
+        self._prev_system = system_stat
+        return results
+
+    def measure(self, delay: float = 1.0) -> Dict[str, CgroupResult]:
+        """t1 のスナップショットを取得し、delay 秒後の t2 との差分から全 cgroup のCPU使用率を計測する"""
+        self.sample()
+        time.sleep(delay)
+        return self.sample()
+
+
+class WindowStats:
+    """RingBuffer の区間の統計値"""
+
+    __slots__ = ("count", "min", "max", "mean", "p95")
+
+    def __init__(self):
+        self.count: int = 0
+        self.min: float = 0.0
+        self.max: float = 0.0
+        self.mean: float = 0.0
+        self.p95: float = 0.0
+
+
+class RingBuffer:
+    """
+    容量固定の列指向リングバッファ
+    列(timestamp + メトリクス)ごとに array('d') を1本ずつ事前に確保し、古いものから上書きする
+    どれだけ長く動かしてもメモリ使用量は capacity で決まる
+    """
+
+    def __init__(self, capacity: int, columns: Sequence[str] = ("usage",)):
+        if capacity < 1:
+            raise ValueError("capacity must be >= 1")
+        self.capacity: int = capacity
+        self.columns: Tuple[str, ...] = ("timestamp",) + tuple(columns)
+        self._data: Dict[str, array] = {
+            name: array("d", bytes(8 * capacity)) for name in self.columns
+        }
+        # 次に書き込む位置
+        self._head: int = 0
+        self._size: int = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, timestamp: float, *values: float):
+        """1行追加する。values はコンストラクタで指定した columns の順番"""
+        head = self._head
+        self._data["timestamp"][head] = timestamp
+        for name, value in zip(self.columns[1:], values):
+            self._data[name][head] = value
+        self._head = (head + 1) % self.capacity
+        if self._size < self.capacity:
+            self._size += 1
+
+    def _physical(self, index: int) -> int:
+        """古い順の論理インデックスを配列上の位置に変換する"""
+        return (self._head - self._size + index) % self.capacity
+
+    def _window_start(self, seconds: Union[float, None]) -> int:
+        """最新の timestamp から seconds 秒以内の最初の論理インデックスを二分探索で求める"""
+        if seconds is None:
+            return 0
+        timestamps = self._data["timestamp"]
+        since = timestamps[self._physical(self._size - 1)] - seconds
+        low, high = 0, self._size
+        while low < high:
+            mid = (low + high) // 2
+            if timestamps[self._physical(mid)] < since:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def window(self, column: str, seconds: Union[float, None] = None) -> List[memoryview]:
+        """
+        直近 seconds 秒(None の場合は全体)の列の値を、コピーせずに memoryview で返す
+        リングの折り返しがあるので最大2つに分かれる
+        """
+        if self._size == 0:
+            return []
+        start = self._physical(self._window_start(seconds))
+        end = self._head
+        view = memoryview(self._data[column])
+        if start < end:
+            return [view[start:end]]
+        if end == 0:
+            return [view[start:]]
+        return [view[start:], view[:end]]
+
+    def stats(self, column: str, seconds: Union[float, None] = None) -> Union[WindowStats, None]:
+        """直近 seconds 秒(None の場合は全体)の min/max/mean/p95 を返す。データがない場合は None"""
+        segments = self.window(column, seconds)
+        count = sum(len(segment) for segment in segments)
+        if count == 0:
+            return None
+        result = WindowStats()
+        result.count = count
+        result.min = min(min(segment) for segment in segments)
+        result.max = max(max(segment) for segment in segments)
+        result.mean = sum(sum(segment) for segment in segments) / count
+        # nearest-rank 法: 上位 5% だけをヒープに残す
+        rank = math.ceil(0.95 * count)
+        result.p95 = heapq.nlargest(count - rank + 1, _chain(segments))[-1]
+        return result
+
+
+def _chain(segments: List[memoryview]) -> Iterator[float]:
+    for segment in segments:
+        yield from segment
+
+
+class HistoryStore:
+    """
+    PIDごととシステム全体の計測結果の履歴を RingBuffer で保持するクラス
+    終了したPIDの履歴も --summary に含めるため、capacity tick の間は残す
+    それより古い履歴は生きているPIDでも RingBuffer から消えているので、その時点で削除する
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity: int = capacity
+        self.system: RingBuffer = RingBuffer(capacity)
+        self.processes: Dict[int, RingBuffer] = {}
+        # PIDごとに最後に結果を記録した tick
+        self._last_seen: Dict[int, int] = {}
+        self._ticks: int = 0
+
+    def record(
+        self,
+        results: Dict[int, MeasurementResult],
+        system_usage_percent: Union[float, None] = None,
+        timestamp: Union[float, None] = None,
+    ):
+        """1 tick 分の計測結果を追加する"""
+        processes = self.processes
+        last_seen = self._last_seen
+        tick = self._ticks = self._ticks + 1
+        for pid, result in results.items():
+            history = processes.get(pid)
+            if history is None:
+                history = processes[pid] = RingBuffer(self.capacity)
+            history.append(result.timestamp, result.usage_percent)
+            last_seen[pid] = tick
+        if system_usage_percent is not None:
+            if timestamp is None:
+                timestamp = time.time()
+            self.system.append(timestamp, system_usage_percent)
+        # 終了したプロセスの履歴は、最後の結果が capacity tick より古くなったら削除する
+        if len(processes) > len(results):
+            expired = tick - self.capacity
+            for pid in [pid for pid, seen in last_seen.items() if seen <= expired]:
+                del processes[pid]
+                del last_seen[pid]
+
+
+class LatencyHistogram:
+    """
+    固定バケットのレイテンシのヒストグラム
+    バケットの上限は 1us から 10s までの 1-2-5 系列。observe() はカウンタを1つ増やすだけ
+    """
+
+    BOUNDS = array("d", [base * 10.0 ** exponent for exponent in range(-6, 1) for base in (1, 2, 5)] + [10.0])
+
+    def __init__(self):
+        # 最後の要素は BOUNDS を超えた値のバケット
+        self.counts = array("Q", bytes(8 * (len(self.BOUNDS) + 1)))
+        self.count: int = 0
+        self.total: float = 0.0
+        self.max: float = 0.0
+
+    def observe(self, seconds: float):
+        """1回分のレイテンシ(秒)を記録する"""
+        self.counts[bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percent: float) -> float:
+        """
+        nearest-rank 法のパーセンタイル(秒)。値はそのバケットの上限で、最大値を超えない
+        記録がない場合は 0.0 を返す
+        """
+        if self.count == 0:
+            return 0.0
+        rank = max(1, math.ceil(percent / 100 * self.count))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                break
+        if index == len(self.BOUNDS):
+            return self.max
+        return min(self.BOUNDS[index], self.max)
+
+
+class SelfStats:
+    """
+    pidstat 自身のオーバーヘッドの計測 (--self-stats)
+    tick ごとの読み込み・パース・出力・全体の時間をヒストグラムに記録し、
+    pidstat 自身のCPU時間を /proc/self/stat から読み込む
+    読み込みとパースの時間は Sampler に渡した StatFileCache(stats=...) を通して加算される
+    --workers ではワーカー内の読み込みとパースを分けられないので scan 全体を読み込みとし、
+    io, sched, status の読み込みもパースを含めて読み込みとして加算する
+    """
+
+    PHASES = ("read", "parse", "output", "tick")
+
+    def __init__(self):
+        self.histograms: Dict[str, LatencyHistogram] = {phase: LatencyHistogram() for phase in self.PHASES}
+        # 現在の tick で StatFileCache が加算する時間
+        self.read_seconds: float = 0.0
+        self.parse_seconds: float = 0.0
+        self._start_wall = time.monotonic()
+        self._start_cpu = self._read_cpu_ticks()
+
+    @staticmethod
+    def _read_cpu_ticks() -> Tuple[int, int]:
+        # 自分自身のプロセスなので PROC_ROOT ではなく実際の /proc を読む
+        try:
+            with open("/proc/self/stat", "rb") as f:
+                values = PidStatFile.parse_fields(f.read(), [STAT_FIELD_USER, STAT_FIELD_SYSTEM])
+        except OSError:
+            values = None
+        if values is None:
+            return 0, 0
+        return values[0], values[1]  # type: ignore
+
+    def record_tick(self, tick_seconds: float, output_seconds: float = 0.0):
+        """1 tick 分の時間を記録し、読み込み・パースの加算値をリセットする"""
+        histograms = self.histograms
+        histograms["read"].observe(self.read_seconds)
+        histograms["parse"].observe(self.parse_seconds)
+        histograms["output"].observe(output_seconds)
+        histograms["tick"].observe(tick_seconds)
+        self.read_seconds = 0.0
+        self.parse_seconds = 0.0
+
+    def cpu_times(self) -> Tuple[float, float]:
+        """計測開始からの pidstat 自身のユーザー・システムCPU時間(秒)"""
+        user, system = self._read_cpu_ticks()
+        return (
+            jiffies_to_seconds(user - self._start_cpu[0]),
+            jiffies_to_seconds(system - self._start_cpu[1]),
+        )
+
+    def report(self) -> List[str]:
+        """--self-stats で表示する行を返す"""
+        lines = ["  ".join([f"{'phase':>7s}", f"{'count':>7s}"] + [
+            f"{label:>9s}" for label in ("mean(ms)", "p50(ms)", "p95(ms)", "p99(ms)", "max(ms)")
+        ])]
+        for phase in self.PHASES:
+            histogram = self.histograms[phase]
+            values = (
+                histogram.mean, histogram.percentile(50), histogram.percentile(95),
+                histogram.percentile(99), histogram.max,
+            )
+            lines.append("  ".join(
+                [f"{phase:>7s}", f"{histogram.count:>7d}"] + [f"{value * 1000:9.3f}" for value in values]
+            ))
+        user, system = self.cpu_times()
+        elapsed = time.monotonic() - self._start_wall
+        percent = (user + system) / elapsed * 100 if elapsed > 0 else 0.0
+        lines.append(f"cpu: user {user:.2f}s  sys {system:.2f}s  {percent:.1f}% of {elapsed:.1f}s")
+        return lines
+
+
+def measure_cpu_usage_percent(delay: float = 1.0) -> Union[float, None]:
+    # --- 時点 t1 のデータを取得 ---
+    system_stat1 = SystemStatFile.load()
+    if system_stat1 is None:
+        return None
+    
+    # ...
+    time.sleep(delay)
+
+    # --- 時点 t2 のデータを取得 ---
     system_stat2 = SystemStatFile.load()
     if system_stat2 is None:
         return None
+
+    # --- CPU使用率を計算(%) ---
+    return _calc_cpu_usage_percent(system_stat1.cpu_time, system_stat2.cpu_time)
+
+def measure_processor_usages_percent(delay: float = 1.0) -> Union[List[float], None]:
+    # --- 時点 t1 のデータを取得 ---
+    system_stat1 = SystemStatFile.load()
+    if system_stat1 is None:
+        return None
     
-    total_time_diff = system_stat2.cpu_time.total - system_stat1.cpu_time.total
+    # zzz
+    time.sleep(delay)
+
+    # --- 時点 t2 のデータを取得 ---
+    system_stat2 = SystemStatFile.load()
+    if system_stat2 is None:
+        return None
+
+    return _calc_processor_usages_percent(system_stat1, system_stat2)
+
+
+def _calc_processor_usages_percent(system_stat1: SystemStat, system_stat2: SystemStat) -> List[float]:
+    """2時点の SystemStat から各CPUの使用率(%)を計算する"""
+    # --- CPU使用率を計算(%) ---
+    return [
+        _calc_cpu_usage_percent(cpu_time1, cpu_time2)
+        for cpu_time1, cpu_time2 in zip(system_stat1.processor_times, system_stat2.processor_times)
+    ]
+
+
+# /proc/stat の cpu 行の列(compute_processor_usages の結果のキー)
+SYSTEM_CPU_TIME_COLUMNS = (
+    "user", "nice", "system", "idle", "iowait",
+    "irq", "softirq", "steal", "guest", "guest_nice",
+)
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("NumPy is required for vectorized CPU usage computation.")
+
+
+def processor_times_matrix(source: Union[SystemStat, List[str]]) -> "np.ndarray":
+    """
+    各CPU(cpuN行)のCPU時間を (CPU数 x 10) の int64 行列にする
+    source には SystemStat か /proc/stat の行のリストを指定する
+    行のリストの場合は SystemCpuTime を作らずに直接変換する
+    """
+    _require_numpy()
+    if isinstance(source, SystemStat):
+        return np.array(
+            [
+                [getattr(cpu_time, name) for name in SYSTEM_CPU_TIME_COLUMNS]
+                for cpu_time in source.processor_times
+            ],
+            dtype=np.int64,
+        ).reshape(-1, len(SYSTEM_CPU_TIME_COLUMNS))
+
+    values: List[str] = []
+    for line in source:
+        # "cpu " (全体合計) は除き、cpuN 行だけを対象にする
+        if line.startswith("cpu") and line[3:4].isdigit():
+            values.extend(line.split()[1:11])
+    return np.array(values, dtype=np.int64).reshape(-1, len(SYSTEM_CPU_TIME_COLUMNS))
+
+
+def compute_processor_usages(
+    start: "np.ndarray", end: Union["np.ndarray", None] = None
+) -> Dict[str, "np.ndarray"]:
+    """
+    CPU時間の行列から各CPUの使用率(%)をまとめて計算する
+    - end を指定した場合: start, end は (CPU数 x 10) の行列で、結果は (CPU数,) の配列
+    - end を省略した場合: start は (時点数 x CPU数 x 10) のスナップショットの積み重ねで、
+      隣り合う時点の差分から (時点数 - 1, CPU数) の配列を計算する
+    結果は SYSTEM_CPU_TIME_COLUMNS の各列と "busy" (total - idle) をキーにした辞書
+    合計の変化量が0の場合は 0% にする(measure_processor_usages_percent と同じ)
+    """
+    _require_numpy()
+    if end is None:
+        diff = np.diff(np.asarray(start, dtype=np.int64), axis=0)
+    else:
+        diff = np.asarray(end, dtype=np.int64) - np.asarray(start, dtype=np.int64)
+
+    total = diff.sum(axis=-1)
+    # 0除算を避けるため、合計が0の所は1で割って結果を0にする
+    scale = np.where(total == 0, 0.0, 100.0 / np.where(total == 0, 1, total))
+    percents = diff * scale[..., np.newaxis]
+
+    usages = {name: percents[..., i] for i, name in enumerate(SYSTEM_CPU_TIME_COLUMNS)}
+    usages["busy"] = (total - diff[..., SYSTEM_CPU_TIME_COLUMNS.index("idle")]) * scale
+    return usages
+
+
+class TickScheduler:
+    """
+    time.monotonic() の締め切り(deadline)に合わせて一定間隔で tick を発生させるスケジューラ
+    締め切りは「開始時刻 + n * interval」で決めるので、読み込みや表示にかかった時間で間隔がずれない
+    締め切りに1間隔以上遅れた場合は取りこぼした tick を missed に数え、次の締め切りに合わせる
+    """
+
+    MIN_INTERVAL = 0.01
+
+    def __init__(self, interval: float = 1.0, count: Union[int, None] = None):
+        if interval < TickScheduler.MIN_INTERVAL:
+            raise ValueError(f"interval must be >= {TickScheduler.MIN_INTERVAL} seconds")
+        if count is not None and count < 1:
+            raise ValueError("count must be >= 1")
+        self.interval: float = interval
+        self.count: Union[int, None] = count
+        # 発生させた tick の数
+        self.ticks: int = 0
+        # 締め切りに間に合わず飛ばした tick の合計
+        self.missed: int = 0
+
+    def _start(self):
+        self._start_time = time.monotonic()
+        self._index = 0
+
+    def _finished(self) -> bool:
+        return self.count is not None and self.ticks >= self.count
+
+    def _next_wait(self) -> float:
+        """次の締め切りまでの待ち時間(秒)を返す"""
+        interval = self.interval
+        self._index += 1
+        deadline = self._start_time + self._index * interval
+        now = time.monotonic()
+        late = now - deadline
+        if late >= interval:
+            # 丸ごと過ぎてしまった締め切りは飛ばし、直近の締め切りに合わせる
+            skipped = int(late // interval)
+            self._index += skipped
+            self.missed += skipped
+            deadline = self._start_time + self._index * interval
+        return max(0.0, deadline - now)
+
+    def __iter__(self) -> Iterator[int]:
+        """tick ごとに通し番号(1始まり)を返す。count を指定した場合はその回数で終了する"""
+        self._start()
+        while not self._finished():
+            wait = self._next_wait()
+            if wait > 0:
+                time.sleep(wait)
+            self.ticks += 1
+            yield self.ticks
+
+    def __aiter__(self) -> AsyncIterator[int]:
+        """__iter__ と同じだが、time.sleep の代わりに asyncio.sleep で待つ"""
+        return self._aiter()
+
+    async def _aiter(self) -> AsyncIterator[int]:
+        self._start()
+        while not self._finished():
+            wait = self._next_wait()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self.ticks += 1
+            yield self.ticks
+
+
+class SharedSystemStat:
+    """
+    複数の計測(モニター)で /proc/stat のスナップショットを共有するクラス
+    前回の読み込みから max_age 秒以内であれば同じ SystemStat を返すので、
+    同じ tick で起きた複数のモニターが読み込むのは1回だけになる
+    """
+
+    def __init__(self, max_age: float = TickScheduler.MIN_INTERVAL / 2, cache: Union[StatFileCache, None] = None):
+        self.max_age: float = max_age
+        self._cache = cache
+        self._system_stat: Union[SystemStat, None] = None
+        self._loaded_at: float = 0.0
+
+    def load(self) -> Union[SystemStat, None]:
+        """CPU時間だけを解析した SystemStat を返す(SystemStatFile.load(cpu_only=True) と同じ)"""
+        now = time.monotonic()
+        if self._system_stat is not None and now - self._loaded_at <= self.max_age:
+            return self._system_stat
+        if self._cache is not None:
+            system_stat = self._cache.load_system(cpu_only=True)
+        else:
+            system_stat = SystemStatFile.load(cpu_only=True)
+        self._system_stat = system_stat
+        self._loaded_at = now
+        return system_stat
+
+
+# async 版の計測関数が既定で使う共有スナップショット
+_shared_system_stat = SharedSystemStat()
+
+
+async def measure_process_stat_async(
+    pid: int, delay: float = 1.0, shared: Union[SharedSystemStat, None] = None
+) -> Union[MeasurementResult, None]:
+    """
+    measure_process_stat の async 版。待ち時間は asyncio.sleep で待つ
+    同時に実行している他の計測とは /proc/stat のスナップショットを共有する
+    """
+    shared = shared if shared is not None else _shared_system_stat
+
+    # --- 時点 t1 のデータを取得 ---
+    process_stat1 = PidStatFile.load(pid)
+    system_stat1 = shared.load()
+    if process_stat1 is None or system_stat1 is None:
+        return None
+
+    await asyncio.sleep(delay)
+
+    # --- 時点 t2 のデータを取得 ---
+    process_stat2 = PidStatFile.load(pid)
+    system_stat2 = shared.load()
+    if process_stat2 is None or system_stat2 is None:
+        return None
+
+    result = MeasurementResult()
+    result.pid = pid
+    result.tgid = pid
+    result.usage_percent = _calc_usage_percent(
+        process_stat1, process_stat2, system_stat1, system_stat2
+    )
+    result.timestamp = system_stat2.timestamp
+    return result
+
+
+async def measure_cpu_usage_percent_async(
+    delay: float = 1.0, shared: Union[SharedSystemStat, None] = None
+) -> Union[float, None]:
+    """measure_cpu_usage_percent の async 版"""
+    shared = shared if shared is not None else _shared_system_stat
+    system_stat1 = shared.load()
+    if system_stat1 is None:
+        return None
+    await asyncio.sleep(delay)
+    system_stat2 = shared.load()
+    if system_stat2 is None:
+        return None
+    return _calc_cpu_usage_percent(system_stat1.cpu_time, system_stat2.cpu_time)
+
+
+async def measure_processor_usages_percent_async(
+    delay: float = 1.0, shared: Union[SharedSystemStat, None] = None
+) -> Union[List[float], None]:
+    """measure_processor_usages_percent の async 版"""
+    shared = shared if shared is not None else _shared_system_stat
+    system_stat1 = shared.load()
+    if system_stat1 is None:
+        return None
+    await asyncio.sleep(delay)
+    system_stat2 = shared.load()
+    if system_stat2 is None:
+        return None
+    return _calc_processor_usages_percent(system_stat1, system_stat2)
+
+
+async def iter_samples_async(
+    sampler: "Sampler", interval: float = 1.0, count: Union[int, None] = None
+) -> AsyncIterator[Dict[int, MeasurementResult]]:
+    """
+    tick ごとに sampler.sample() の結果(PID -> MeasurementResult)を返す async イテレータ
+    複数のモニターで /proc/stat を共有する場合は、同じ SharedSystemStat を渡した Sampler を使う
+    """
+    # 基準となる t1 のスナップショット
+    sampler.sample()
+    async for _ in TickScheduler(interval, count):
+        yield sampler.sample()
+
+
+# 記録ファイルのフォーマット(リトルエンディアン、固定長のレコード)
+# ファイルヘッダ: マジック, バージョン, CLOCK_TICKS_PER_SECOND, CPU数, ページサイズ
+RECORD_MAGIC = b"PIDSTATR"
+RECORD_VERSION = 1
+RECORD_FILE_HEADER = struct.Struct("<8sHxxIII")
+# tick ヘッダ: タイムスタンプ(time.time()), PID数, CPU数
+RECORD_TICK_HEADER = struct.Struct("<dII")
+# システムのCPU時間: "cpu" 行 + "cpuN" 行 x CPU数 (SystemCpuTime の10列, jiffies)
+RECORD_CPU_TIME = struct.Struct("<10Q")
+# プロセス: PID, ProcessCpuTime の4列, 開始時間, 仮想メモリサイズ(ページ数), RSS(ページ数)
+# 1プロセス 32バイトに収めるため 32bit で記録する
+# CPU時間などは 2^32 で折り返すので、再生時は差分を 2^32 を法として計算する
+RECORD_PROCESS = struct.Struct("<8I")
+_U32_MASK = 0xFFFFFFFF
+# 疎なタイムスタンプの索引(記録ファイル + ".idx"): RECORD_INDEX_INTERVAL tick ごとに
+# (tick のタイムスタンプ, 記録ファイル内のオフセット) を記録する
+RECORD_INDEX_ENTRY = struct.Struct("<dQ")
+RECORD_INDEX_INTERVAL = 64
+RECORD_INDEX_SUFFIX = ".idx"
+
+
+class Recorder:
+    """
+    生のカウンタ(jiffies など)を固定長のバイナリ形式で記録するクラス (--record)
+    tick ごとのデータはメモリ上のバッファにためておき、flush_bytes を超えたらまとめて1回で書き込む
+    既存のファイルには追記する。ヘッダ(CLK_TCK, CPU数, ページサイズ)がこのシステムと違う場合は ValueError
+    途中で切れた最後の tick は切り詰めてから追記し、索引は記録ファイルから作り直す
+    """
+
+    def __init__(self, path: str, flush_bytes: int = 256 * 1024):
+        self.path: str = path
+        self.flush_bytes: int = flush_bytes
+        self._buffer = bytearray()
+        self._index_buffer = bytearray()
+        header = RECORD_FILE_HEADER.pack(
+            RECORD_MAGIC, RECORD_VERSION, CLOCK_TICKS_PER_SECOND, os.cpu_count() or 0, PAGE_SIZE
+        )
+        Recorder._check_header(path, header)
+        # 自前でバッファリングするので、書き込みは1回の write() にする
+        # 既存の tick ヘッダを読むため読み書き両用で開く
+        self._file = open(path, "ab+", buffering=0)
+        self._ticks: int = 0
+        if self._file.tell() == 0:
+            self._buffer += header
+        else:
+            self._ticks, self._index_buffer = Recorder._scan_ticks(path, self._file.fileno())
+            self._file.seek(0, os.SEEK_END)
+        # 古い記録の索引が残っていても使わないよう、索引は常に書き直す
+        self._index_file = open(path + RECORD_INDEX_SUFFIX, "wb", buffering=0)
+        # 書き込み済みのサイズ(バッファの先頭のファイル内オフセット)
+        self._flushed: int = self._file.tell()
+
+    @staticmethod
+    def _check_header(path: str, header: bytes):
+        """追記する既存のファイルが、同じ形式・同じ条件のシステムで記録されたものか確認する"""
+        try:
+            with open(path, "rb") as f:
+                existing = f.read(len(header))
+        except FileNotFoundError:
+            return
+        if not existing or existing == header:
+            return
+        if len(existing) < len(header):
+            raise ValueError(f"{path} is not a pidstat recording")
+        magic, version, clock_ticks, ncpu, page_size = RECORD_FILE_HEADER.unpack(existing)
+        if magic != RECORD_MAGIC or version != RECORD_VERSION:
+            raise ValueError(f"{path} is not a pidstat recording (version {RECORD_VERSION})")
+        raise ValueError(
+            f"{path} was recorded with CLK_TCK={clock_ticks}, {ncpu} CPUs and page size {page_size}, "
+            f"but this system has CLK_TCK={CLOCK_TICKS_PER_SECOND}, {os.cpu_count() or 0} CPUs "
+            f"and page size {PAGE_SIZE}; record to a new file"
+        )
+
+    @staticmethod
+    def _scan_ticks(path: str, fd: int) -> Tuple[int, bytearray]:
+        """
+        既存のファイルの tick ヘッダをたどり、(完全な tick の数, 索引) を返す
+        途中で切れた最後の tick は、後ろに追記すると以降の tick が読めなくなるので切り詰める
+        """
+        size = os.fstat(fd).st_size
+        offset = RECORD_FILE_HEADER.size
+        ticks = 0
+        index = bytearray()
+        while offset + RECORD_TICK_HEADER.size <= size:
+            timestamp, npids, ncpu = RECORD_TICK_HEADER.unpack(os.pread(fd, RECORD_TICK_HEADER.size, offset))
+            tick_size = RECORD_TICK_HEADER.size + RECORD_CPU_TIME.size * (ncpu + 1) + RECORD_PROCESS.size * npids
+            if offset + tick_size > size:
+                break
+            if ticks % RECORD_INDEX_INTERVAL == 0:
+                index += RECORD_INDEX_ENTRY.pack(timestamp, offset)
+            offset += tick_size
+            ticks += 1
+        if offset < size:
+            print(f"Warning: discarding {size - offset} bytes of an incomplete tick at the end of {path}", file=sys.stderr)
+            os.ftruncate(fd, offset)
+        return ticks, index
+
+    def __enter__(self) -> "Recorder":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def record(self, system_stat: SystemStat, processes: Dict[int, ProcessStat]):
+        """1 tick 分のスナップショットを記録する"""
+        buffer = self._buffer
+        processor_times = system_stat.processor_times
+        offset = len(buffer)
+        if self._ticks % RECORD_INDEX_INTERVAL == 0:
+            self._index_buffer += RECORD_INDEX_ENTRY.pack(system_stat.timestamp, self._flushed + offset)
+        self._ticks += 1
+        # 必要なサイズを先に確保して pack_into で埋める
+        buffer.extend(bytes(
+            RECORD_TICK_HEADER.size +
+            RECORD_CPU_TIME.size * (len(processor_times) + 1) +
+            RECORD_PROCESS.size * len(processes)
+        ))
+        RECORD_TICK_HEADER.pack_into(buffer, offset, system_stat.timestamp, len(processes), len(processor_times))
+        offset += RECORD_TICK_HEADER.size
+
+        pack_cpu_time = RECORD_CPU_TIME.pack_into
+        for sys_cpu in [system_stat.cpu_time] + processor_times:
+            pack_cpu_time(
+                buffer, offset,
+                sys_cpu.user, sys_cpu.nice, sys_cpu.system, sys_cpu.idle, sys_cpu.iowait,
+                sys_cpu.irq, sys_cpu.softirq, sys_cpu.steal, sys_cpu.guest, sys_cpu.guest_nice,
+            )
+            offset += RECORD_CPU_TIME.size
+
+        pack_process = RECORD_PROCESS.pack_into
+        for pid, process_stat in processes.items():
+            proc_cpu = process_stat.cpu_time
+            resource = process_stat.resource
+            pack_process(
+                buffer, offset,
+                pid,
+                proc_cpu.user & _U32_MASK,
+                proc_cpu.system & _U32_MASK,
+                proc_cpu.child_user & _U32_MASK,
+                proc_cpu.child_system & _U32_MASK,
+                resource.start_time & _U32_MASK,
+                (resource.virtual_size // PAGE_SIZE) & _U32_MASK,
+                resource.rss & _U32_MASK,
+            )
+            offset += RECORD_PROCESS.size
+
+        if len(buffer) >= self.flush_bytes:
+            self.flush()
+
+    def flush(self):
+        """バッファにたまっているデータを書き込む(索引は記録ファイルの後に書く)"""
+        if self._buffer:
+            self._file.write(self._buffer)
+            self._flushed += len(self._buffer)
+            self._buffer.clear()
+        if self._index_buffer:
+            self._index_file.write(self._index_buffer)
+            self._index_buffer.clear()
 
-    busy_time_diff = system_stat2.cpu_time.total_busy - system_stat1.cpu_time.total_busy
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+            self._index_file.close()
 
-    # --- CPU使用率を計算(%) ---
-    # 変化量が0 -> CPU使用率0%
-    if total_time_diff == 0:
-        return 0.0
-    return (busy_time_diff / total_time_diff) * 100
 
-def measure_processor_usages_percent(delay: float = 1.0) -> Union[List[float], None]:
-    # --- 時点 t1 のデータを取得 ---
-    system_stat1 = SystemStatFile.load()
-    if system_stat1 is None:
-        return None
-    
-    # zzz
-    time.sleep(delay)
+class ReplayTick:
+    """Replayer が返す1 tick 分の計測結果"""
 
-    # --- 時点 t2 のデータを取得 ---
-    system_stat2 = SystemStatFile.load()
-    if system_stat2 is None:
+    __slots__ = ("timestamp", "results", "system_usage_percent", "processor_usages")
+
+    def __init__(self):
+        self.timestamp: float = 0.0
+        # PID -> MeasurementResult (measure_process_stat と同じ計算)
+        self.results: Dict[int, MeasurementResult] = {}
+        # システム全体のCPU使用率(%) (measure_cpu_usage_percent と同じ計算)
+        self.system_usage_percent: float = 0.0
+        # CPUごとの使用率(%) (measure_processor_usages_percent と同じ計算)
+        self.processor_usages: List[float] = []
+
+
+class Replayer:
+    """
+    Recorder で記録したファイルを mmap して再生するクラス (--replay)
+    疎な索引で指定した時間範囲の先頭に直接移動し、範囲内の tick だけをデコードする
+    ファイル全体をメモリに読み込むことはない
+    """
+
+    def __init__(self, path: str):
+        self.path: str = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) < RECORD_FILE_HEADER.size:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a pidstat recording")
+        magic, version, clock_ticks, ncpu, page_size = RECORD_FILE_HEADER.unpack_from(self._mmap, 0)
+        if magic != RECORD_MAGIC or version != RECORD_VERSION:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a pidstat recording (version {RECORD_VERSION})")
+        self.clock_ticks_per_second: int = clock_ticks
+        self.ncpu: int = ncpu
+        self.page_size: int = page_size
+        self._index_timestamps, self._index_offsets = self._load_index()
+
+    def __enter__(self) -> "Replayer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self):
+        self._mmap.close()
+
+    def _tick_size(self, offset: int) -> int:
+        _, npids, ncpu = RECORD_TICK_HEADER.unpack_from(self._mmap, offset)
+        return RECORD_TICK_HEADER.size + RECORD_CPU_TIME.size * (ncpu + 1) + RECORD_PROCESS.size * npids
+
+    def _complete(self, offset: int) -> bool:
+        """
+        offset から1 tick 分が全て記録されているか
+        記録中のファイルや、記録中に異常終了・ディスクフルになったファイルは最後の tick が途中で切れている
+        """
+        size = len(self._mmap)
+        return offset + RECORD_TICK_HEADER.size <= size and offset + self._tick_size(offset) <= size
+
+    def _load_index(self) -> Tuple[List[float], List[int]]:
+        """索引ファイルを読み込む。ない場合や使える項目がない場合は tick ヘッダだけをたどって作る"""
+        timestamps: List[float] = []
+        offsets: List[int] = []
+        try:
+            with open(self.path + RECORD_INDEX_SUFFIX, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = b""
+        if data:
+            for timestamp, offset in RECORD_INDEX_ENTRY.iter_unpack(data[: len(data) - len(data) % RECORD_INDEX_ENTRY.size]):
+                # 最初の tick より前・ファイルの終わりより後・途中で切れた tick を指す項目や、
+                # 別の記録の索引が残っていた場合のようにタイムスタンプが tick と一致しない項目は無視する
+                if offset < RECORD_FILE_HEADER.size or (offsets and offset <= offsets[-1]):
+                    continue
+                if not self._complete(offset) or RECORD_TICK_HEADER.unpack_from(self._mmap, offset)[0] != timestamp:
+                    continue
+                timestamps.append(timestamp)
+                offsets.append(offset)
+            if offsets:
+                return timestamps, offsets
+
+        offset = RECORD_FILE_HEADER.size
+        ticks = 0
+        while self._complete(offset):
+            if ticks % RECORD_INDEX_INTERVAL == 0:
+                timestamps.append(RECORD_TICK_HEADER.unpack_from(self._mmap, offset)[0])
+                offsets.append(offset)
+            offset += self._tick_size(offset)
+            ticks += 1
+        return timestamps, offsets
+
+    @property
+    def start_time(self) -> Union[float, None]:
+        """最初の tick のタイムスタンプ"""
+        return self._index_timestamps[0] if self._index_timestamps else None
+
+    def _find(self, start: Union[float, None]) -> int:
+        """start より前の最後の tick (なければ最初の tick) のオフセットを返す"""
+        offset = RECORD_FILE_HEADER.size
+        if start is None or not self._index_offsets:
+            return offset
+        position = bisect_left(self._index_timestamps, start) - 1
+        if position < 0:
+            return offset
+        offset = self._index_offsets[position]
+        # 索引の位置から tick ヘッダだけをたどる
+        while True:
+            next_offset = offset + self._tick_size(offset)
+            if not self._complete(next_offset):
+                return offset
+            if RECORD_TICK_HEADER.unpack_from(self._mmap, next_offset)[0] >= start:
+                return offset
+            offset = next_offset
+
+    def _decode(self, offset: int) -> Tuple[SystemStat, List[Tuple[int, ...]], int]:
+        """offset の tick をデコードし、(SystemStat, プロセスの生データ, 次の tick のオフセット) を返す"""
+        data = self._mmap
+        timestamp, npids, ncpu = RECORD_TICK_HEADER.unpack_from(data, offset)
+        offset += RECORD_TICK_HEADER.size
+        cpu_times: List[SystemCpuTime] = []
+        for values in RECORD_CPU_TIME.iter_unpack(data[offset : offset + RECORD_CPU_TIME.size * (ncpu + 1)]):
+            cpu_time = SystemCpuTime()
+            (cpu_time.user, cpu_time.nice, cpu_time.system, cpu_time.idle, cpu_time.iowait,
+             cpu_time.irq, cpu_time.softirq, cpu_time.steal, cpu_time.guest, cpu_time.guest_nice) = values
+            cpu_times.append(cpu_time)
+        offset += RECORD_CPU_TIME.size * (ncpu + 1)
+        system_stat = SystemStat()
+        system_stat.cpu_time = cpu_times[0]
+        system_stat.processor_times = cpu_times[1:]
+        system_stat.timestamp = timestamp
+        end = offset + RECORD_PROCESS.size * npids
+        processes = list(RECORD_PROCESS.iter_unpack(data[offset:end]))
+        return system_stat, processes, end
+
+    def replay(
+        self, start: Union[float, None] = None, end: Union[float, None] = None
+    ) -> Iterator[ReplayTick]:
+        """
+        start <= timestamp <= end の tick を順番に返す(None の場合は制限しない)
+        start より前の最後の tick を基準にするので、最初の tick から差分を計算できる
+        """
+        offset = self._find(start)
+        prev_system: Union[SystemStat, None] = None
+        prev_processes: Dict[int, ProcessStat] = {}
+
+        # 途中で切れた最後の tick はデコードせずに終わる
+        while self._complete(offset):
+            timestamp = RECORD_TICK_HEADER.unpack_from(self._mmap, offset)[0]
+            if end is not None and timestamp > end:
+                break
+            system_stat, raw_processes, offset = self._decode(offset)
+
+            processes: Dict[int, ProcessStat] = {}
+            results: Dict[int, MeasurementResult] = {}
+            for pid, user, system, child_user, child_system, start_time, virtual_size, rss in raw_processes:
+                prev = prev_processes.get(pid)
+                process_stat = ProcessStat()
+                process_stat.basic.pid = pid
+                process_stat.resource.start_time = start_time
+                process_stat.resource.virtual_size = virtual_size * self.page_size
+                process_stat.resource.rss = rss
+                process_stat.timestamp = timestamp
+                cpu_time = process_stat.cpu_time
+                if prev is None or prev.resource.start_time != start_time:
+                    cpu_time.user, cpu_time.system = user, system
+                    cpu_time.child_user, cpu_time.child_system = child_user, child_system
+                else:
+                    # 32bit で折り返したカウンタを戻す
+                    prev_time = prev.cpu_time
+                    cpu_time.user = prev_time.user + ((user - prev_time.user) & _U32_MASK)
+                    cpu_time.system = prev_time.system + ((system - prev_time.system) & _U32_MASK)
+                    cpu_time.child_user = prev_time.child_user + ((child_user - prev_time.child_user) & _U32_MASK)
+                    cpu_time.child_system = prev_time.child_system + ((child_system - prev_time.child_system) & _U32_MASK)
+                    if prev_system is not None:
+                        result = MeasurementResult()
+                        result.pid = pid
+                        result.tgid = pid
+                        result.usage_percent = _calc_usage_percent(prev, process_stat, prev_system, system_stat)
+                        result.timestamp = timestamp
+                        results[pid] = result
+                processes[pid] = process_stat
+
+            if prev_system is not None and (start is None or timestamp >= start):
+                tick = ReplayTick()
+                tick.timestamp = timestamp
+                tick.results = results
+                tick.system_usage_percent = _calc_cpu_usage_percent(prev_system.cpu_time, system_stat.cpu_time)
+                tick.processor_usages = _calc_processor_usages_percent(prev_system, system_stat)
+                yield tick
+            prev_system = system_stat
+            prev_processes = processes
+
+
+SHM_MAGIC = b"PIDSTATS"
+SHM_VERSION = 1
+# 共有メモリの先頭: マジック, バージョン, 書き込めるPIDの最大数, CPU数 (作成後は変わらない)
+SHM_LAYOUT = struct.Struct("<8sHxxIIxxxx")
+# seqlock のカウンタ。書き込み中は奇数、書き込み後は偶数になる
+SHM_SEQUENCE = struct.Struct("<Q")
+# tick ヘッダ: タイムスタンプ, システム全体のCPU使用率(%), 書き込んだPID数, 計測したPID数
+SHM_TICK_HEADER = struct.Struct("<ddII")
+# CPUごとの使用率(%)
+SHM_PROCESSOR_USAGE = struct.Struct("<d")
+# PIDごとに書き込む MeasurementResult の属性。全て8バイトにして境界を揃える
+SHM_PROCESS_FIELDS = (
+    "pid", "tgid", "usage_percent",
+    "minor_faults_per_second", "major_faults_per_second", "virtual_size", "rss", "memory_percent",
+    "read_kb_per_second", "write_kb_per_second", "cancelled_write_kb_per_second", "iops", "io_delay",
+    "voluntary_switches_per_second", "involuntary_switches_per_second", "wait_percent",
+)
+SHM_PROCESS = struct.Struct("<" + "".join(
+    "q" if field in ("pid", "tgid", "virtual_size", "rss", "io_delay") else "d" for field in SHM_PROCESS_FIELDS
+))
+_SHM_SEQUENCE_OFFSET = SHM_LAYOUT.size
+_SHM_TICK_OFFSET = _SHM_SEQUENCE_OFFSET + SHM_SEQUENCE.size
+
+
+def _shm_size(capacity: int, num_cpus: int) -> int:
+    return _SHM_TICK_OFFSET + SHM_TICK_HEADER.size + SHM_PROCESSOR_USAGE.size * num_cpus + SHM_PROCESS.size * capacity
+
+
+class SharedSnapshot:
+    """SnapshotReader が返す1 tick 分の計測結果"""
+
+    __slots__ = ("sequence", "timestamp", "system_usage_percent", "processor_usages", "results", "total")
+
+    def __init__(self):
+        # 何回目の書き込みか(seqlock のカウンタの半分)
+        self.sequence: int = 0
+        self.timestamp: float = 0.0
+        self.system_usage_percent: float = 0.0
+        self.processor_usages: List[float] = []
+        # PID -> MeasurementResult (スレッドの場合は TID -> MeasurementResult)
+        self.results: Dict[int, MeasurementResult] = {}
+        # 計測したPID数。容量を超えた分は results に含まれない
+        self.total: int = 0
+
+
+class SnapshotPublisher:
+    """
+    最新の計測結果を multiprocessing.shared_memory に固定のレイアウトで書き込むクラス (--shm)
+    同じホストの他のプロセスは SnapshotReader で /proc を読まずに同じ結果を参照できる
+    書き込みは seqlock で守る: カウンタを奇数にしてから書き込み、終わったら偶数にする
+    書き込むのはこのクラスの1スレッドだけという前提なので、書き込み側のロックはない
+    """
+
+    def __init__(self, name: str, capacity: int = 4096, num_cpus: Union[int, None] = None):
+        if capacity < 1:
+            raise ValueError("capacity must be >= 1")
+        self.capacity: int = capacity
+        self.num_cpus: int = num_cpus if num_cpus is not None else (os.cpu_count() or 1)
+        self._shm = shared_memory.SharedMemory(name, create=True, size=_shm_size(capacity, self.num_cpus))
+        # 作成・接続したばかりの SharedMemory の buf は None にならない
+        self._buffer: memoryview = self._shm.buf  # type: ignore
+        self._closed = False
+        SHM_LAYOUT.pack_into(self._buffer, 0, SHM_MAGIC, SHM_VERSION, capacity, self.num_cpus)
+        self._sequence: int = 0
+        SHM_SEQUENCE.pack_into(self._buffer, _SHM_SEQUENCE_OFFSET, 0)
+        # CPUごとの使用率の計算に使う前回の SystemStat
+        self._prev_system: Union[SystemStat, None] = None
+        self._values = attrgetter(*SHM_PROCESS_FIELDS)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def __enter__(self) -> "SnapshotPublisher":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def publish(
+        self, results: Dict[int, MeasurementResult], system_stat: SystemStat, system_usage_percent: Union[float, None]
+    ):
+        """1 tick 分の計測結果を書き込む。容量を超えたPIDは小さい方から capacity 個だけ書き込む"""
+        processor_usages: List[float] = []
+        if self._prev_system is not None:
+            processor_usages = _calc_processor_usages_percent(self._prev_system, system_stat)
+        self._prev_system = system_stat
+        processor_usages = (processor_usages + [0.0] * self.num_cpus)[:self.num_cpus]
+        pids = sorted(results)[:self.capacity]
+
+        buffer = self._buffer
+        # 書き込み中(奇数)にする
+        self._sequence += 1
+        SHM_SEQUENCE.pack_into(buffer, _SHM_SEQUENCE_OFFSET, self._sequence)
+        offset = _SHM_TICK_OFFSET
+        SHM_TICK_HEADER.pack_into(
+            buffer, offset, system_stat.timestamp, system_usage_percent or 0.0, len(pids), len(results)
+        )
+        offset += SHM_TICK_HEADER.size
+        for usage in processor_usages:
+            SHM_PROCESSOR_USAGE.pack_into(buffer, offset, usage)
+            offset += SHM_PROCESSOR_USAGE.size
+        pack_process = SHM_PROCESS.pack_into
+        values = self._values
+        for pid in pids:
+            pack_process(buffer, offset, *values(results[pid]))
+            offset += SHM_PROCESS.size
+        # 書き込み完了(偶数)にする
+        self._sequence += 1
+        SHM_SEQUENCE.pack_into(buffer, _SHM_SEQUENCE_OFFSET, self._sequence)
+
+    def close(self):
+        """共有メモリを閉じて削除する"""
+        if not self._closed:
+            self._closed = True
+            self._buffer.release()
+            self._shm.close()
+            self._shm.unlink()
+
+
+class SnapshotReader:
+    """
+    SnapshotPublisher が書き込んだ共有メモリを読み込むクラス
+    読み込みはメモリ上の値を直接解析するだけでシステムコールは発生しない
+    書き込み中だった場合や、読み込み中にカウンタが変わった場合は読み直す
+    """
+
+    def __init__(self, name: str, max_retries: int = 1000):
+        try:
+            # Python 3.13 以降は読み込み側が終了しても共有メモリを削除しないように指定できる
+            self._shm = shared_memory.SharedMemory(name, track=False)  # type: ignore
+        except TypeError:
+            self._shm = shared_memory.SharedMemory(name)
+            resource_tracker.unregister(self._shm._name, "shared_memory")  # type: ignore
+        # 作成・接続したばかりの SharedMemory の buf は None にならない
+        self._buffer: memoryview = self._shm.buf  # type: ignore
+        self._closed = False
+        self.max_retries: int = max_retries
+        magic, version, self.capacity, self.num_cpus = SHM_LAYOUT.unpack_from(self._buffer, 0)
+        if magic != SHM_MAGIC or version != SHM_VERSION:
+            self.close()
+            raise ValueError(f"{name} is not a pidstat shared memory snapshot")
+
+    def __enter__(self) -> "SnapshotReader":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def sequence(self) -> int:
+        """seqlock のカウンタ。変わっていなければ前回の read() から新しい書き込みはない"""
+        return SHM_SEQUENCE.unpack_from(self._buffer, _SHM_SEQUENCE_OFFSET)[0]
+
+    def read(self) -> Union[SharedSnapshot, None]:
+        """
+        一貫したスナップショットを返す
+        まだ1回も書き込まれていない場合や、max_retries 回読み直しても書き込み中だった場合は None を返す
+        """
+        buffer = self._buffer
+        for _ in range(self.max_retries):
+            sequence1 = SHM_SEQUENCE.unpack_from(buffer, _SHM_SEQUENCE_OFFSET)[0]
+            if sequence1 == 0:
+                return None
+            if sequence1 & 1:
+                continue
+            snapshot = self._decode(sequence1)
+            if SHM_SEQUENCE.unpack_from(buffer, _SHM_SEQUENCE_OFFSET)[0] == sequence1:
+                return snapshot
         return None
 
-    processor_usages = []
-    for i in range(len(system_stat1.processor_times)):
-        total_time_diff = system_stat2.processor_times[i].total - system_stat1.processor_times[i].total
-        busy_time_diff = system_stat2.processor_times[i].total_busy - system_stat1.processor_times[i].total_busy
+    def _decode(self, sequence: int) -> SharedSnapshot:
+        buffer = self._buffer
+        snapshot = SharedSnapshot()
+        snapshot.sequence = sequence // 2
+        offset = _SHM_TICK_OFFSET
+        snapshot.timestamp, snapshot.system_usage_percent, count, snapshot.total = \
+            SHM_TICK_HEADER.unpack_from(buffer, offset)
+        offset += SHM_TICK_HEADER.size
+        end = offset + SHM_PROCESSOR_USAGE.size * self.num_cpus
+        snapshot.processor_usages = [usage for usage, in SHM_PROCESSOR_USAGE.iter_unpack(buffer[offset:end])]
+        # 書き込み中に読んだ count は壊れているかもしれないので容量で制限する(結果はカウンタの確認で捨てる)
+        count = min(count, self.capacity)
+        unpack_process = SHM_PROCESS.unpack_from
+        timestamp = snapshot.timestamp
+        results = snapshot.results
+        for i in range(count):
+            result = MeasurementResult()
+            for field, value in zip(SHM_PROCESS_FIELDS, unpack_process(buffer, end + SHM_PROCESS.size * i)):
+                setattr(result, field, value)
+            result.timestamp = timestamp
+            results[result.pid] = result
+        return snapshot
 
-        # --- CPU使用率を計算(%) ---
-        # 変化量が0 -> CPU使用率0%
-        if total_time_diff == 0:
-            processor_usages.append(0.0)
-        else:
-            processor_usages.append((busy_time_diff / total_time_diff) * 100)
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._buffer.release()
+            self._shm.close()
 
-    return processor_usages
 
 def format_time(t: float) -> str:
     time_str = time.strftime("%H:%M:%S", time.localtime(t))
@@ -554,34 +3356,820 @@ def print_processor_header(num_processors: int):
 def _print(s: str):
     print(s)
 
-def print_header():
-    time_str = format_time(time.time())
-    formatted_header = "  ".join([time_str, "%CPU"])
-    _print(formatted_header)
+class OutputColumn:
+    """出力する列。attribute は出力する結果の属性名で、CSV/JSON Lines ではそのまま列名になる"""
+
+    __slots__ = ("attribute", "label", "width", "spec", "nullable")
+
+    def __init__(self, attribute: str, label: str, width: int, spec: str, nullable: bool = False):
+        self.attribute = attribute
+        self.label = label  # 表の見出し
+        self.width = width  # 表の列幅(見出しの方が長い場合は見出しに合わせる)
+        self.spec = spec  # % 書式の型と精度 ("d", ".2f" など)。文字列の列は "s"
+        self.nullable = nullable  # 値が None の場合がある
+
+    @property
+    def converted(self) -> bool:
+        """書式化の前に OutputWriter.format_value で文字列にする列か"""
+        return self.spec == "s" or self.nullable
+
+
+def result_columns(
+    threads: bool = False, memory: bool = False, io: bool = False, sched: bool = False
+) -> List[OutputColumn]:
+    """オプションに応じた MeasurementResult の列を返す"""
+    if threads:
+        columns = [OutputColumn("tgid", "TGID", 7, "d"), OutputColumn("pid", "TID", 7, "d")]
+    else:
+        columns = [OutputColumn("pid", "PID", 7, "d")]
+    columns.append(OutputColumn("usage_percent", "%CPU", 6, ".1f"))
+    if sched:
+        columns.append(OutputColumn("wait_percent", "%wait", 6, ".2f"))
+    if memory:
+        columns += [
+            OutputColumn("minor_faults_per_second", "minflt/s", 9, ".2f"),
+            OutputColumn("major_faults_per_second", "majflt/s", 9, ".2f"),
+            OutputColumn("virtual_size", "VSZ", 14, "d"),
+            OutputColumn("rss", "RSS", 12, "d"),
+            OutputColumn("memory_percent", "%MEM", 5, ".2f"),
+        ]
+    if io:
+        columns += [
+            OutputColumn("read_kb_per_second", "kB_rd/s", 9, ".2f"),
+            OutputColumn("write_kb_per_second", "kB_wr/s", 9, ".2f"),
+            OutputColumn("cancelled_write_kb_per_second", "kB_ccwr/s", 9, ".2f"),
+            OutputColumn("iops", "IOPS", 9, ".2f"),
+            OutputColumn("io_delay", "iodelay", 7, "d"),
+        ]
+    if sched:
+        columns += [
+            OutputColumn("voluntary_switches_per_second", "cswch/s", 9, ".2f"),
+            OutputColumn("involuntary_switches_per_second", "nvcswch/s", 9, ".2f"),
+        ]
+    return columns
+
+
+class OutputWriter:
+    """
+    計測結果を出力する基底クラス。そのままではエポック秒のタイムスタンプで始まる見出しなしのカンマ区切りになる
+    1 tick 分の行を1つの文字列にまとめて stream に1回で書き込む
+    行の書式は列から1回だけ作り、タイムスタンプの書式化は tick ごとに1回だけ行う
+    """
+
+    # 列の区切り
+    SEPARATOR = ","
+
+    def __init__(self, columns: Sequence[OutputColumn], stream=None):
+        self.columns: List[OutputColumn] = list(columns)
+        self.stream = stream if stream is not None else sys.stdout
+        self._values = attrgetter(*(column.attribute for column in self.columns))
+        # 文字列や None を含む列は format_value で変換してから書式に渡す
+        self._converted = [(i, column) for i, column in enumerate(self.columns) if column.converted]
+        self._row_format = self._make_row_format()
+
+    def _field(self, column: OutputColumn) -> str:
+        """1列分の % 書式"""
+        return "%s" if column.converted else f"%{column.spec}"
+
+    def _make_row_format(self) -> str:
+        """1行分の % 書式(最初の %s がタイムスタンプ)"""
+        return self.SEPARATOR.join(["%s"] + [self._field(column) for column in self.columns]) + "\n"
+
+    def format_time(self, timestamp: float) -> str:
+        return f"{timestamp:.2f}"
+
+    def format_value(self, column: OutputColumn, value) -> str:
+        """文字列・None を含む列の値を文字列にする"""
+        if value is None:
+            return ""
+        if column.spec == "s":
+            return value
+        return format(value, column.spec)
+
+    def format_header(self) -> str:
+        return ""
+
+    def format_rows(self, timestamp: float, results: Iterable[object]) -> str:
+        """1 tick 分の行を改行付きの1つの文字列にする"""
+        time_str = self.format_time(timestamp)
+        row_format = self._row_format
+        values = self._values
+        rows: List[Tuple[object, ...]]
+        if len(self.columns) == 1:
+            rows = [(time_str, values(result)) for result in results]
+        else:
+            rows = [(time_str,) + values(result) for result in results]
+        if self._converted:
+            format_value = self.format_value
+            for n, row in enumerate(rows):
+                fields = list(row)
+                for i, column in self._converted:
+                    fields[i + 1] = format_value(column, fields[i + 1])
+                rows[n] = tuple(fields)
+        return "".join([row_format % row for row in rows])
+
+    def _write(self, text: str):
+        if text:
+            self.stream.write(text)
+            self.stream.flush()
+
+    def write_header(self):
+        self._write(self.format_header())
+
+    def write_tick(self, timestamp: float, results: Iterable[object]):
+        self._write(self.format_rows(timestamp, results))
+
+
+class TableWriter(OutputWriter):
+    """これまでと同じ空白区切りの表。列幅はコンストラクタで1回だけ決める"""
+
+    SEPARATOR = "  "
+
+    def _field(self, column: OutputColumn) -> str:
+        width = max(column.width, len(column.label))
+        return f"%{width}s" if column.converted else f"%{width}{column.spec}"
+
+    def format_time(self, timestamp: float) -> str:
+        return format_time(timestamp)
+
+    def format_value(self, column: OutputColumn, value) -> str:
+        if value is None:
+            return "-"
+        return super().format_value(column, value)
+
+    def format_header(self) -> str:
+        labels = [f"{column.label:>{max(column.width, len(column.label))}s}" for column in self.columns]
+        return self.SEPARATOR.join([format_time(time.time())] + labels) + "\n"
+
+
+class CsvWriter(OutputWriter):
+    """CSV。1列目はエポック秒のタイムスタンプ"""
+
+    def format_value(self, column: OutputColumn, value) -> str:
+        text = super().format_value(column, value)
+        if column.spec == "s" and any(c in text for c in ',"\r\n'):
+            # RFC 4180 の引用符
+            return '"' + text.replace('"', '""') + '"'
+        return text
+
+    def format_header(self) -> str:
+        return ",".join(["timestamp"] + [column.attribute for column in self.columns]) + "\n"
+
+
+class JsonLinesWriter(OutputWriter):
+    """1行1オブジェクトの JSON Lines。キーは属性名で、json.dumps を使うのは文字列の値だけ"""
+
+    def _make_row_format(self) -> str:
+        fields = [f'"{column.attribute}":{self._field(column)}' for column in self.columns]
+        return "{" + ",".join(['"timestamp":%s'] + fields) + "}\n"
+
+    def format_value(self, column: OutputColumn, value) -> str:
+        if value is None:
+            return "null"
+        if column.spec == "s":
+            return json.dumps(value)
+        return format(value, column.spec)
+
+
+# --format の名前 -> OutputWriter
+OUTPUT_WRITERS = {
+    "table": TableWriter,
+    "csv": CsvWriter,
+    "json": JsonLinesWriter,
+}
+
+
+def print_header(threads: bool = False, memory: bool = False, io: bool = False, sched: bool = False):
+    TableWriter(result_columns(threads, memory, io, sched)).write_header()
+
+
+def format_result(
+    result: MeasurementResult, threads: bool = False, memory: bool = False, io: bool = False, sched: bool = False
+) -> str:
+    """計測結果を print_header の列に合わせた1行にする"""
+    writer = TableWriter(result_columns(threads, memory, io, sched))
+    return writer.format_rows(result.timestamp, [result]).rstrip("\n")
+
+class AggregateResult:
+    """--tree/--pgrp/--session の集計結果と、--replay のシステム全体・CPUごと・PIDごとの使用率"""
+
+    __slots__ = ("kind", "id", "usage_percent")
+
+    def __init__(self, kind: str, id: Union[int, None], usage_percent: float):
+        self.kind = kind  # "tree", "pgrp", "session" または --replay の "all", "cpu", "pid"
+        self.id = id  # 根のPID、プロセスグループID、セッションID、CPU番号 または PID ("all" は None)
+        self.usage_percent = usage_percent
+
+
+def aggregate_columns(nullable_id: bool = False) -> List[OutputColumn]:
+    return [
+        OutputColumn("kind", "GROUP", 7, "s"),
+        OutputColumn("id", "ID", 7, "d", nullable=nullable_id),
+        OutputColumn("usage_percent", "%CPU", 6, ".1f"),
+    ]
+
+
+def replay_results(tick: "ReplayTick", pids: Set[int]) -> List[AggregateResult]:
+    """--replay で1 tick 分に表示する行。システム全体、CPUごと、PIDごと(pids が空なら全て)の順"""
+    results = [AggregateResult("all", None, tick.system_usage_percent)]
+    results += [AggregateResult("cpu", cpu, usage) for cpu, usage in enumerate(tick.processor_usages)]
+    results += [
+        AggregateResult("pid", pid, tick.results[pid].usage_percent)
+        for pid in sorted(tick.results) if not pids or pid in pids
+    ]
+    return results
+
+
+def specified_pids(args: argparse.Namespace) -> List[int]:
+    """位置引数と -p で指定されたPID(ALL 以外)を返す。数値でないPIDは ValueError"""
+    pids: List[int] = list(args.pid)
+    if args.pid_option is not None and args.pid_option.upper() != "ALL":
+        pids.extend(int(pid) for pid in args.pid_option.split(",") if pid)
+    return pids
+
+
+def aggregate_results(tree: ProcessTree, args: argparse.Namespace) -> List[AggregateResult]:
+    """--tree/--pgrp/--session の集計結果を返す"""
+    results = []
+    if args.tree:
+        for pid in sorted(set(specified_pids(args))):
+            usage = tree.tree_usage_percent(pid)
+            if usage is not None:
+                results.append(AggregateResult("tree", pid, usage))
+    if args.pgrp:
+        for group, usage in sorted(tree.group_usages_percent().items()):
+            results.append(AggregateResult("pgrp", group, usage))
+    if args.session:
+        for session, usage in sorted(tree.session_usages_percent().items()):
+            results.append(AggregateResult("session", session, usage))
+    return results
+
+
+def cgroup_columns() -> List[OutputColumn]:
+    return [
+        OutputColumn("usage_percent", "%CPU", 6, ".1f"),
+        OutputColumn("user_percent", "%usr", 6, ".1f"),
+        OutputColumn("system_percent", "%sys", 6, ".1f"),
+        OutputColumn("quota_percent", "%quota", 7, ".1f", nullable=True),
+        OutputColumn("throttled_per_second", "thr/s", 6, ".1f"),
+        OutputColumn("throttled_percent", "%thr", 6, ".1f"),
+        OutputColumn("cgroup", "CGROUP", 0, "s"),
+    ]
+
+
+def format_cgroup_result(result: CgroupResult) -> str:
+    """cgroup の計測結果を表形式の1行にする"""
+    return TableWriter(cgroup_columns()).format_rows(result.timestamp, [result]).rstrip("\n")
+
+
+def monitor_cgroups(args: argparse.Namespace) -> int:
+    """--cgroup: cgroup ごとのCPU使用率を表示する"""
+    cache = StatFileCache()
+    sampler = CgroupSampler(args.cgroup, cache)
+    writer = OUTPUT_WRITERS[args.format](cgroup_columns())
+    writer.write_header()
+    try:
+        sampler.sample()
+        for _ in TickScheduler(args.interval, args.count):
+            results = sampler.sample()
+            if not results:
+                print("Error: no cgroup could be read.", file=sys.stderr)
+                return 1
+            timestamp = next(iter(results.values())).timestamp
+            writer.write_tick(timestamp, [results[cgroup] for cgroup in args.cgroup if cgroup in results])
+    except KeyboardInterrupt:
+        pass
+    finally:
+        cache.close()
+    return 0
+
+
+def print_summary(history: HistoryStore, seconds: Union[float, None] = None):
+    """履歴から min/max/mean/p95 の要約を表示する"""
+    _print("Summary:")
+    _print("  ".join([f"{'PID':>7s}", f"{'min':>6s}", f"{'max':>6s}", f"{'mean':>6s}", f"{'p95':>6s}"]))
+
+    def print_row(label: str, stats: Union[WindowStats, None]):
+        if stats is None:
+            return
+        _print("  ".join(
+            [f"{label:>7s}"] + [f"{value:6.1f}" for value in (stats.min, stats.max, stats.mean, stats.p95)]
+        ))
+
+    print_row("all", history.system.stats("usage", seconds))
+    for pid in sorted(history.processes):
+        print_row(str(pid), history.processes[pid].stats("usage", seconds))
+
+
+class PrometheusExporter:
+    """
+    バックグラウンドのスレッドで Sampler を一定間隔で回し、最新の計測結果を
+    Prometheus のテキスト形式にしたバイト列(body)として保持するクラス
+    scrape では body をそのまま返すだけなので、同時に何回 scrape されても /proc の読み込みは増えない
+    """
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+    PREFIX = "pidstat"
+
+    def __init__(self, sampler: Sampler, interval: float = 1.0, columns: Union[Sequence[OutputColumn], None] = None):
+        self.sampler = sampler
+        self.interval = interval
+        # pid/tgid はラベルにするので値の列からは除く
+        if columns is None:
+            columns = result_columns()
+        self._threads = any(column.attribute == "tgid" for column in columns)
+        self._columns = [column for column in columns if column.attribute not in ("pid", "tgid")]
+        # 最新のスナップショット。None の間はまだ計測結果がない
+        self._body: Union[bytes, None] = None
+        self.samples: int = 0
+        self._stop = threading.Event()
+        self._thread: Union[threading.Thread, None] = None
+
+    @property
+    def body(self) -> Union[bytes, None]:
+        """最新の計測結果のテキスト。参照を入れ替えるだけなのでロックは不要"""
+        return self._body
+
+    def render(self, results: Iterable[MeasurementResult], system_usage_percent: Union[float, None], timestamp: float) -> bytes:
+        """計測結果を Prometheus のテキスト形式にする"""
+        results = list(results)
+        if self._threads:
+            labels = [f'{{tgid="{result.tgid}",pid="{result.pid}"}} ' for result in results]
+        else:
+            labels = [f'{{pid="{result.pid}"}} ' for result in results]
+        prefix = PrometheusExporter.PREFIX
+        lines: List[str] = []
+        for column in self._columns:
+            name = f"{prefix}_process_{column.attribute}"
+            lines.append(f"# HELP {name} {column.label}\n# TYPE {name} gauge\n")
+            value_format = f"%{column.spec}\n"
+            value = attrgetter(column.attribute)
+            lines += [name + label + value_format % value(result) for label, result in zip(labels, results)]
+        if system_usage_percent is not None:
+            lines.append(
+                f"# HELP {prefix}_system_usage_percent CPU usage of the whole system\n"
+                f"# TYPE {prefix}_system_usage_percent gauge\n"
+                f"{prefix}_system_usage_percent {system_usage_percent:.1f}\n"
+            )
+        lines.append(
+            f"# HELP {prefix}_last_sample_timestamp_seconds Time of the last sample\n"
+            f"# TYPE {prefix}_last_sample_timestamp_seconds gauge\n"
+            f"{prefix}_last_sample_timestamp_seconds {timestamp:.3f}\n"
+            f"# HELP {prefix}_samples_total Number of samples taken\n"
+            f"# TYPE {prefix}_samples_total counter\n"
+            f"{prefix}_samples_total {self.samples}\n"
+        )
+        return "".join(lines).encode()
+
+    def update(self):
+        """1回サンプリングしてスナップショットを入れ替える"""
+        results = self.sampler.sample()
+        system_stat = self.sampler.last_system
+        if system_stat is None:
+            return
+        self.samples += 1
+        if self.sampler.top is not None:
+            values: Iterable[MeasurementResult] = self.sampler.top.items()
+        else:
+            values = [results[pid] for pid in sorted(results)]
+        self._body = self.render(values, self.sampler.system_usage_percent, system_stat.timestamp)
+
+    def _run(self):
+        for _ in TickScheduler(self.interval):
+            if self._stop.is_set():
+                break
+            self.update()
+
+    def start(self):
+        """基準のスナップショットを読み込み、バックグラウンドでのサンプリングを開始する"""
+        self.sampler.sample()
+        self._thread = threading.Thread(target=self._run, name="pidstat-exporter", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """サンプリングを止める(実行中の tick が終わるまで待つ)"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.interval + 1.0)
+            self._thread = None
+
+
+class _ExporterHandler(BaseHTTPRequestHandler):
+    """/metrics に PrometheusExporter のスナップショットを返す"""
+
+    server: "ExporterServer"
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.server.exporter.body
+        if body is None:
+            self.send_error(503, "no sample yet")
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", PrometheusExporter.CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # scrape のたびにアクセスログを出さない
+        pass
+
+
+class ExporterServer(ThreadingHTTPServer):
+    """PrometheusExporter を持つ HTTP サーバー"""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], exporter: PrometheusExporter):
+        super().__init__(address, _ExporterHandler)
+        self.exporter = exporter
+
+
+def serve_exporter(sampler: Sampler, args: argparse.Namespace) -> int:
+    """--exporter の処理。Ctrl+C で終了する"""
+    exporter = PrometheusExporter(
+        sampler, args.interval, result_columns(args.threads, args.memory, args.io, args.sched)
+    )
+    try:
+        server = ExporterServer(("", args.exporter), exporter)
+    except OSError as e:
+        print(f"Error: cannot listen on port {args.exporter}: {e}", file=sys.stderr)
+        return 1
+    print(f"Serving metrics on port {server.server_address[1]} at /metrics", file=sys.stderr)
+    exporter.start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        exporter.stop()
+        sampler.close()
+    return 0
+
 
 def define_argument_parser() -> argparse.ArgumentParser:
     """コマンドライン引数を定義する"""
-    p = argparse.ArgumentParser(description="Measure CPU usage for a specific process.")
-    p.add_argument("pid", type=int, help="The PID of the process to measure.")
+    p = argparse.ArgumentParser(description="Measure CPU usage for specific processes.")
+    p.add_argument("pid", type=int, nargs="*", help="The PIDs of the processes to measure.")
+    p.add_argument(
+        "-p", "--pid", dest="pid_option", metavar="{PID[,PID...]|ALL}",
+        help="Comma separated PIDs to measure, or ALL for every process.",
+    )
+    p.add_argument(
+        "-t", "--threads", action="store_true",
+        help="Report CPU usage for each thread of the processes.",
+    )
+    p.add_argument(
+        "-r", "--memory", action="store_true",
+        help="Also report page faults per second, VSZ and RSS in bytes, and %%MEM.",
+    )
+    p.add_argument(
+        "-d", "--io", action="store_true",
+        help="Also report disk I/O in kB/s, I/O syscalls per second and block I/O delay in ticks.",
+    )
+    p.add_argument(
+        "-w", "--sched", action="store_true",
+        help="Also report context switches per second and %%wait (time runnable but waiting on a run queue).",
+    )
+    p.add_argument(
+        "--format", choices=sorted(OUTPUT_WRITERS), default="table",
+        help="Output format for per-process rows: table (default), csv or json (JSON Lines).",
+    )
+    p.add_argument(
+        "--top", type=_count_type, default=None, metavar="K",
+        help="Print only the K processes with the highest value of --sort on each tick.",
+    )
+    p.add_argument(
+        "--sort", choices=sorted(TopK.KEYS), default="cpu",
+        help="Value used to choose the processes for --top (default: cpu).",
+    )
+    p.add_argument(
+        "--tree", action="store_true",
+        help="Report CPU usage of each given PID plus all its descendants instead of per process.",
+    )
+    p.add_argument(
+        "--pgrp", action="store_true",
+        help="Report CPU usage summed per process group instead of per process.",
+    )
+    p.add_argument(
+        "--session", action="store_true",
+        help="Report CPU usage summed per session instead of per process.",
+    )
+    p.add_argument(
+        "--workers", type=_count_type, default=None,
+        help="Read /proc/[pid]/stat files with this many parallel workers.",
+    )
+    p.add_argument(
+        "--scan-mode", choices=ParallelScanner.MODES, default="thread",
+        help="Use a thread pool (default) or a process pool for --workers.",
+    )
+    p.add_argument(
+        "-i", "--interval", type=_interval_type, default=1.0,
+        help="Seconds between reports (>= 0.01, default: 1.0).",
+    )
+    p.add_argument(
+        "-c", "--count", type=_count_type, default=None,
+        help="Number of reports to print before exiting (default: run forever).",
+    )
+    p.add_argument(
+        "--record", metavar="FILE",
+        help="Append raw counters of every tick to FILE in the binary recording format.",
+    )
+    p.add_argument(
+        "--proc-root", metavar="DIR", default=None,
+        help="Read process information from DIR instead of /proc.",
+    )
+    p.add_argument(
+        "--cgroup", action="append", metavar="PATH",
+        help="Report CPU usage of a cgroup v2 (relative to --cgroup-root) instead of processes. Repeatable.",
+    )
+    p.add_argument(
+        "--cgroup-root", metavar="DIR", default=None,
+        help="Read cgroups from DIR instead of /sys/fs/cgroup.",
+    )
+    p.add_argument(
+        "--replay", metavar="FILE",
+        help="Replay a file written by --record instead of reading /proc.",
+    )
+    p.add_argument(
+        "--from", dest="replay_from", metavar="T",
+        help="Replay from T (epoch seconds or HH:MM[:SS] on the day of the recording).",
+    )
+    p.add_argument(
+        "--to", dest="replay_to", metavar="T",
+        help="Replay up to T (epoch seconds or HH:MM[:SS] on the day of the recording).",
+    )
+    p.add_argument(
+        "--exporter", type=int, metavar="PORT", default=None,
+        help="Serve the latest sample as Prometheus metrics on PORT instead of printing rows.",
+    )
+    p.add_argument(
+        "--shm", metavar="NAME", default=None,
+        help="Also publish every tick to the shared memory segment NAME for SnapshotReader.",
+    )
+    p.add_argument(
+        "--shm-capacity", type=_count_type, default=4096, metavar="N",
+        help="Maximum number of PIDs published with --shm (default: 4096).",
+    )
+    p.add_argument(
+        "--summary", action="store_true",
+        help="Print min/max/mean/p95 of the kept history on exit.",
+    )
+    p.add_argument(
+        "--history", type=_interval_type, default=600.0, metavar="SECONDS",
+        help="Seconds of history kept for --summary (default: 600).",
+    )
+    p.add_argument(
+        "--self-stats", action="store_true",
+        help="Print pidstat's own read/parse/output latency and CPU time on exit.",
+    )
     return p
 
 
-if __name__ == "__main__":
-    print("-" * 20)
-    print("Process Stat Tool")
-    print("-" * 20)
+def _interval_type(value: str) -> float:
+    try:
+        interval = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid interval: '{value}'")
+    if interval < TickScheduler.MIN_INTERVAL:
+        raise argparse.ArgumentTypeError(
+            f"interval must be >= {TickScheduler.MIN_INTERVAL} seconds"
+        )
+    return interval
+
+
+def _count_type(value: str) -> int:
+    try:
+        count = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid count: '{value}'")
+    if count < 1:
+        raise argparse.ArgumentTypeError("count must be >= 1")
+    return count
+
+
+def parse_time(value: str, reference: float) -> float:
+    """
+    --from/--to の時刻を time.time() 形式に変換する
+    数値の場合はエポック秒、HH:MM[:SS] の場合は reference と同じ日の時刻として扱う
+    """
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = value.split(":")
+    if len(parts) not in (2, 3):
+        raise ValueError(f"invalid time: '{value}'")
+    hour, minute = int(parts[0]), int(parts[1])
+    second = float(parts[2]) if len(parts) == 3 else 0.0
+    day = time.localtime(reference)
+    midnight = time.mktime((day.tm_year, day.tm_mon, day.tm_mday, 0, 0, 0, 0, 0, -1))
+    return midnight + hour * 3600 + minute * 60 + second
+
+
+def replay(args: argparse.Namespace) -> int:
+    """--replay: 記録ファイルから計測結果を表示する"""
+    try:
+        replayer = Replayer(args.replay)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    with replayer:
+        reference = replayer.start_time
+        if reference is None:
+            return 0
+        try:
+            start = parse_time(args.replay_from, reference) if args.replay_from else None
+            end = parse_time(args.replay_to, reference) if args.replay_to else None
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+
+        # PIDが指定されていればそのPIDだけを表示する
+        pids: Set[int] = set(specified_pids(args))
+
+        writer = OUTPUT_WRITERS[args.format](aggregate_columns(nullable_id=True))
+        writer.write_header()
+        for tick in replayer.replay(start, end):
+            writer.write_tick(tick.timestamp, replay_results(tick, pids))
+    return 0
+
+
+def create_sampler(
+    args: argparse.Namespace, cache: Union[StatFileCache, None] = None
+) -> Union[Sampler, None]:
+    """コマンドライン引数から Sampler を作成する。引数が不正な場合は None を返す"""
+    pids: List[int] = list(args.pid)
+    # --top のメモリのキーと --shm もページフォルト・RSS などを使う
+    memory = args.memory or (args.top is not None and args.sort != "cpu") or args.shm is not None
+    if args.workers is not None and args.threads:
+        # スレッドの読み込みは並列化していない
+        return None
+    scanner: Union[ParallelScanner, None] = None
+    if args.workers is not None:
+        scanner = ParallelScanner(args.workers, args.scan_mode)
+    if args.tree or args.pgrp or args.session:
+        # 子孫や同じグループのプロセスも必要なので全プロセスを読み込む
+        # --tree の場合、位置引数と -p で指定されたPIDは集計するツリーの根として使う
+        try:
+            roots = specified_pids(args)
+        except ValueError:
+            return None
+        if args.threads or (args.tree and not roots):
+            return None
+        return AllProcessSampler(cache, scanner, io=args.io, sched=args.sched, tree=ProcessTree(), memory=memory)
+    if args.pid_option is not None:
+        if args.pid_option.upper() == "ALL":
+            if args.threads:
+                return ThreadSampler(cache=cache, all_processes=True, io=args.io, sched=args.sched, memory=memory)
+            return AllProcessSampler(cache, scanner, io=args.io, sched=args.sched, memory=memory)
+        try:
+            pids.extend(int(pid) for pid in args.pid_option.split(",") if pid)
+        except ValueError:
+            return None
+    if not pids:
+        return None
+    if args.threads:
+        return ThreadSampler(pids, cache, io=args.io, sched=args.sched, memory=memory)
+    return Sampler(pids, cache, scanner, io=args.io, sched=args.sched, memory=memory)
+
 
+def main():
     parser = define_argument_parser()
     args = parser.parse_args()
 
-    target_process_id = args.pid
-    
-    print_header()
-
-    while True:
-        result = measure_process_stat(target_process_id)
-        if result is None:
-            _print("Error reading process stat file.")
-            break
-        time_str = format_time(result.timestamp)
-        _print("  ".join([time_str, format(result.usage_percent, ".1f")]))
+    if args.format == "table":
+        print("-" * 20)
+        print("Process Stat Tool")
+        print("-" * 20)
+
+    if args.proc_root is not None:
+        set_proc_root(args.proc_root)
+
+    if args.cgroup_root is not None:
+        set_cgroup_root(args.cgroup_root)
+
+    if args.replay is not None:
+        sys.exit(replay(args))
+    if args.cgroup:
+        sys.exit(monitor_cgroups(args))
+
+    self_stats: Union[SelfStats, None] = SelfStats() if args.self_stats else None
+    sampler = create_sampler(args, StatFileCache(stats=self_stats))
+    if sampler is None:
+        if args.threads and (args.tree or args.pgrp or args.session):
+            parser.error("--tree, --pgrp and --session cannot be used with -t")
+        if args.threads and args.workers is not None:
+            parser.error("--workers cannot be used with -t")
+        if args.tree and args.pid_option is not None and args.pid_option.upper() == "ALL":
+            # 全プロセスを根にすると全ての部分木が表示されるだけなので、根は明示させる
+            parser.error("--tree cannot be combined with -p ALL; specify the root PIDs")
+        parser.error("specify PIDs to measure, or -p ALL")
+
+    if args.top is not None:
+        sampler.top = TopK(args.top, args.sort)
+
+    if args.exporter is not None:
+        sys.exit(serve_exporter(sampler, args))
+
+    if sampler.tree is not None:
+        columns = aggregate_columns()
+    else:
+        columns = result_columns(args.threads, args.memory, args.io, args.sched)
+    writer = OUTPUT_WRITERS[args.format](columns)
+    writer.write_header()
+
+    # 基準となる t1 のスナップショット
+    # 以降は各 tick の t2 を次の tick の t1 として使い回す
+    sampler.sample()
+    if self_stats is not None:
+        # 基準スナップショットの読み込みは最初の tick に含めない
+        self_stats.read_seconds = self_stats.parse_seconds = 0.0
+    scheduler = TickScheduler(args.interval, args.count)
+    missed = 0
+    history: Union[HistoryStore, None] = None
+    if args.summary:
+        history = HistoryStore(max(1, math.ceil(args.history / args.interval)))
+    recorder: Union[Recorder, None] = None
+    if args.record is not None:
+        try:
+            recorder = Recorder(args.record)
+        except (OSError, ValueError) as e:
+            parser.error(f"cannot record to {args.record}: {e}")
+        # 再生時に最初の tick の差分も計算できるように基準のスナップショットも記録する
+        if sampler.last_system is not None:
+            recorder.record(sampler.last_system, sampler.last_processes)
+    publisher: Union[SnapshotPublisher, None] = None
+    if args.shm is not None:
+        try:
+            publisher = SnapshotPublisher(
+                args.shm, args.shm_capacity,
+                len(sampler.last_system.processor_times) if sampler.last_system is not None else None,
+            )
+        except (OSError, ValueError) as e:
+            parser.error(f"cannot create shared memory {args.shm}: {e}")
+        # CPUごとの使用率の基準
+        if sampler.last_system is not None:
+            publisher.publish({}, sampler.last_system, None)
+
+    try:
+        for _ in scheduler:
+            if scheduler.missed != missed:
+                print(
+                    f"Warning: missed {scheduler.missed - missed} tick(s), sampling is slower than the interval.",
+                    file=sys.stderr,
+                )
+                missed = scheduler.missed
+            tick_start = time.perf_counter()
+            results = sampler.sample()
+            if not results:
+                print("Error reading process stat file.", file=sys.stderr)
+                break
+            if history is not None:
+                history.record(results, sampler.system_usage_percent)
+            if recorder is not None and sampler.last_system is not None:
+                recorder.record(sampler.last_system, sampler.last_processes)
+            if publisher is not None and sampler.last_system is not None:
+                publisher.publish(results, sampler.last_system, sampler.system_usage_percent)
+            output_start = time.perf_counter()
+            if sampler.tree is not None:
+                writer.write_tick(sampler.last_system.timestamp, aggregate_results(sampler.tree, args))  # type: ignore
+            elif sampler.top is not None:
+                # 表示するのは上位 k 件だけ
+                writer.write_tick(sampler.last_system.timestamp, sampler.top.items())  # type: ignore
+            elif args.threads:
+                writer.write_tick(
+                    sampler.last_system.timestamp,  # type: ignore
+                    sorted(results.values(), key=lambda r: (r.tgid, r.pid)),
+                )
+            else:
+                writer.write_tick(sampler.last_system.timestamp, [results[pid] for pid in sorted(results)])  # type: ignore
+            if self_stats is not None:
+                end = time.perf_counter()
+                self_stats.record_tick(end - tick_start, end - output_start)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if recorder is not None:
+            recorder.close()
+        if publisher is not None:
+            publisher.close()
+        sampler.close()
+
+    # CSV/JSON Lines の出力を壊さないように、要約などは表形式以外では標準エラー出力に書く
+    with redirect_stdout(sys.stdout if args.format == "table" else sys.stderr):
+        if history is not None:
+            print_summary(history)
+        if self_stats is not None:
+            _print("Self stats:")
+            for line in self_stats.report():
+                _print(line)
+
+
+if __name__ == "__main__":
+    main()
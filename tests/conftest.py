@@ -0,0 +1,16 @@
+import pytest
+
+import pidstat
+from pidstat import set_proc_root
+from benchmarks.fake_procfs import make_fake_procfs
+
+
+@pytest.fixture
+def fake_proc_root(tmp_path):
+    """偽の procfs を PROC_ROOT に設定し、テスト後に元に戻す"""
+    previous = pidstat.PROC_ROOT
+    root = str(tmp_path / "proc")
+    pids = make_fake_procfs(root, processes=20, threads=3, cpus=4)
+    set_proc_root(root + "/")
+    yield root, pids
+    set_proc_root(previous)
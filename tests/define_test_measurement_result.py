@@ -0,0 +1,17 @@
+from typing import Union
+
+from pidstat import MeasurementResult
+
+
+def make_result(
+    pid: int, usage: float, rss: int = 0, timestamp: float = 0.0, tgid: Union[int, None] = None
+) -> MeasurementResult:
+    """ テスト用の MeasurementResult を返す。tgid を省略した場合は MeasurementResult の初期値のまま """
+    result = MeasurementResult()
+    result.pid = pid
+    if tgid is not None:
+        result.tgid = tgid
+    result.usage_percent = usage
+    result.rss = rss
+    result.timestamp = timestamp
+    return result
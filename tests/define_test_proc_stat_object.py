@@ -13,11 +13,21 @@ def get_expected_process_stat():
     stat.basic.session = 1
     stat.basic.tty_device_num = 0
     stat.basic.tty_gid = -1
+    # page fault
+    stat.page_fault.minor_faults = 7957
+    stat.page_fault.child_minor_faults = 334989
+    stat.page_fault.major_faults = 123
+    stat.page_fault.child_major_faults = 2354
     # Cpu time
     stat.cpu_time.user = 80
     stat.cpu_time.system = 57
     stat.cpu_time.child_user = 951
     stat.cpu_time.child_system = 391
+    # scheduling
+    stat.scheduling.priority = 20
+    stat.scheduling.nice = 0
+    stat.scheduling.num_threads = 1
+    stat.scheduling.policy = 0
     # resource stat
     stat.resource.start_time = 92
     stat.resource.virtual_size = 22347776
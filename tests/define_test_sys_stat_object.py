@@ -277,4 +277,10 @@ def get_expected_sys_stat() -> SystemStat:
     p.guest = 0
     p.guest_nice = 0
     stat.processor_times.append(p)
+    # その他の統計
+    stat.ctxt = 10215942
+    stat.btime = 1747216229
+    stat.processes = 18880
+    stat.procs_running = 1
+    stat.procs_blocked = 0
     return stat
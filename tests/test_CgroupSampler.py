@@ -0,0 +1,91 @@
+from pytest_mock import MockerFixture
+import os
+import pytest
+
+import pidstat
+from pidstat import CgroupSampler, CgroupStatFile, SystemStatFile, CLOCK_TICKS_PER_SECOND
+from pidstat import set_cgroup_root, format_cgroup_result, define_argument_parser, monitor_cgroups, StatFileCache
+from benchmarks.fake_procfs import make_fake_cgroupfs, write_cgroup_cpu_stat
+from tests.test_Sampler import make_system_stat
+
+
+@pytest.fixture
+def cgroup_root(tmp_path):
+    """偽の cgroupfs を CGROUP_ROOT に設定し、テスト後に元に戻す"""
+    previous = pidstat.CGROUP_ROOT
+    root = str(tmp_path / "cgroup")
+    make_fake_cgroupfs(root, ["system.slice/web.service"], quota_usec=50000)
+    make_fake_cgroupfs(root, ["system.slice/db.service"])
+    set_cgroup_root(root)
+    yield root
+    set_cgroup_root(previous)
+
+
+def test_load(cgroup_root):
+    write_cgroup_cpu_stat(os.path.join(cgroup_root, "system.slice/web.service"), 300, 200, 4, 1000)
+    stat = CgroupStatFile.load("system.slice/web.service")
+    assert stat is not None
+    assert (stat.usage_usec, stat.user_usec, stat.system_usec) == (500, 300, 200)
+    assert (stat.nr_throttled, stat.throttled_usec) == (4, 1000)
+    assert (stat.quota_usec, stat.period_usec) == (50000, 100000)
+    # 絶対パスでも指定できる
+    unlimited = CgroupStatFile.load(os.path.join(cgroup_root, "system.slice/db.service"))
+    assert unlimited is not None
+    assert unlimited.quota_usec is None
+
+
+def test_missing_cgroup_is_reported_once(cgroup_root, mocker: MockerFixture, capsys):
+    mocker.patch.object(SystemStatFile, "load", side_effect=lambda cpu_only=False: make_system_stat(0, 0))
+    sampler = CgroupSampler(["no/such.service"])
+    for _ in range(3):
+        assert sampler.sample() == {}
+    captured = capsys.readouterr()
+    assert captured.err.count("not found") == 1
+    assert captured.out == ""
+
+
+def test_sample(cgroup_root, mocker: MockerFixture):
+    # 2CPU で1秒 -> システム全体のCPU時間の増分は 2 * CLOCK_TICKS_PER_SECOND
+    mocker.patch.object(
+        SystemStatFile, "load",
+        side_effect=[make_system_stat(0, 0), make_system_stat(CLOCK_TICKS_PER_SECOND, CLOCK_TICKS_PER_SECOND)],
+    )
+    mocker.patch("pidstat.time.time", side_effect=[10.0, 10.0, 11.0, 11.0])
+    sampler = CgroupSampler(["system.slice/web.service", "system.slice/db.service"])
+    sampler.sample()
+    write_cgroup_cpu_stat(os.path.join(cgroup_root, "system.slice/web.service"), 300000, 200000, 3, 250000)
+    write_cgroup_cpu_stat(os.path.join(cgroup_root, "system.slice/db.service"), 100000, 0)
+    results = sampler.sample()
+
+    web = results["system.slice/web.service"]
+    assert web.usage_percent == pytest.approx(25.0)
+    assert web.user_percent == pytest.approx(15.0)
+    assert web.system_percent == pytest.approx(10.0)
+    # クォータは 0.5 CPU -> 1秒で 500000us 使えるうち 500000us 使った
+    assert web.quota_percent == pytest.approx(100.0)
+    assert web.throttled_per_second == 3.0
+    assert web.throttled_percent == pytest.approx(25.0)
+
+    db = results["system.slice/db.service"]
+    assert db.usage_percent == pytest.approx(5.0)
+    assert db.quota_percent is None
+    assert format_cgroup_result(db).split()[4] == "-"
+
+
+def test_arguments():
+    parser = define_argument_parser()
+    args = parser.parse_args(["--cgroup", "a.slice", "--cgroup", "b.slice", "--cgroup-root", "/tmp/cg"])
+    assert args.cgroup == ["a.slice", "b.slice"]
+    assert args.cgroup_root == "/tmp/cg"
+
+
+@pytest.mark.parametrize("interrupt", [False, True])
+def test_monitor_closes_cache(cgroup_root, mocker: MockerFixture, capsys, interrupt: bool):
+    close = mocker.spy(StatFileCache, "close")
+    if interrupt:
+        mocker.patch.object(CgroupSampler, "sample", side_effect=KeyboardInterrupt)
+    args = define_argument_parser().parse_args(["--cgroup", "system.slice/web.service", "-i", "0.01", "-c", "1"])
+    assert monitor_cgroups(args) == 0
+    # 終了時も Ctrl-C のときも開いたファイルを閉じる
+    assert close.call_count == 1
+    capsys.readouterr()
@@ -0,0 +1,82 @@
+from pytest_mock import MockerFixture
+import pytest
+
+from pidstat import MemInfoFile, Sampler, PidStatFile, SystemStatFile, MeasurementResult
+from pidstat import PAGE_SIZE, format_result, define_argument_parser, create_sampler
+from tests.test_Sampler import make_process_stat, make_system_stat
+
+
+def test_load(fake_proc_root):
+    meminfo = MemInfoFile.load()
+    assert meminfo is not None
+    assert meminfo["MemTotal"] == 16 * 1024 * 1024 * 1024
+    # 単位のない項目はそのまま
+    assert meminfo["HugePages_Total"] == 0
+    assert MemInfoFile.load_mem_total() == 16 * 1024 * 1024 * 1024
+
+
+def test_load_real_meminfo():
+    assert MemInfoFile.load_mem_total() > 0
+
+
+def test_sample_memory(mocker: MockerFixture):
+    mocker.patch.object(SystemStatFile, "load", side_effect=lambda cpu_only=False: make_system_stat(0, 0))
+    load_mem_total = mocker.patch.object(MemInfoFile, "load_mem_total", return_value=PAGE_SIZE * 1000)
+
+    def make_stat(minor: int, major: int, rss: int, timestamp: float):
+        stat = make_process_stat(1, 0, 0)
+        stat.page_fault.minor_faults = minor
+        stat.page_fault.major_faults = major
+        stat.resource.virtual_size = 123456
+        stat.resource.rss = rss
+        stat.timestamp = timestamp
+        return stat
+
+    mocker.patch.object(
+        PidStatFile, "load",
+        side_effect=[make_stat(100, 10, 10, 1.0), make_stat(300, 11, 250, 3.0)],
+    )
+    sampler = Sampler([1], memory=True)
+    sampler.sample()
+    result = sampler.sample()[1]
+    assert result.minor_faults_per_second == 100.0
+    assert result.major_faults_per_second == 0.5
+    assert result.virtual_size == 123456
+    assert result.rss == 250 * PAGE_SIZE
+    assert result.memory_percent == pytest.approx(25.0)
+    assert load_mem_total.call_count == 1
+
+
+def test_memory_is_not_computed_without_memory_mode(mocker: MockerFixture):
+    mocker.patch.object(SystemStatFile, "load", side_effect=lambda cpu_only=False: make_system_stat(0, 0))
+    load_mem_total = mocker.patch.object(MemInfoFile, "load_mem_total", return_value=PAGE_SIZE * 1000)
+    stats = [make_process_stat(1, 0, 0), make_process_stat(1, 0, 0)]
+    stats[1].resource.rss = 250
+    mocker.patch.object(PidStatFile, "load", side_effect=stats)
+    sampler = Sampler([1])
+    sampler.sample()
+    result = sampler.sample()[1]
+    # -r なしでは /proc/meminfo を読まず、表示しないメモリの値も計算しない
+    assert load_mem_total.call_count == 0
+    assert result.rss == 0
+
+
+def test_format_result():
+    result = MeasurementResult()
+    result.pid = 42
+    result.usage_percent = 1.5
+    result.rss = 4096
+    result.memory_percent = 0.5
+    columns = format_result(result, memory=True).split()
+    assert columns[1:] == ["42", "1.5", "0.00", "0.00", "0", "4096", "0.50"]
+    assert format_result(result).split()[1:] == ["42", "1.5"]
+
+
+def test_memory_argument():
+    parser = define_argument_parser()
+    assert parser.parse_args(["1", "-r"]).memory
+    assert not parser.parse_args(["1"]).memory
+    assert create_sampler(parser.parse_args(["1", "-r"])).memory
+    assert not create_sampler(parser.parse_args(["1"])).memory
+    # --top のメモリのキーも -r と同じ値を使う
+    assert create_sampler(parser.parse_args(["1", "--top", "3", "--sort", "rss"])).memory
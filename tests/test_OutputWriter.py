@@ -0,0 +1,128 @@
+import io
+import json
+
+from pidstat import OutputWriter, TableWriter, CsvWriter, JsonLinesWriter, CgroupResult
+from pidstat import AggregateResult, result_columns, aggregate_columns, cgroup_columns
+from pidstat import format_result, define_argument_parser
+from tests.define_test_measurement_result import make_result
+
+
+class CountingStream(io.StringIO):
+    """write の呼び出し回数を数える"""
+
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def write(self, s: str) -> int:
+        self.writes += 1
+        return super().write(s)
+
+
+def test_table_writes_one_buffer_per_tick():
+    stream = CountingStream()
+    writer = TableWriter(result_columns(), stream)
+    writer.write_tick(1700000000.0, [make_result(pid, pid / 10) for pid in range(1, 101)])
+    assert stream.writes == 1
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 100
+    # タイムスタンプは全ての行で同じ
+    assert len({line.split()[0] for line in lines}) == 1
+    assert lines[4].split()[1:] == ["5", "0.5"]
+
+
+def test_table_columns_are_aligned():
+    stream = io.StringIO()
+    writer = TableWriter(result_columns(memory=True), stream)
+    writer.write_header()
+    writer.write_tick(1700000000.0, [make_result(1, 1.0, 4096), make_result(12345, 100.0, 123456789)])
+    lines = stream.getvalue().splitlines()
+    assert len({len(line) for line in lines}) == 1
+    assert lines[0].split()[1:4] == ["PID", "%CPU", "minflt/s"]
+
+
+def test_format_result_matches_table_writer():
+    result = make_result(42, 12.5)
+    assert format_result(result).split()[1:] == ["42", "12.5"]
+    assert format_result(result, threads=True).split()[1:] == ["0", "42", "12.5"]
+
+
+def test_csv():
+    stream = CountingStream()
+    writer = CsvWriter(result_columns(memory=True), stream)
+    writer.write_header()
+    writer.write_tick(1700000000.0, [make_result(1, 1.5, 4096), make_result(2, 0.0)])
+    assert stream.writes == 2
+    lines = stream.getvalue().splitlines()
+    assert lines[0].startswith("timestamp,pid,usage_percent,")
+    assert "rss" in lines[0].split(",")
+    row = dict(zip(lines[0].split(","), lines[1].split(",")))
+    assert row == {
+        "timestamp": "1700000000.00",
+        "pid": "1",
+        "usage_percent": "1.5",
+        "minor_faults_per_second": "0.00",
+        "major_faults_per_second": "0.00",
+        "virtual_size": "0",
+        "rss": "4096",
+        "memory_percent": "0.00",
+    }
+
+
+def test_json_lines():
+    stream = CountingStream()
+    writer = JsonLinesWriter(result_columns(threads=True, sched=True), stream)
+    writer.write_header()
+    writer.write_tick(1700000000.0, [make_result(1, 1.5), make_result(2, 99.9)])
+    writer.write_tick(1700000001.0, [])
+    # ヘッダーも空の tick も書き込まない
+    assert stream.writes == 1
+    rows = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [row["pid"] for row in rows] == [1, 2]
+    assert rows[1]["usage_percent"] == 99.9
+    assert rows[0]["timestamp"] == 1700000000.0
+    assert set(rows[0]) == {
+        "timestamp", "tgid", "pid", "usage_percent", "wait_percent",
+        "voluntary_switches_per_second", "involuntary_switches_per_second",
+    }
+
+
+def test_format_argument():
+    parser = define_argument_parser()
+    assert parser.parse_args(["1"]).format == "table"
+    assert parser.parse_args(["1", "--format", "json"]).format == "json"
+
+
+def make_cgroup_result(cgroup: str, quota_percent=None) -> CgroupResult:
+    result = CgroupResult()
+    result.cgroup = cgroup
+    result.usage_percent = 12.5
+    result.quota_percent = quota_percent
+    return result
+
+
+def test_text_and_missing_values():
+    results = [make_cgroup_result("system.slice/db.service"), make_cgroup_result('a,"b"', 50.0)]
+
+    table = TableWriter(cgroup_columns()).format_rows(0.0, results).splitlines()
+    assert table[0].split()[1:] == ["12.5", "0.0", "0.0", "-", "0.0", "0.0", "system.slice/db.service"]
+    assert table[1].split()[4] == "50.0"
+
+    csv = CsvWriter(cgroup_columns()).format_rows(0.0, results).splitlines()
+    assert csv[0] == "0.00,12.5,0.0,0.0,,0.0,0.0,system.slice/db.service"
+    assert csv[1].endswith(',"a,""b"""')
+
+    rows = [json.loads(line) for line in JsonLinesWriter(cgroup_columns()).format_rows(0.0, results).splitlines()]
+    assert rows[0]["quota_percent"] is None
+    assert rows[1]["quota_percent"] == 50.0
+    assert rows[1]["cgroup"] == 'a,"b"'
+
+
+def test_aggregate_rows_in_every_format():
+    results = [AggregateResult("tree", 1, 30.0), AggregateResult("pgrp", 5, 2.5)]
+    assert OutputWriter(aggregate_columns()).format_rows(1.0, results) == "1.00,tree,1,30.0\n1.00,pgrp,5,2.5\n"
+    rows = [json.loads(line) for line in JsonLinesWriter(aggregate_columns()).format_rows(1.0, results).splitlines()]
+    assert rows == [
+        {"timestamp": 1.0, "kind": "tree", "id": 1, "usage_percent": 30.0},
+        {"timestamp": 1.0, "kind": "pgrp", "id": 5, "usage_percent": 2.5},
+    ]
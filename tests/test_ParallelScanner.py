@@ -0,0 +1,110 @@
+import pytest
+from pytest_mock import MockerFixture
+import multiprocessing
+import os
+
+from pidstat import ParallelScanner, Sampler, AllProcessSampler, PidStatFile
+from pidstat import list_pids, create_sampler, define_argument_parser, _worker_open_pids
+
+
+@pytest.mark.parametrize("mode", ParallelScanner.MODES)
+def test_scan(mode: str):
+    pids = list_pids()
+    with ParallelScanner(workers=2, mode=mode, shards_per_worker=1) as scanner:
+        loaded = scanner.scan(pids + [-1])
+    assert os.getpid() in loaded
+    assert 1 in loaded
+    assert -1 not in loaded
+    # 全PIDで同じタイムスタンプ
+    assert len({process_stat.timestamp for process_stat in loaded.values()}) == 1
+    expected = PidStatFile.load(1)
+    assert expected is not None
+    assert loaded[1].basic == expected.basic
+
+
+def test_scan_single_worker():
+    with ParallelScanner(workers=1) as scanner:
+        loaded = scanner.scan([os.getpid()])
+        assert scanner._executor is None
+    assert list(loaded) == [os.getpid()]
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        ParallelScanner(workers=0)
+    with pytest.raises(ValueError):
+        ParallelScanner(mode="fiber")
+
+
+def test_sampler_with_scanner():
+    with ParallelScanner(workers=2, shards_per_worker=1) as scanner:
+        sampler = AllProcessSampler(scanner=scanner)
+        sampler.sample()
+        results = sampler.sample()
+    assert os.getpid() in results
+    assert 1 in results
+
+
+def test_create_sampler_with_workers():
+    parser = define_argument_parser()
+    sampler = create_sampler(parser.parse_args(["1", "--workers", "4", "--scan-mode", "process"]))
+    assert isinstance(sampler, Sampler)
+    assert sampler._scanner is not None
+    assert sampler._scanner.workers == 4
+    assert sampler._scanner.mode == "process"
+
+
+def test_thread_workers_keep_files_open(mocker: MockerFixture):
+    pids = list_pids()
+    with ParallelScanner(workers=2, shards_per_worker=1) as scanner:
+        scanner.scan(pids)
+        open_spy = mocker.spy(os, "open")
+        loaded = scanner.scan(pids)
+        # 2回目はシャードごとの StatFileCache で開いたままのファイルを読み込む
+        assert open_spy.call_count == 0
+        assert os.getpid() in loaded
+        scanner.discard(os.getpid())
+        assert all(os.getpid() not in cache._files for cache in scanner._caches)
+
+
+def test_process_workers_keep_their_pids(fake_proc_root):
+    root, pids = fake_proc_root
+    with ParallelScanner(workers=2, mode="process", shards_per_worker=1) as scanner:
+        scanner.scan(pids)
+        scanner.scan(pids)
+        # 同じPIDは毎回同じワーカーに送られるので、各ワーカーは自分のPIDのファイルだけを開いている
+        opened = [executor.submit(_worker_open_pids).result() for executor in scanner._executors]
+        assert opened == [sorted(pid for pid in pids if pid % 2 == worker) for worker in range(2)]
+        # 終了したPIDのファイルは次の scan でワーカーが閉じる
+        scanner.discard(pids[0])
+        scanner.scan(pids[1:])
+        opened = [executor.submit(_worker_open_pids).result() for executor in scanner._executors]
+        assert pids[0] not in opened[pids[0] % 2]
+
+
+def test_spawned_workers_use_proc_root(fake_proc_root):
+    root, pids = fake_proc_root
+    context = multiprocessing.get_start_method()
+    multiprocessing.set_start_method("spawn", force=True)
+    try:
+        with ParallelScanner(workers=2, mode="process", shards_per_worker=1) as scanner:
+            loaded = scanner.scan(pids)
+    finally:
+        multiprocessing.set_start_method(context, force=True)
+    # 偽の /proc のPIDだけが読み込まれる
+    assert sorted(loaded) == sorted(pids)
+
+
+def test_threads_cannot_use_workers():
+    parser = define_argument_parser()
+    assert create_sampler(parser.parse_args(["1", "-t", "--workers", "2"])) is None
+
+
+def test_sampler_close_shuts_down_scanner():
+    scanner = ParallelScanner(workers=2, shards_per_worker=1)
+    sampler = AllProcessSampler(scanner=scanner)
+    sampler.sample()
+    assert scanner._executor is not None
+    sampler.close()
+    assert scanner._executor is None
+    assert all(len(cache) == 0 for cache in scanner._caches)
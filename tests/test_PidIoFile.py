@@ -0,0 +1,103 @@
+from pytest_mock import MockerFixture
+import os
+
+from pidstat import PidIoFile, PidStatFile, SystemStatFile, Sampler, AllProcessSampler, ThreadSampler
+from pidstat import ProcessIo, MeasurementResult, StatFileCache, format_result, define_argument_parser, create_sampler
+from tests.test_Sampler import make_process_stat, make_system_stat
+
+
+def make_io(read_bytes: int, write_bytes: int, syscr: int, syscw: int) -> ProcessIo:
+    process_io = ProcessIo()
+    process_io.read_bytes = read_bytes
+    process_io.write_bytes = write_bytes
+    process_io.syscr = syscr
+    process_io.syscw = syscw
+    return process_io
+
+
+def test_parse():
+    process_io = PidIoFile._parse(
+        "rchar: 1\nwchar: 2\nsyscr: 3\nsyscw: 4\nread_bytes: 4096\nwrite_bytes: 8192\ncancelled_write_bytes: 512\n"
+    )
+    assert (process_io.rchar, process_io.wchar, process_io.syscr, process_io.syscw) == (1, 2, 3, 4)
+    assert (process_io.read_bytes, process_io.write_bytes, process_io.cancelled_write_bytes) == (4096, 8192, 512)
+
+
+def test_load_own_process():
+    assert PidIoFile.load(os.getpid()) is not None
+    assert PidIoFile.load(-1, quiet=True) is None
+
+
+def test_io_delay_field():
+    fields = ["0"] * 50
+    fields[39] = "77"  # フィールド42
+    process_stat = PidStatFile._parse(1, "1 (init) " + " ".join(fields))
+    assert process_stat is not None
+    assert process_stat.io_delay == 77
+
+
+def test_sample_io(mocker: MockerFixture):
+    mocker.patch.object(SystemStatFile, "load", side_effect=lambda cpu_only=False: make_system_stat(0, 0))
+
+    def make_stat(io_delay: int, timestamp: float):
+        stat = make_process_stat(1, 0, 0)
+        stat.io_delay = io_delay
+        stat.timestamp = timestamp
+        return stat
+
+    mocker.patch.object(PidStatFile, "load", side_effect=[make_stat(5, 1.0), make_stat(8, 3.0)])
+    mocker.patch.object(
+        PidIoFile, "load",
+        side_effect=[make_io(0, 0, 10, 10), make_io(4096, 2048, 30, 50)],
+    )
+    sampler = Sampler([1], io=True)
+    sampler.sample()
+    result = sampler.sample()[1]
+    assert result.read_kb_per_second == 2.0
+    assert result.write_kb_per_second == 1.0
+    assert result.cancelled_write_kb_per_second == 0.0
+    assert result.iops == 30.0
+    assert result.io_delay == 3
+
+
+def test_permission_denied_is_reported_once(mocker: MockerFixture, capsys):
+    mocker.patch.object(SystemStatFile, "load", side_effect=lambda cpu_only=False: make_system_stat(0, 0))
+    mocker.patch.object(PidStatFile, "load", side_effect=lambda pid, quiet=False: make_process_stat(pid, 0, 0))
+    mocker.patch("pidstat.list_pids", return_value=[1, 2, 3])
+
+    def load_io(pid: int, quiet: bool = False):
+        if pid != 3:
+            raise PermissionError(13, "Permission denied")
+        return make_io(0, 0, 0, 0)
+
+    load = mocker.patch.object(PidIoFile, "load", side_effect=load_io)
+    sampler = AllProcessSampler(io=True)
+    for _ in range(3):
+        results = sampler.sample()
+    # 権限がないPIDは最初の tick 以降は読み込まない
+    assert load.call_count == 3 + 1 + 1
+    assert capsys.readouterr().err.count("Warning") == 1
+    assert results[1].read_kb_per_second == -1.0
+    assert sampler._io_denied == {1, 2}
+    assert sampler.last_processes[3].io is not None
+
+
+def test_thread_io_on_fake_procfs(fake_proc_root):
+    _, pids = fake_proc_root
+    with StatFileCache() as cache:
+        sampler = ThreadSampler([pids[0]], cache, io=True)
+        sampler.sample()
+        assert sampler.last_processes[pids[0] + 1].io is not None
+
+
+def test_format_and_arguments():
+    parser = define_argument_parser()
+    sampler = create_sampler(parser.parse_args(["-d", "-p", "ALL"]))
+    assert isinstance(sampler, AllProcessSampler)
+    assert sampler.io
+    sampler = create_sampler(parser.parse_args(["1"]))
+    assert sampler is not None
+    assert not sampler.io
+
+    columns = format_result(MeasurementResult(), io=True).split()
+    assert columns[-5:] == ["0.00", "0.00", "0.00", "0.00", "0"]
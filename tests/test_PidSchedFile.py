@@ -0,0 +1,95 @@
+from pytest_mock import MockerFixture
+import os
+
+from pidstat import PidSchedFile, PidStatFile, SystemStatFile, Sampler, ThreadSampler, AllProcessSampler
+from pidstat import ProcessSchedStat, MeasurementResult, StatFileCache
+from pidstat import format_result, define_argument_parser, create_sampler
+from tests.test_Sampler import make_process_stat, make_system_stat
+
+STATUS = "Name:\tbash\nThreads:\t1\nvoluntary_ctxt_switches:\t150\nnonvoluntary_ctxt_switches:\t7\n"
+
+
+def make_sched(voluntary: int, involuntary: int, wait_time: int) -> ProcessSchedStat:
+    sched = ProcessSchedStat()
+    sched.voluntary_switches = voluntary
+    sched.involuntary_switches = involuntary
+    sched.wait_time = wait_time
+    return sched
+
+
+def test_parse():
+    sched = PidSchedFile._parse(STATUS, "2000000 500000 12\n")
+    assert sched.voluntary_switches == 150
+    assert sched.involuntary_switches == 7
+    assert (sched.run_time, sched.wait_time, sched.timeslices) == (2000000, 500000, 12)
+
+
+def test_load_own_process():
+    sched = PidSchedFile.load(os.getpid())
+    assert sched is not None
+    assert sched.run_time > 0
+    assert PidSchedFile.load(-1, quiet=True) is None
+
+
+def test_scheduling_fields():
+    process_stat = PidStatFile.load(os.getpid())
+    assert process_stat is not None
+    assert process_stat.scheduling.num_threads >= 1
+    assert process_stat.scheduling.nice == os.nice(0)
+    assert process_stat.scheduling.priority == 20 + os.nice(0)
+
+
+def test_sample_sched(mocker: MockerFixture):
+    mocker.patch.object(SystemStatFile, "load", side_effect=lambda cpu_only=False: make_system_stat(0, 0))
+
+    def make_stat(timestamp: float):
+        stat = make_process_stat(1, 0, 0)
+        stat.timestamp = timestamp
+        return stat
+
+    mocker.patch.object(PidStatFile, "load", side_effect=[make_stat(1.0), make_stat(3.0)])
+    mocker.patch.object(
+        PidSchedFile, "load",
+        side_effect=[make_sched(10, 2, 0), make_sched(30, 6, 500_000_000)],
+    )
+    sampler = Sampler([1], sched=True)
+    sampler.sample()
+    result = sampler.sample()[1]
+    assert result.voluntary_switches_per_second == 10.0
+    assert result.involuntary_switches_per_second == 2.0
+    assert result.wait_percent == 25.0
+
+
+def test_missing_schedstat_is_reported_as_minus_one(mocker: MockerFixture):
+    mocker.patch.object(SystemStatFile, "load", side_effect=lambda cpu_only=False: make_system_stat(0, 0))
+    mocker.patch.object(PidStatFile, "load", side_effect=lambda pid, quiet=False: make_process_stat(pid, 0, 0))
+    mocker.patch.object(PidSchedFile, "load", return_value=None)
+    sampler = Sampler([1], sched=True)
+    sampler.sample()
+    assert sampler.sample()[1].wait_percent == -1.0
+
+
+def test_thread_sched_on_fake_procfs(fake_proc_root):
+    _, pids = fake_proc_root
+    with StatFileCache() as cache:
+        sampler = ThreadSampler([pids[0]], cache, sched=True)
+        sampler.sample()
+        sched = sampler.last_processes[pids[0] + 2].sched
+    assert sched is not None
+    assert sched.voluntary_switches > 0
+
+
+def test_format_and_arguments():
+    parser = define_argument_parser()
+    sampler = create_sampler(parser.parse_args(["-w", "-p", "ALL"]))
+    assert isinstance(sampler, AllProcessSampler)
+    assert sampler.sched
+
+    result = MeasurementResult()
+    result.usage_percent = 12.5
+    result.wait_percent = 3.25
+    result.voluntary_switches_per_second = 4.0
+    columns = format_result(result, sched=True).split()
+    # %wait は %CPU の隣
+    assert columns[2:4] == ["12.5", "3.25"]
+    assert columns[-2:] == ["4.00", "0.00"]
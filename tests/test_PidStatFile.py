@@ -2,6 +2,7 @@ from pytest_mock import MockerFixture
 import os
 
 from pidstat import PidStatFile
+from pidstat import STAT_FIELD_STATE, STAT_FIELD_PARENT_PID, STAT_FIELD_USER, STAT_FIELD_SYSTEM, STAT_FIELD_START_TIME, STAT_FIELD_RSS
 from pidstat import ProcessStat, ProcessBasicInfo, ProcessCpuTime, ProcessResourceStat, PageFaultInfo, SchedulingInfo, MemoryAddressInfo, SchedulingInfo, MemoryAddressInfo
 from tests.define_test_proc_stat_object import get_expected_process_stat
 
@@ -52,3 +53,45 @@ def test_load_non_existent_stat_file(mocker: MockerFixture):
     process_stat = PidStatFile.load(pid)
 
     assert process_stat is None
+
+
+def test_parse_fields():
+    contents = read_test_stat_file(1).encode()
+    values = PidStatFile.parse_fields(contents, [STAT_FIELD_USER, STAT_FIELD_SYSTEM])
+    assert values == (80, 57)
+
+    values = PidStatFile.parse_fields(
+        contents, [STAT_FIELD_RSS, STAT_FIELD_STATE, STAT_FIELD_START_TIME, STAT_FIELD_PARENT_PID]
+    )
+    assert values == (3227, "S", 92, 0)
+
+
+def test_parse_fields_command_with_parens():
+    contents = b"123 (a) (b) R 1 123 123 0 -1 0 0 0 0 0 7 8 0 0"
+    values = PidStatFile.parse_fields(contents, [STAT_FIELD_STATE, STAT_FIELD_USER, STAT_FIELD_SYSTEM])
+    assert values == ("R", 7, 8)
+
+
+def test_parse_fields_invalid():
+    assert PidStatFile.parse_fields(b"123 no parens", [STAT_FIELD_USER]) is None
+    assert PidStatFile.parse_fields(b"1 (short) S 0 1", [STAT_FIELD_USER]) is None
+
+
+def test_load_fields():
+    values = PidStatFile.load_fields(os.getpid(), [STAT_FIELD_START_TIME])
+    expected = PidStatFile.load(os.getpid())
+    assert values is not None
+    assert expected is not None
+    assert values == (expected.resource.start_time,)
+    assert PidStatFile.load_fields(-1, [STAT_FIELD_USER], quiet=True) is None
+
+def test_parse_errors_go_to_stderr(capsys):
+    assert PidStatFile._parse(1, "1 no parens") is None
+    assert PidStatFile._parse(1, "1 (init) S 0") is None
+    assert PidStatFile._parse(2, "1 (init) S 0") is None
+    captured = capsys.readouterr()
+    # CSV/JSON Lines の出力に混ざらないように、診断メッセージは標準エラー出力だけに出す
+    assert captured.out == ""
+    assert "Could not find command name" in captured.err
+    assert "does not match requested PID" in captured.err
+    assert "Line content" not in captured.err
@@ -0,0 +1,46 @@
+import pidstat
+from pidstat import AllProcessSampler, ThreadSampler, StatFileCache, PidStatFile, SystemStatFile
+from pidstat import list_pids, list_tids
+
+
+def test_set_proc_root(fake_proc_root):
+    root, _ = fake_proc_root
+    assert pidstat.PROC_ROOT == root
+
+
+def test_fake_procfs_is_readable(fake_proc_root):
+    _, pids = fake_proc_root
+    assert sorted(list_pids()) == pids
+    assert sorted(list_tids(pids[1])) == [pids[1], pids[1] + 1, pids[1] + 2]
+
+    process_stat = PidStatFile.load(pids[0])
+    assert process_stat is not None
+    assert process_stat.basic.pid == pids[0]
+    assert process_stat.basic.command == f"worker {pids[0]}"
+
+    system_stat = SystemStatFile.load()
+    assert system_stat is not None
+    assert len(system_stat.processor_times) == 4
+    assert system_stat.btime == 1747216229
+
+
+def test_samplers_on_fake_procfs(fake_proc_root):
+    _, pids = fake_proc_root
+    with StatFileCache() as cache:
+        sampler = AllProcessSampler(cache)
+        sampler.sample()
+        # 偽の procfs は変化しないので使用率は 0
+        results = sampler.sample()
+        assert sorted(results) == pids
+        assert all(result.usage_percent == 0.0 for result in results.values())
+
+        thread_sampler = ThreadSampler(cache=cache, all_processes=True)
+        thread_sampler.sample()
+        assert len(thread_sampler.sample()) == len(pids) * 3
+
+
+def test_proc_root_argument():
+    parser = pidstat.define_argument_parser()
+    args = parser.parse_args(["-p", "ALL", "--proc-root", "/tmp/proc"])
+    assert args.proc_root == "/tmp/proc"
+    assert parser.parse_args(["-p", "ALL"]).proc_root is None
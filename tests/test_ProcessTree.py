@@ -0,0 +1,234 @@
+from pytest_mock import MockerFixture
+import random
+import pytest
+
+from pidstat import ProcessTree, AllProcessSampler, PidStatFile, SystemStatFile, ProcessStat
+from pidstat import create_sampler, define_argument_parser, main, aggregate_results, aggregate_columns, TableWriter
+from tests.test_Sampler import make_process_stat, make_system_stat
+
+
+def make_stat(pid: int, parent: int, cpu: int, group: int = 0, session: int = 0, start_time: int = 100) -> ProcessStat:
+    stat = make_process_stat(pid, cpu, 0, start_time)
+    stat.basic.parent_pid = parent
+    stat.basic.gid = group or pid
+    stat.basic.session = session or 1
+    return stat
+
+
+def brute_force_subtree(stats, deltas, root):
+    """全プロセスから子孫を毎回求めて合計する"""
+    total = 0
+    stack = [root]
+    while stack:
+        pid = stack.pop()
+        total += deltas.get(pid, 0)
+        stack.extend(child for child, stat in stats.items() if stat.basic.parent_pid == pid)
+    return total
+
+
+def test_tree_group_and_session():
+    tree = ProcessTree()
+    # 1 -> 2 -> 3, 1 -> 4
+    for stat in [make_stat(3, 2, 10, group=2), make_stat(1, 0, 0), make_stat(2, 1, 0, group=2), make_stat(4, 1, 0)]:
+        tree.update(stat.basic.pid, stat)
+    # 子(3)を親(2)より先に読み込んでも集計できる
+    tree.system_time_diff = 100
+    for stat in [make_stat(3, 2, 40, group=2), make_stat(1, 0, 5), make_stat(2, 1, 10, group=2), make_stat(4, 1, 20)]:
+        tree.update(stat.basic.pid, stat)
+    assert tree.tree_usage_percent(1) == 65.0
+    assert tree.tree_usage_percent(2) == 40.0
+    assert tree.tree_usage_percent(3) == 30.0
+    assert tree.tree_usage_percent(99) is None
+    assert tree.group_usages_percent() == {1: 5.0, 2: 40.0, 4: 20.0}
+    assert tree.session_usages_percent() == {1: 65.0}
+    assert tree.children(1) == {2, 4}
+
+    # 2 が終了し、3 は 1 に引き取られる
+    tree.remove(2)
+    tree.update(3, make_stat(3, 1, 40, group=2))
+    assert tree.tree_usage_percent(1) == 5.0 + 0.0 + 20.0
+    assert tree.children(1) == {3, 4}
+    assert tree.group_usages_percent() == {1: 5.0, 2: 0.0, 4: 20.0}
+
+
+def test_reused_pid_is_reinserted():
+    tree = ProcessTree()
+    tree.system_time_diff = 100
+    tree.update(1, make_stat(1, 0, 0))
+    tree.update(2, make_stat(2, 1, 0))
+    tree.update(2, make_stat(2, 1, 30))
+    assert tree.tree_usage_percent(1) == 30.0
+    # 同じPIDで開始時間が違う -> 別プロセスとして増分0から始める
+    tree.update(2, make_stat(2, 1, 500, start_time=200))
+    assert tree.tree_usage_percent(1) == 0.0
+    assert len(tree) == 2
+
+
+def test_matches_brute_force_with_random_forks_and_exits():
+    rng = random.Random(1)
+    tree = ProcessTree()
+    # 使用率(%) = jiffies になるようにする
+    tree.system_time_diff = 100
+    cpu = {1: 0}
+    parents = {1: 0}
+    groups = {1: 1}
+    next_pid = 2
+    for _ in range(200):
+        # fork (新しいプロセスは基準のスナップショットしかないので増分は0)
+        prev_cpu = dict(cpu)
+        for _ in range(rng.randrange(3)):
+            parent = rng.choice(list(parents))
+            parents[next_pid] = parent
+            cpu[next_pid] = 0
+            groups[next_pid] = rng.choice([groups[parent], next_pid])
+            next_pid += 1
+        # exit (子は 1 に引き取られる)
+        for pid in rng.sample(list(parents), k=min(2, len(parents) - 1)):
+            if pid == 1 or rng.random() < 0.7:
+                continue
+            del parents[pid], cpu[pid], groups[pid]
+            tree.remove(pid)
+            for child, parent in parents.items():
+                if parent == pid:
+                    parents[child] = 1
+        for pid in cpu:
+            if rng.random() < 0.3:
+                cpu[pid] += rng.randrange(10)
+        stats = {pid: make_stat(pid, parents[pid], cpu[pid], group=groups[pid]) for pid in parents}
+        for pid in rng.sample(list(stats), k=len(stats)):
+            tree.update(pid, stats[pid])
+
+        deltas = {pid: cpu[pid] - prev_cpu.get(pid, cpu[pid]) for pid in cpu}
+        for root in rng.sample(list(stats), k=min(5, len(stats))):
+            assert tree.tree_usage_percent(root) == pytest.approx(brute_force_subtree(stats, deltas, root))
+        expected_groups = {}
+        for pid, group in groups.items():
+            expected_groups[group] = expected_groups.get(group, 0) + deltas[pid]
+        assert tree.group_usages_percent() == pytest.approx(expected_groups)
+
+
+def test_reused_pid_does_not_create_cycle():
+    for single in (True, False):
+        tree = ProcessTree()
+        tree.system_time_diff = 100
+        tree.update_all({1: make_stat(1, 0, 0), 100: make_stat(100, 1, 0), 200: make_stat(200, 100, 0)})
+        tree.update_all({1: make_stat(1, 0, 0), 100: make_stat(100, 1, 10), 200: make_stat(200, 100, 20)})
+        assert tree.tree_usage_percent(1) == 30.0
+        # 100 が終了して 200 は 1 に引き取られ、200 の子が PID 100 を再利用した
+        # 200 を読み直す前に新しい 100 (親は 200) を読み込む
+        stats = {
+            100: make_stat(100, 200, 0, start_time=300),
+            200: make_stat(200, 1, 25),
+            1: make_stat(1, 0, 0),
+        }
+        if single:
+            for pid, stat in stats.items():
+                tree.update(pid, stat)
+        else:
+            tree.update_all(stats)
+        assert tree.children(1) == {200}
+        assert tree.children(200) == {100}
+        assert tree.children(100) == set()
+        # 古い 100 の子(200)の分は新しい 100 に入らない
+        assert tree.tree_usage_percent(100) == 0.0
+        assert tree.tree_usage_percent(200) == 5.0
+        assert tree.tree_usage_percent(1) == 5.0
+
+
+def test_matches_brute_force_with_pid_reuse():
+    rng = random.Random(2)
+    tree = ProcessTree()
+    tree.system_time_diff = 100
+    # 少ないPIDを使い回して、同じ tick 内での再利用を頻繁に起こす
+    pool = list(range(2, 12))
+    cpu = {1: 0}
+    parents = {1: 0}
+    start_times = {1: 0}
+    tree.update_all({1: make_stat(1, 0, 0, start_time=1)})
+    for tick in range(1, 300):
+        prev = {pid: (start_times[pid], cpu[pid]) for pid in cpu}
+        for pid in rng.sample(list(parents), k=min(2, len(parents))):
+            if pid != 1 and rng.random() < 0.5:
+                del parents[pid], cpu[pid], start_times[pid]
+                for child, parent in parents.items():
+                    if parent == pid:
+                        parents[child] = 1
+        for _ in range(rng.randrange(3)):
+            free = [pid for pid in pool if pid not in parents]
+            if not free:
+                break
+            pid = rng.choice(free)
+            parents[pid] = rng.choice(list(parents))
+            cpu[pid] = 0
+            start_times[pid] = tick
+        for pid in cpu:
+            if rng.random() < 0.5:
+                cpu[pid] += rng.randrange(10)
+        # 終了したプロセスは再利用されていなければ Sampler と同じように先に削除する
+        for pid in list(tree._nodes):
+            if pid not in parents:
+                tree.remove(pid)
+        stats = {
+            pid: make_stat(pid, parents[pid], cpu[pid], start_time=start_times[pid] + 1) for pid in parents
+        }
+        tree.update_all({pid: stats[pid] for pid in rng.sample(list(stats), k=len(stats))})
+
+        deltas = {
+            pid: cpu[pid] - prev[pid][1] if prev.get(pid, (None,))[0] == start_times[pid] else 0 for pid in cpu
+        }
+        for root in stats:
+            assert tree.tree_usage_percent(root) == pytest.approx(brute_force_subtree(stats, deltas, root))
+
+
+def test_sampler_updates_tree(mocker: MockerFixture):
+    mocker.patch.object(
+        SystemStatFile, "load",
+        side_effect=[make_system_stat(0, 0), make_system_stat(100, 100), make_system_stat(200, 200)],
+    )
+    cpu = {1: [0, 10, 20], 2: [0, 30, 60], 3: [0, 20, 20]}
+    ticks = {1: 0, 2: 0, 3: 0}
+
+    def load(pid: int, quiet: bool = False):
+        stat = make_stat(pid, pid - 1, cpu[pid][ticks[pid]])
+        ticks[pid] += 1
+        return stat
+
+    mocker.patch.object(PidStatFile, "load", side_effect=load)
+    mocker.patch("pidstat.list_pids", side_effect=[[1, 2, 3], [1, 2, 3], [1, 2]])
+    tree = ProcessTree()
+    sampler = AllProcessSampler(tree=tree)
+    sampler.sample()
+    results = sampler.sample()
+    assert tree.tree_usage_percent(1) == pytest.approx(sum(r.usage_percent for r in results.values()))
+    assert tree.tree_usage_percent(1) == 30.0
+    # 3 が終了すると索引から削除される
+    sampler.sample()
+    assert 3 not in tree
+    assert tree.tree_usage_percent(1) == 20.0
+
+
+def test_create_sampler_and_rows():
+    parser = define_argument_parser()
+    sampler = create_sampler(parser.parse_args(["1", "--tree"]))
+    assert isinstance(sampler, AllProcessSampler)
+    assert sampler.tree is not None
+    assert create_sampler(parser.parse_args(["--tree"])) is None
+    assert create_sampler(parser.parse_args(["--pgrp", "-t"])) is None
+    # -p で指定したPIDもツリーの根になる
+    assert isinstance(create_sampler(parser.parse_args(["-p", "1", "--tree"])), AllProcessSampler)
+    assert create_sampler(parser.parse_args(["-p", "ALL", "--tree"])) is None
+
+    tree = ProcessTree()
+    tree.update(1, make_stat(1, 0, 0))
+    results = aggregate_results(tree, parser.parse_args(["1", "--tree", "--pgrp", "--session"]))
+    rows = TableWriter(aggregate_columns()).format_rows(0.0, results).splitlines()
+    assert [row.split()[1:] for row in rows] == [["tree", "1", "0.0"], ["pgrp", "1", "0.0"], ["session", "1", "0.0"]]
+    results = aggregate_results(tree, parser.parse_args(["-p", "1", "--tree"]))
+    assert [(result.kind, result.id) for result in results] == [("tree", 1)]
+
+
+def test_tree_rejects_all_processes(mocker: MockerFixture, capsys):
+    mocker.patch("sys.argv", ["pidstat.py", "--tree", "-p", "ALL"])
+    with pytest.raises(SystemExit):
+        main()
+    assert "--tree cannot be combined with -p ALL" in capsys.readouterr().err
@@ -0,0 +1,108 @@
+from concurrent.futures import ThreadPoolExecutor
+from pytest_mock import MockerFixture
+import urllib.error
+import urllib.request
+
+import pytest
+
+from pidstat import PrometheusExporter, ExporterServer, Sampler, PidStatFile, SystemStatFile
+from pidstat import result_columns, define_argument_parser
+from tests.test_Sampler import make_process_stat, make_system_stat
+from tests.define_test_measurement_result import make_result
+
+
+@pytest.fixture
+def sampler(mocker: MockerFixture) -> Sampler:
+    ticks = iter(range(1, 1000))
+    mocker.patch.object(
+        SystemStatFile, "load",
+        side_effect=lambda cpu_only=False: make_system_stat(next(ticks) * 100, 0, 1700000000.0),
+    )
+    mocker.patch.object(PidStatFile, "load", side_effect=lambda pid, quiet=False: make_process_stat(pid, 0, 0))
+    return Sampler([1, 2])
+
+
+def test_render():
+    exporter = PrometheusExporter(Sampler([]), columns=result_columns(memory=True))
+    text = exporter.render([make_result(1, 1.5), make_result(2, 0.0)], 12.5, 1700000000.0).decode()
+    lines = text.splitlines()
+    assert "# TYPE pidstat_process_usage_percent gauge" in lines
+    assert 'pidstat_process_usage_percent{pid="1"} 1.5' in lines
+    assert 'pidstat_process_rss{pid="2"} 0' in lines
+    assert "pidstat_system_usage_percent 12.5" in lines
+    assert "pidstat_last_sample_timestamp_seconds 1700000000.000" in lines
+    # pid はラベルにするので値にはしない
+    assert not any(line.startswith("pidstat_process_pid") for line in lines)
+
+
+def test_render_threads():
+    exporter = PrometheusExporter(Sampler([]), columns=result_columns(threads=True))
+    text = exporter.render([make_result(11, 3.0, tgid=10)], None, 0.0).decode()
+    assert 'pidstat_process_usage_percent{tgid="10",pid="11"} 3.0' in text.splitlines()
+    assert "pidstat_system_usage_percent" not in text
+
+
+def test_update_swaps_snapshot(sampler: Sampler):
+    exporter = PrometheusExporter(sampler)
+    assert exporter.body is None
+    sampler.sample()
+    exporter.update()
+    first = exporter.body
+    assert first is not None
+    assert b'pidstat_process_usage_percent{pid="2"} 0.0' in first
+    exporter.update()
+    assert exporter.body is not first
+    assert b"pidstat_samples_total 2" in exporter.body  # type: ignore
+
+
+def _get(port: int, path: str = "/metrics") -> bytes:
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=5) as response:
+        assert response.headers["Content-Type"] == PrometheusExporter.CONTENT_TYPE
+        return response.read()
+
+
+def test_parallel_scrapes_do_not_read_proc(sampler: Sampler):
+    exporter = PrometheusExporter(sampler)
+    server = ExporterServer(("127.0.0.1", 0), exporter)
+    port = server.server_address[1]
+    executor = ThreadPoolExecutor(1)
+    executor.submit(server.serve_forever)
+    try:
+        with pytest.raises(urllib.error.HTTPError) as e:
+            _get(port)
+        assert e.value.code == 503
+        sampler.sample()
+        exporter.update()
+        loads = PidStatFile.load.call_count  # type: ignore
+        with ThreadPoolExecutor(16) as pool:
+            bodies = list(pool.map(lambda _: _get(port), range(100)))
+        assert all(body == exporter.body for body in bodies)
+        # scrape では /proc を読み込まない
+        assert PidStatFile.load.call_count == loads  # type: ignore
+        with pytest.raises(urllib.error.HTTPError) as e:
+            _get(port, "/other")
+        assert e.value.code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
+        executor.shutdown()
+
+
+def test_background_sampling(sampler: Sampler):
+    exporter = PrometheusExporter(sampler, interval=0.01)
+    exporter.start()
+    try:
+        for _ in range(500):
+            if exporter.samples >= 3:
+                break
+            exporter._stop.wait(0.01)
+    finally:
+        exporter.stop()
+    assert exporter.samples >= 3
+    assert exporter.body is not None
+
+
+def test_exporter_argument():
+    parser = define_argument_parser()
+    assert parser.parse_args(["1"]).exporter is None
+    assert parser.parse_args(["-p", "ALL", "--exporter", "9100"]).exporter == 9100
@@ -0,0 +1,130 @@
+import os
+
+import pytest
+
+from pidstat import Recorder, Replayer, RECORD_INDEX_SUFFIX, RECORD_FILE_HEADER, RECORD_TICK_HEADER, RECORD_CPU_TIME, RECORD_PROCESS
+from pidstat import RECORD_MAGIC, RECORD_VERSION, CLOCK_TICKS_PER_SECOND, PAGE_SIZE
+from pidstat import SystemCpuTime
+from tests.test_Sampler import make_process_stat, make_system_stat
+
+
+def make_snapshot(timestamp: float, utime: int):
+    system_stat = make_system_stat(1000, 9000, timestamp)
+    for i in range(2):
+        cpu_time = SystemCpuTime()
+        cpu_time.user = 500 + i
+        cpu_time.idle = 4500
+        system_stat.processor_times.append(cpu_time)
+    processes = {pid: make_process_stat(pid, utime * pid, 3) for pid in (10, 20, 30)}
+    processes[10].resource.virtual_size = 100 * PAGE_SIZE
+    processes[10].resource.rss = 7
+    return system_stat, processes
+
+
+def test_record_layout(tmp_path):
+    path = str(tmp_path / "record.bin")
+    with Recorder(path) as recorder:
+        recorder.record(*make_snapshot(1.5, 1))
+        recorder.record(*make_snapshot(2.5, 2))
+
+    with open(path, "rb") as f:
+        data = f.read()
+
+    magic, version, clock_ticks, _, page_size = RECORD_FILE_HEADER.unpack_from(data, 0)
+    assert (magic, version, clock_ticks, page_size) == (RECORD_MAGIC, RECORD_VERSION, CLOCK_TICKS_PER_SECOND, PAGE_SIZE)
+    tick_size = RECORD_TICK_HEADER.size + RECORD_CPU_TIME.size * 3 + RECORD_PROCESS.size * 3
+    assert len(data) == RECORD_FILE_HEADER.size + tick_size * 2
+    # 1プロセスあたり32バイト
+    assert RECORD_PROCESS.size == 32
+
+    offset = RECORD_FILE_HEADER.size + tick_size
+    timestamp, npids, ncpu = RECORD_TICK_HEADER.unpack_from(data, offset)
+    assert (timestamp, npids, ncpu) == (2.5, 3, 2)
+    offset += RECORD_TICK_HEADER.size
+    assert RECORD_CPU_TIME.unpack_from(data, offset)[:4] == (1000, 0, 0, 9000)
+    assert RECORD_CPU_TIME.unpack_from(data, offset + RECORD_CPU_TIME.size * 2)[0] == 501
+    offset += RECORD_CPU_TIME.size * 3
+    assert RECORD_PROCESS.unpack_from(data, offset) == (10, 20, 3, 0, 0, 100, 100, 7)
+
+
+def test_records_are_batched(tmp_path):
+    path = str(tmp_path / "record.bin")
+    recorder = Recorder(path, flush_bytes=1 << 20)
+    recorder.record(*make_snapshot(1.0, 1))
+    # flush_bytes に達するまでは書き込まない
+    assert os.path.getsize(path) == 0
+    recorder.close()
+    assert os.path.getsize(path) > 0
+
+
+def test_append_to_existing_file(tmp_path):
+    path = str(tmp_path / "record.bin")
+    with Recorder(path) as recorder:
+        recorder.record(*make_snapshot(1.0, 1))
+    size = os.path.getsize(path)
+    with Recorder(path) as recorder:
+        recorder.record(*make_snapshot(2.0, 2))
+    # ヘッダは最初の1回だけ
+    assert os.path.getsize(path) == 2 * size - RECORD_FILE_HEADER.size
+
+
+def test_counters_wrap_at_32bit(tmp_path):
+    path = str(tmp_path / "record.bin")
+    system_stat, processes = make_snapshot(1.0, 1)
+    processes[10].cpu_time.user = (1 << 32) + 5
+    with Recorder(path) as recorder:
+        recorder.record(system_stat, processes)
+    with open(path, "rb") as f:
+        data = f.read()
+    offset = RECORD_FILE_HEADER.size + RECORD_TICK_HEADER.size + RECORD_CPU_TIME.size * 3
+    assert RECORD_PROCESS.unpack_from(data, offset)[1] == 5
+
+
+def test_append_rejects_incompatible_header(tmp_path):
+    path = str(tmp_path / "record.bin")
+    with open(path, "wb") as f:
+        f.write(RECORD_FILE_HEADER.pack(
+            RECORD_MAGIC, RECORD_VERSION, CLOCK_TICKS_PER_SECOND + 1, os.cpu_count() or 0, PAGE_SIZE
+        ))
+    with pytest.raises(ValueError, match="CLK_TCK"):
+        Recorder(path)
+    # 別の形式のファイルにも追記しない
+    with open(path, "wb") as f:
+        f.write(b"something else entirely")
+    with pytest.raises(ValueError):
+        Recorder(path)
+    assert os.path.getsize(path) == len(b"something else entirely")
+
+
+def test_append_after_torn_tick(tmp_path, capsys):
+    path = str(tmp_path / "record.bin")
+    with Recorder(path) as recorder:
+        for tick in range(5):
+            recorder.record(*make_snapshot(1.0 + tick, tick + 1))
+    # 記録中の異常終了で最後の tick が途中で切れたファイル
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 10)
+    with Recorder(path) as recorder:
+        for tick in range(5, 10):
+            recorder.record(*make_snapshot(1.0 + tick, tick + 1))
+    assert "incomplete tick" in capsys.readouterr().err
+    with Replayer(path) as replayer:
+        ticks = list(replayer.replay())
+    # 切れた tick を除いた9 tick から8 tick 分の差分が計算できる
+    assert [tick.timestamp for tick in ticks] == [2.0, 3.0, 4.0, 6.0, 7.0, 8.0, 9.0, 10.0]
+    assert all(sorted(tick.results) == [10, 20, 30] for tick in ticks)
+
+
+def test_stale_index_is_replaced(tmp_path):
+    path = str(tmp_path / "record.bin")
+    with Recorder(path) as recorder:
+        recorder.record(*make_snapshot(100.0, 1))
+    # 記録ファイルだけを削除し、古い索引が残っている状態で記録し直す
+    os.remove(path)
+    with Recorder(path) as recorder:
+        recorder.record(*make_snapshot(5.0, 1))
+        recorder.record(*make_snapshot(6.0, 2))
+    with open(path + RECORD_INDEX_SUFFIX, "rb") as f:
+        assert len(f.read()) == 16
+    with Replayer(path) as replayer:
+        assert replayer.start_time == 5.0
@@ -0,0 +1,144 @@
+import pytest
+from pytest_mock import MockerFixture
+import os
+
+from pidstat import Recorder, Replayer, RECORD_INDEX_INTERVAL, RECORD_INDEX_SUFFIX
+from pidstat import parse_time, _calc_usage_percent, _calc_processor_usages_percent
+from pidstat import RECORD_INDEX_ENTRY, RECORD_FILE_HEADER, define_argument_parser, replay
+from pidstat import SystemCpuTime
+from tests.test_Sampler import make_process_stat, make_system_stat
+
+TICKS = RECORD_INDEX_INTERVAL * 3 + 5
+
+
+def make_snapshot(tick: int):
+    """1 tick ごとにシステム全体が100 jiffies、PID 10 が tick % 10 jiffies 進むスナップショット"""
+    system_stat = make_system_stat(tick * 50, tick * 50, 1000.0 + tick)
+    cpu_time = SystemCpuTime()
+    cpu_time.user = tick * 30
+    cpu_time.idle = tick * 70
+    system_stat.processor_times.append(cpu_time)
+    used = sum(i % 10 for i in range(tick + 1))
+    processes = {10: make_process_stat(10, used, 0), 20: make_process_stat(20, tick, tick)}
+    return system_stat, processes
+
+
+@pytest.fixture
+def recording(tmp_path) -> str:
+    path = str(tmp_path / "record.bin")
+    with Recorder(path, flush_bytes=4096) as recorder:
+        for tick in range(TICKS):
+            recorder.record(*make_snapshot(tick))
+    return path
+
+
+def test_replay_matches_live_calculation(recording: str):
+    with Replayer(recording) as replayer:
+        ticks = list(replayer.replay())
+    # 最初の tick は基準なので結果は TICKS - 1 個
+    assert len(ticks) == TICKS - 1
+    for n, tick in enumerate(ticks, start=1):
+        system1, processes1 = make_snapshot(n - 1)
+        system2, processes2 = make_snapshot(n)
+        assert tick.timestamp == 1000.0 + n
+        assert tick.results[10].usage_percent == pytest.approx(
+            _calc_usage_percent(processes1[10], processes2[10], system1, system2)
+        )
+        assert tick.results[20].usage_percent == pytest.approx(2.0)
+        assert tick.system_usage_percent == pytest.approx(50.0)
+        assert tick.processor_usages == pytest.approx(_calc_processor_usages_percent(system1, system2))
+
+
+def test_replay_time_range(recording: str, mocker: MockerFixture):
+    with Replayer(recording) as replayer:
+        decode = mocker.spy(replayer, "_decode")
+        ticks = list(replayer.replay(1000.0 + 150, 1000.0 + 155))
+    assert [tick.timestamp for tick in ticks] == [1000.0 + n for n in range(150, 156)]
+    assert ticks[0].results[10].usage_percent == pytest.approx(0.0)  # 150 % 10
+    # 範囲の直前の1 tick (基準) と範囲内の tick だけをデコードする
+    assert decode.call_count == 7
+
+
+def test_replay_without_index_file(recording: str):
+    with Replayer(recording) as replayer:
+        expected = [(tick.timestamp, tick.results[10].usage_percent) for tick in replayer.replay(1070.0, 1080.0)]
+    os.remove(recording + RECORD_INDEX_SUFFIX)
+    with Replayer(recording) as replayer:
+        assert len(replayer._index_offsets) == 4
+        actual = [(tick.timestamp, tick.results[10].usage_percent) for tick in replayer.replay(1070.0, 1080.0)]
+    assert actual == expected
+    assert len(actual) == 11
+
+
+def test_replay_unwraps_32bit_counters(tmp_path):
+    path = str(tmp_path / "record.bin")
+    with Recorder(path) as recorder:
+        for tick, user in enumerate([(1 << 32) - 10, (1 << 32) + 10]):
+            system_stat = make_system_stat(tick * 100, 0, float(tick))
+            recorder.record(system_stat, {1: make_process_stat(1, user, 0)})
+    with Replayer(path) as replayer:
+        ticks = list(replayer.replay())
+    assert ticks[0].results[1].usage_percent == pytest.approx(20.0)
+
+
+# 1 tick のサイズ: tick ヘッダ 16 + CPU時間 80 x 2 + プロセス 32 x 2
+TICK_SIZE = 240
+
+
+# 最後の cut バイトが切れていると、最後の1 tick (または索引のある tick まで) が不完全になる
+@pytest.mark.parametrize("cut", [1, 20, 100, TICK_SIZE * 4 + 10])
+@pytest.mark.parametrize("with_index", [True, False])
+def test_replay_truncated_file(recording: str, cut: int, with_index: bool):
+    # 記録中や記録中の異常終了で最後の tick が途中で切れている
+    size = os.path.getsize(recording)
+    with open(recording, "r+b") as f:
+        f.truncate(size - cut)
+    if not with_index:
+        os.remove(recording + RECORD_INDEX_SUFFIX)
+    last_tick = TICKS - 1 - -(-cut // TICK_SIZE)
+    with Replayer(recording) as replayer:
+        ticks = list(replayer.replay())
+        # 範囲の指定で最後の方へ移動しても切れた tick は返さない
+        last = [tick.timestamp for tick in replayer.replay(1000.0 + last_tick - 1)]
+    assert len(ticks) == last_tick
+    assert ticks[-1].timestamp == 1000.0 + last_tick
+    assert last == [1000.0 + last_tick - 1, 1000.0 + last_tick]
+
+
+def test_stale_index_entries_are_ignored(recording: str):
+    # 別の記録の索引: 存在しないオフセット、最初の tick より前、タイムスタンプが tick と一致しない項目
+    with open(recording + RECORD_INDEX_SUFFIX, "wb") as f:
+        f.write(RECORD_INDEX_ENTRY.pack(1.0, 1 << 40))
+        f.write(RECORD_INDEX_ENTRY.pack(1.0, 0))
+        f.write(RECORD_INDEX_ENTRY.pack(1.0, RECORD_FILE_HEADER.size))
+    with Replayer(recording) as replayer:
+        # 使える項目がないので tick ヘッダから作り直す
+        assert replayer.start_time == 1000.0
+        assert len(replayer._index_offsets) == 4
+        assert [tick.timestamp for tick in replayer.replay(1000.0 + TICKS - 2)] == [1000.0 + TICKS - 2, 1000.0 + TICKS - 1]
+
+
+def test_replay_prints_system_and_processor_rows(recording: str, capsys):
+    args = define_argument_parser().parse_args(["--replay", recording, "--to", "1001", "--format", "csv", "-p", "10"])
+    assert replay(args) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == "timestamp,kind,id,usage_percent"
+    # ライブの計測と同じく、システム全体・CPUごと・PIDごとの使用率を表示する
+    assert [line.split(",")[1:] for line in lines[1:]] == [["all", "", "50.0"], ["cpu", "0", "30.0"], ["pid", "10", "1.0"]]
+
+
+def test_invalid_file(tmp_path):
+    path = str(tmp_path / "invalid.bin")
+    with open(path, "wb") as f:
+        f.write(b"not a recording, just some bytes")
+    with pytest.raises(ValueError):
+        Replayer(path)
+
+
+def test_parse_time():
+    assert parse_time("1234.5", 0.0) == 1234.5
+    reference = parse_time("12:00", 1747216229.0)
+    assert parse_time("12:00:30", 1747216229.0) == reference + 30
+    assert parse_time("13:30", 1747216229.0) == reference + 5400
+    with pytest.raises(ValueError):
+        parse_time("noon", 0.0)
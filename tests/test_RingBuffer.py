@@ -0,0 +1,85 @@
+import pytest
+
+from pidstat import RingBuffer, HistoryStore
+from tests.define_test_measurement_result import make_result
+
+
+def test_append_and_stats():
+    buffer = RingBuffer(10)
+    for i in range(1, 6):
+        buffer.append(float(i), float(i * 10))
+    assert len(buffer) == 5
+    stats = buffer.stats("usage")
+    assert stats is not None
+    assert stats.count == 5
+    assert stats.min == 10.0
+    assert stats.max == 50.0
+    assert stats.mean == 30.0
+    assert stats.p95 == 50.0
+
+
+def test_capacity_is_fixed():
+    buffer = RingBuffer(4)
+    for i in range(100):
+        buffer.append(float(i), float(i))
+    assert len(buffer) == 4
+    stats = buffer.stats("usage")
+    assert stats is not None
+    assert (stats.min, stats.max, stats.count) == (96.0, 99.0, 4)
+    assert [value for segment in buffer.window("timestamp") for value in segment] == [96.0, 97.0, 98.0, 99.0]
+
+
+def test_window_by_seconds_across_wraparound():
+    buffer = RingBuffer(8)
+    for i in range(10):
+        buffer.append(float(i), float(i))
+    # 最新が 9 秒 -> 直近 3 秒は 6, 7, 8, 9 (配列の末尾と先頭にまたがる)
+    segments = buffer.window("usage", 3.0)
+    assert len(segments) == 2
+    assert [value for segment in segments for value in segment] == [6.0, 7.0, 8.0, 9.0]
+    stats = buffer.stats("usage", 3.0)
+    assert stats is not None
+    assert stats.mean == pytest.approx(7.5)
+
+
+def test_p95_nearest_rank():
+    buffer = RingBuffer(100)
+    for i in range(1, 101):
+        buffer.append(float(i), float(101 - i))
+    stats = buffer.stats("usage")
+    assert stats is not None
+    assert stats.p95 == 95.0
+
+
+def test_multiple_columns():
+    buffer = RingBuffer(3, ("usage", "rss"))
+    buffer.append(1.0, 5.0, 1000.0)
+    buffer.append(2.0, 7.0, 3000.0)
+    stats = buffer.stats("rss")
+    assert stats is not None
+    assert stats.mean == 2000.0
+
+
+def test_empty_stats():
+    buffer = RingBuffer(3)
+    assert buffer.stats("usage") is None
+    assert buffer.window("usage") == []
+    with pytest.raises(ValueError):
+        RingBuffer(0)
+
+
+def test_history_store_keeps_exited_pids_within_capacity():
+    history = HistoryStore(3)
+    history.record({1: make_result(1, 10.0, timestamp=1.0), 2: make_result(2, 20.0, timestamp=1.0)}, 30.0, 1.0)
+    history.record({1: make_result(1, 12.0, timestamp=2.0)}, 12.0, 2.0)
+    # 終了したPIDの履歴も --summary のために残る
+    assert sorted(history.processes) == [1, 2]
+    assert len(history.processes[1]) == 2
+    assert len(history.processes[2]) == 1
+    assert len(history.system) == 2
+    history.record({1: make_result(1, 14.0, timestamp=3.0)}, 14.0, 3.0)
+    assert sorted(history.processes) == [1, 2]
+    # capacity tick より古くなった履歴は削除される
+    history.record({1: make_result(1, 16.0, timestamp=4.0)}, 16.0, 4.0)
+    assert sorted(history.processes) == [1]
+    assert len(history.processes[1]) == 3
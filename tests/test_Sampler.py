@@ -0,0 +1,171 @@
+from pytest_mock import MockerFixture
+import os
+
+from pidstat import Sampler, AllProcessSampler, PidStatFile, SystemStatFile
+from pidstat import list_pids, create_sampler, define_argument_parser
+from pidstat import ProcessStat, SystemStat
+
+
+def make_process_stat(pid: int, user: int, system: int, start_time: int = 100) -> ProcessStat:
+    stat = ProcessStat()
+    stat.basic.pid = pid
+    stat.cpu_time.user = user
+    stat.cpu_time.system = system
+    stat.resource.start_time = start_time
+    return stat
+
+
+def make_system_stat(user: int, idle: int, timestamp: float = 0.0) -> SystemStat:
+    stat = SystemStat()
+    stat.cpu_time.user = user
+    stat.cpu_time.idle = idle
+    stat.timestamp = timestamp
+    return stat
+
+
+def test_first_sample_is_empty(mocker: MockerFixture):
+    mocker.patch.object(SystemStatFile, "load", return_value=make_system_stat(0, 0))
+    mocker.patch.object(PidStatFile, "load", side_effect=lambda pid, quiet=False: make_process_stat(pid, 0, 0))
+    sampler = Sampler([1, 2])
+    assert sampler.sample() == {}
+
+
+def test_sample_reads_system_stat_once_per_tick(mocker: MockerFixture):
+    system_load = mocker.patch.object(
+        SystemStatFile, "load",
+        side_effect=[make_system_stat(0, 0, 1.0), make_system_stat(100, 100, 2.0)],
+    )
+    ticks = {1: 0, 2: 0, 3: 0}
+
+    def load_process(pid: int, quiet: bool = False) -> ProcessStat:
+        stat = make_process_stat(pid, ticks[pid] * pid * 10, 0)
+        ticks[pid] += 1
+        return stat
+
+    process_load = mocker.patch.object(PidStatFile, "load", side_effect=load_process)
+    sampler = Sampler([1, 2, 3])
+    sampler.sample()
+    results = sampler.sample()
+
+    assert system_load.call_count == 2
+    assert process_load.call_count == 6
+    assert sorted(results) == [1, 2, 3]
+    # 同じ区間(システム全体 200 jiffies)から計算されている
+    assert results[1].usage_percent == 5.0
+    assert results[2].usage_percent == 10.0
+    assert results[3].usage_percent == 15.0
+    assert all(r.timestamp == 2.0 for r in results.values())
+    assert results[2].pid == 2
+
+
+def test_measure_sleeps_once(mocker: MockerFixture):
+    mocker.patch.object(
+        SystemStatFile, "load",
+        side_effect=[make_system_stat(0, 0), make_system_stat(50, 50)],
+    )
+    mocker.patch.object(PidStatFile, "load", side_effect=lambda pid, quiet=False: make_process_stat(pid, 0, 0))
+    sleep = mocker.patch("pidstat.time.sleep")
+    results = Sampler(range(100)).measure(0.5)
+
+    sleep.assert_called_once_with(0.5)
+    assert len(results) == 100
+
+
+def test_pids_can_change_at_runtime(mocker: MockerFixture):
+    mocker.patch.object(SystemStatFile, "load", side_effect=lambda cpu_only=False: make_system_stat(0, 0))
+    mocker.patch.object(PidStatFile, "load", side_effect=lambda pid, quiet=False: make_process_stat(pid, 0, 0))
+    sampler = Sampler([1])
+    sampler.sample()
+    sampler.add_pid(2)
+    # 追加直後のPIDは基準スナップショットだけ
+    assert sorted(sampler.sample()) == [1]
+    assert sorted(sampler.sample()) == [1, 2]
+    sampler.remove_pid(1)
+    assert sampler.pids == {2}
+    assert sorted(sampler.sample()) == [2]
+
+
+def test_reused_pid_is_not_measured(mocker: MockerFixture):
+    mocker.patch.object(SystemStatFile, "load", side_effect=lambda cpu_only=False: make_system_stat(0, 0))
+    mocker.patch.object(
+        PidStatFile, "load",
+        side_effect=[make_process_stat(1, 0, 0, start_time=100), make_process_stat(1, 0, 0, start_time=200)],
+    )
+    sampler = Sampler([1])
+    sampler.sample()
+    assert sampler.sample() == {}
+
+
+def test_sample_real_process():
+    sampler = Sampler([os.getpid()])
+    sampler.sample()
+    results = sampler.sample()
+    assert os.getpid() in results
+
+
+def test_list_pids():
+    pids = list_pids()
+    assert os.getpid() in pids
+    assert 1 in pids
+
+
+def test_all_process_sampler_tracks_new_and_exited_pids(mocker: MockerFixture):
+    mocker.patch.object(SystemStatFile, "load", side_effect=lambda cpu_only=False: make_system_stat(0, 0))
+    mocker.patch.object(PidStatFile, "load", side_effect=lambda pid, quiet=False: make_process_stat(pid, 0, 0))
+    list_pids_mock = mocker.patch("pidstat.list_pids", side_effect=[[1, 2, 3], [1, 3, 4], [1, 4]])
+    sampler = AllProcessSampler()
+
+    assert sampler.sample() == {}
+    assert sorted(sampler.sample()) == [1, 3]
+    assert sorted(sampler._prev_processes) == [1, 3, 4]
+    assert sorted(sampler.sample()) == [1, 4]
+    assert sorted(sampler._prev_processes) == [1, 4]
+    assert list_pids_mock.call_count == 3
+
+
+def test_all_process_sampler_drops_pid_that_exits_while_reading(mocker: MockerFixture):
+    mocker.patch.object(SystemStatFile, "load", side_effect=lambda cpu_only=False: make_system_stat(0, 0))
+    exited = set()
+    mocker.patch.object(
+        PidStatFile, "load",
+        side_effect=lambda pid, quiet=False: None if pid in exited else make_process_stat(pid, 0, 0),
+    )
+    mocker.patch("pidstat.list_pids", return_value=[1, 2])
+    sampler = AllProcessSampler()
+    sampler.sample()
+    exited.add(2)
+    assert sorted(sampler.sample()) == [1]
+    assert sorted(sampler._prev_processes) == [1]
+
+
+def test_quiet_load_of_exited_process(capsys):
+    assert PidStatFile.load(-1, quiet=True) is None
+    assert capsys.readouterr().out == ""
+
+
+def test_create_sampler():
+    parser = define_argument_parser()
+    assert isinstance(create_sampler(parser.parse_args(["-p", "ALL"])), AllProcessSampler)
+    sampler = create_sampler(parser.parse_args(["1", "-p", "2,3"]))
+    assert sampler is not None
+    assert sampler.pids == {1, 2, 3}
+    assert create_sampler(parser.parse_args([])) is None
+    assert create_sampler(parser.parse_args(["-p", "abc"])) is None
+
+
+def test_exited_pid_is_reported_once_on_stderr(mocker: MockerFixture, capsys):
+    mocker.patch.object(SystemStatFile, "load", side_effect=lambda cpu_only=False: make_system_stat(0, 0))
+    alive = {1, 2}
+    mocker.patch.object(
+        PidStatFile, "load",
+        side_effect=lambda pid, quiet=False: make_process_stat(pid, 0, 0) if pid in alive else None,
+    )
+    sampler = Sampler([1, 2])
+    sampler.sample()
+    alive.discard(2)
+    for _ in range(3):
+        assert sorted(sampler.sample()) == [1]
+    captured = capsys.readouterr()
+    # CSV/JSON Lines の出力(標準出力)に混ざらない
+    assert captured.out == ""
+    assert captured.err.count("PID 2 not found") == 1
@@ -0,0 +1,89 @@
+import os
+import time
+import pidstat
+import pytest
+from pytest_mock import MockerFixture
+
+from pidstat import LatencyHistogram, ParallelScanner, SelfStats, StatFileCache, Sampler, define_argument_parser
+
+
+def test_histogram_buckets():
+    histogram = LatencyHistogram()
+    for _ in range(90):
+        histogram.observe(0.0004)
+    for _ in range(10):
+        histogram.observe(0.03)
+    assert histogram.count == 100
+    assert histogram.max == 0.03
+    assert histogram.mean == pytest.approx(0.00336)
+    # 0.0004 は上限 0.0005 のバケットに入る
+    assert histogram.percentile(50) == pytest.approx(0.0005)
+    # 上限 0.05 のバケットだが最大値を超えない
+    assert histogram.percentile(95) == 0.03
+    assert sum(histogram.counts) == 100
+
+
+def test_histogram_overflow_and_empty():
+    histogram = LatencyHistogram()
+    assert histogram.percentile(99) == 0.0
+    assert histogram.mean == 0.0
+    histogram.observe(30.0)
+    assert histogram.counts[-1] == 1
+    assert histogram.percentile(99) == 30.0
+
+
+def test_cache_accumulates_read_and_parse_time():
+    stats = SelfStats()
+    with StatFileCache(stats=stats) as cache:
+        sampler = Sampler([os.getpid()], cache)
+        sampler.sample()
+        sampler.sample()
+    assert stats.read_seconds > 0
+    assert stats.parse_seconds > 0
+    stats.record_tick(0.002, 0.001)
+    assert stats.read_seconds == 0.0
+    assert stats.parse_seconds == 0.0
+    assert all(histogram.count == 1 for histogram in stats.histograms.values())
+    assert stats.histograms["tick"].max == 0.002
+
+
+def test_workers_and_extra_files_are_timed(mocker: MockerFixture):
+    stats = SelfStats()
+    scanner = ParallelScanner(workers=1)
+    sampler = Sampler([os.getpid()], StatFileCache(stats=stats), scanner=scanner, io=True, sched=True)
+    scan = scanner.scan
+    mocker.patch.object(scanner, "scan", side_effect=lambda pids: (time.sleep(0.01), scan(pids))[1])
+    load_sched = mocker.patch.object(sampler, "_load_sched", side_effect=lambda pid: time.sleep(0.01))
+    sampler.sample()
+    sampler.close()
+    # --workers の scan 全体と sched の読み込みが読み込み時間として加算される
+    assert load_sched.call_count == 1
+    assert stats.read_seconds >= 0.02
+
+
+def test_disabled_stats_are_not_touched(mocker: MockerFixture):
+    perf_counter = mocker.spy(pidstat.time, "perf_counter")
+    with StatFileCache() as cache:
+        assert cache.load_process(os.getpid()) is not None
+        assert cache.load_system() is not None
+    assert perf_counter.call_count == 0
+
+
+def test_cpu_times_and_report():
+    stats = SelfStats()
+    # 自分自身のCPU時間が増えるまで計算する
+    end = os.times().elapsed + 0.05
+    while os.times().elapsed < end:
+        pass
+    user, system = stats.cpu_times()
+    assert user + system >= 0.0
+    stats.record_tick(0.01, 0.001)
+    lines = stats.report()
+    assert len(lines) == len(SelfStats.PHASES) + 2
+    assert lines[-1].startswith("cpu: user")
+
+
+def test_self_stats_argument():
+    parser = define_argument_parser()
+    assert parser.parse_args(["1", "--self-stats"]).self_stats
+    assert not parser.parse_args(["1"]).self_stats
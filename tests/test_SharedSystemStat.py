@@ -0,0 +1,70 @@
+from pytest_mock import MockerFixture
+import asyncio
+import os
+
+from pidstat import SharedSystemStat, SystemStatFile, Sampler, TickScheduler
+from pidstat import measure_process_stat_async, measure_cpu_usage_percent_async
+from pidstat import measure_processor_usages_percent_async, iter_samples_async
+
+
+def test_load_is_shared_within_max_age(mocker: MockerFixture):
+    load = mocker.spy(SystemStatFile, "load")
+    shared = SharedSystemStat(max_age=60.0)
+    system_stat = shared.load()
+    assert system_stat is not None
+    assert shared.load() is system_stat
+    assert load.call_count == 1
+
+
+def test_load_again_after_max_age(mocker: MockerFixture):
+    load = mocker.spy(SystemStatFile, "load")
+    shared = SharedSystemStat(max_age=0.0)
+    shared.load()
+    shared.load()
+    assert load.call_count == 2
+
+
+def test_concurrent_monitors_share_snapshot(mocker: MockerFixture):
+    load = mocker.spy(SystemStatFile, "load")
+    shared = SharedSystemStat(max_age=0.05)
+
+    async def run():
+        return await asyncio.gather(
+            *[measure_process_stat_async(os.getpid(), 0.1, shared) for _ in range(10)]
+        )
+
+    results = asyncio.run(run())
+    assert all(result is not None and result.pid == os.getpid() for result in results)
+    # t1 と t2 で1回ずつ
+    assert load.call_count == 2
+
+
+def test_measure_system_async():
+    async def run():
+        return await asyncio.gather(
+            measure_cpu_usage_percent_async(0.05, SharedSystemStat()),
+            measure_processor_usages_percent_async(0.05, SharedSystemStat()),
+        )
+
+    usage, processor_usages = asyncio.run(run())
+    assert usage is not None
+    assert processor_usages is not None
+    assert len(processor_usages) > 0
+
+
+def test_tick_scheduler_async_iteration():
+    async def run():
+        return [tick async for tick in TickScheduler(0.01, count=3)]
+
+    assert asyncio.run(run()) == [1, 2, 3]
+
+
+def test_iter_samples_async():
+    sampler = Sampler([os.getpid()], shared_system=SharedSystemStat())
+
+    async def run():
+        return [results async for results in iter_samples_async(sampler, 0.02, count=2)]
+
+    batches = asyncio.run(run())
+    assert len(batches) == 2
+    assert all(os.getpid() in results for results in batches)
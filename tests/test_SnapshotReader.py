@@ -0,0 +1,110 @@
+import os
+import threading
+
+import pytest
+
+from pidstat import SnapshotPublisher, SnapshotReader, SystemStat, SystemCpuTime
+from pidstat import SHM_SEQUENCE, _SHM_SEQUENCE_OFFSET, define_argument_parser
+from tests.define_test_measurement_result import make_result
+
+
+def make_system_stat(busy: int, idle: int, timestamp: float, num_cpus: int = 2) -> SystemStat:
+    stat = SystemStat()
+    stat.timestamp = timestamp
+    for _ in range(num_cpus):
+        cpu_time = SystemCpuTime()
+        cpu_time.user = busy
+        cpu_time.idle = idle
+        stat.processor_times.append(cpu_time)
+    return stat
+
+
+@pytest.fixture
+def publisher():
+    with SnapshotPublisher(f"pidstat_test_{os.getpid()}", capacity=4, num_cpus=2) as p:
+        yield p
+
+
+def test_round_trip(publisher: SnapshotPublisher):
+    with SnapshotReader(publisher.name) as reader:
+        assert (reader.capacity, reader.num_cpus) == (4, 2)
+        # まだ書き込まれていない
+        assert reader.read() is None
+        publisher.publish({}, make_system_stat(0, 0, 1.0), None)
+        publisher.publish(
+            {2: make_result(2, 25.0, 8192), 1: make_result(1, 12.5)}, make_system_stat(50, 150, 2.0), 30.0
+        )
+        snapshot = reader.read()
+    assert snapshot is not None
+    assert snapshot.sequence == 2
+    assert snapshot.timestamp == 2.0
+    assert snapshot.system_usage_percent == 30.0
+    assert snapshot.processor_usages == [25.0, 25.0]
+    assert sorted(snapshot.results) == [1, 2]
+    assert snapshot.results[2].usage_percent == 25.0
+    assert snapshot.results[2].rss == 8192
+    assert snapshot.results[2].timestamp == 2.0
+
+
+def test_capacity_limits_published_pids(publisher: SnapshotPublisher):
+    results = {pid: make_result(pid, float(pid)) for pid in range(10, 0, -1)}
+    publisher.publish(results, make_system_stat(0, 0, 1.0), None)
+    with SnapshotReader(publisher.name) as reader:
+        snapshot = reader.read()
+    assert snapshot is not None
+    assert sorted(snapshot.results) == [1, 2, 3, 4]
+    assert snapshot.total == 10
+
+
+def test_torn_write_is_not_returned(publisher: SnapshotPublisher):
+    publisher.publish({1: make_result(1, 1.0)}, make_system_stat(0, 0, 1.0), None)
+    with SnapshotReader(publisher.name, max_retries=10) as reader:
+        # 書き込み中(奇数)のまま止まった状態
+        SHM_SEQUENCE.pack_into(publisher._buffer, _SHM_SEQUENCE_OFFSET, 3)
+        assert reader.read() is None
+
+
+def test_concurrent_reads_are_consistent(publisher: SnapshotPublisher):
+    stop = threading.Event()
+
+    def write():
+        tick = 0
+        while not stop.is_set():
+            tick += 1
+            # 1回の書き込みでは全PIDが同じ値になる
+            results = {pid: make_result(pid, float(tick), tick) for pid in range(1, 5)}
+            publisher.publish(results, make_system_stat(tick, tick, float(tick)), float(tick))
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        with SnapshotReader(publisher.name) as reader:
+            snapshots = 0
+            for _ in range(2000):
+                snapshot = reader.read()
+                if snapshot is None:
+                    continue
+                snapshots += 1
+                assert {result.usage_percent for result in snapshot.results.values()} == {snapshot.timestamp}
+                assert {result.rss for result in snapshot.results.values()} == {int(snapshot.timestamp)}
+    finally:
+        stop.set()
+        writer.join()
+    assert snapshots > 0
+
+
+def test_not_a_snapshot():
+    from multiprocessing import shared_memory
+    shm = shared_memory.SharedMemory(f"pidstat_other_{os.getpid()}", create=True, size=64)
+    try:
+        with pytest.raises(ValueError):
+            SnapshotReader(shm.name)
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def test_shm_arguments():
+    parser = define_argument_parser()
+    args = parser.parse_args(["-p", "ALL", "--shm", "pidstat"])
+    assert (args.shm, args.shm_capacity) == ("pidstat", 4096)
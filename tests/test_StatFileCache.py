@@ -0,0 +1,104 @@
+from pytest_mock import MockerFixture
+import os
+
+from pidstat import StatFileCache, PidStatFile, SystemStatFile, Sampler
+from pidstat import STAT_FIELD_STATE, STAT_FIELD_START_TIME
+
+
+def test_load_process():
+    pid = os.getpid()
+    with StatFileCache() as cache:
+        process_stat = cache.load_process(pid)
+        expected = PidStatFile.load(pid)
+    assert process_stat is not None
+    assert expected is not None
+    assert process_stat.basic == expected.basic
+    assert process_stat.resource.start_time == expected.resource.start_time
+
+
+def test_file_is_kept_open(mocker: MockerFixture):
+    open_spy = mocker.spy(os, "open")
+    with StatFileCache() as cache:
+        for _ in range(5):
+            assert cache.load_process(os.getpid()) is not None
+        assert len(cache) == 1
+    assert open_spy.call_count == 1
+
+
+def test_reopen_when_start_time_changes(mocker: MockerFixture):
+    open_spy = mocker.spy(os, "open")
+    with StatFileCache() as cache:
+        assert cache.load_process(os.getpid()) is not None
+        # PIDが再利用されたように見せかける
+        cache._files[os.getpid()].start_time = -1
+        assert cache.load_process(os.getpid()) is not None
+        assert len(cache) == 1
+    assert open_spy.call_count == 2
+
+
+def test_lru_limits_open_files():
+    pids = [os.getpid(), os.getppid(), 1]
+    with StatFileCache(max_files=2) as cache:
+        for pid in pids:
+            assert cache.load_process(pid) is not None
+        assert len(cache) == 2
+        # 最も長く使われていない最初のPIDが閉じられている
+        assert os.getpid() not in cache._files
+
+
+def test_load_non_existent_process(capsys):
+    with StatFileCache() as cache:
+        assert cache.load_process(-1, quiet=True) is None
+        assert len(cache) == 0
+    assert capsys.readouterr().out == ""
+
+
+def test_load_system():
+    with StatFileCache() as cache:
+        system_stat1 = cache.load_system()
+        system_stat2 = cache.load_system()
+    expected = SystemStatFile.load()
+    assert system_stat1 is not None
+    assert system_stat2 is not None
+    assert expected is not None
+    assert len(system_stat2.processor_times) == len(expected.processor_times)
+
+
+def test_buffer_grows_for_large_files():
+    with StatFileCache() as cache:
+        cache._system_buffer = bytearray(8)
+        system_stat = cache.load_system()
+    assert system_stat is not None
+    assert system_stat.cpu_time.total > 0
+
+
+def test_sampler_with_cache():
+    with StatFileCache() as cache:
+        sampler = Sampler([os.getpid()], cache)
+        sampler.sample()
+        assert os.getpid() in sampler.sample()
+        sampler.remove_pid(os.getpid())
+        assert len(cache) == 0
+
+
+def test_load_fields(mocker: MockerFixture):
+    open_spy = mocker.spy(os, "open")
+    expected = PidStatFile.load(os.getpid())
+    assert expected is not None
+    with StatFileCache() as cache:
+        for _ in range(3):
+            values = cache.load_fields(os.getpid(), [STAT_FIELD_STATE, STAT_FIELD_START_TIME])
+            assert values == ("R", expected.resource.start_time)
+        assert cache.load_fields(-1, [STAT_FIELD_STATE], quiet=True) is None
+    assert open_spy.call_count == 2
+
+
+def test_load_system_cpu_only():
+    with StatFileCache() as cache:
+        full = cache.load_system()
+        cpu_only = cache.load_system(cpu_only=True)
+    assert full is not None
+    assert cpu_only is not None
+    assert full.ctxt > 0
+    assert cpu_only.ctxt == 0
+    assert len(cpu_only.processor_times) == len(full.processor_times)
@@ -4,6 +4,7 @@ import os
 
 from pidstat import SystemStatFile
 from pidstat import SystemStat, SystemCpuTime
+from pidstat import _calc_processor_usages_percent, processor_times_matrix, compute_processor_usages
 from tests.define_test_sys_stat_object import get_expected_sys_stat
 
 def read_test_file():
@@ -44,6 +45,28 @@ def test_parse(mocker: MockerFixture):
     assert system_stat.processor_times == expected.processor_times
     assert system_stat == expected
 
+def test_parse_intr_and_softirq():
+    lines = read_test_file().splitlines()
+    system_stat = SystemStatFile._parse(lines)
+    assert system_stat is not None
+    assert system_stat._intr is None
+    assert system_stat.intr[0] == 3568617
+    assert system_stat.intr[26] == 1314
+    assert system_stat.softirq == [4394445, 0, 368220, 1, 1568246, 0, 0, 187206, 1124990, 712, 1145070]
+
+
+def test_parse_cpu_only():
+    lines = read_test_file().splitlines()
+    system_stat = SystemStatFile._parse(lines, cpu_only=True)
+    assert system_stat is not None
+    expected = get_expected_sys_stat()
+    assert system_stat.cpu_time == expected.cpu_time
+    assert system_stat.processor_times == expected.processor_times
+    # cpu の行より後は解析されない
+    assert system_stat.ctxt == 0
+    assert system_stat.intr == []
+
+
 def test_load_file(mocker: MockerFixture):
     system_stat = SystemStatFile.load()
     assert system_stat is not None
@@ -54,3 +77,60 @@ def test_load_file_invalid(mocker: MockerFixture):
     assert system_stat is None
 
 
+
+
+def make_cpu_time(*values: int) -> SystemCpuTime:
+    cpu_time = SystemCpuTime()
+    (cpu_time.user, cpu_time.nice, cpu_time.system, cpu_time.idle, cpu_time.iowait,
+     cpu_time.irq, cpu_time.softirq, cpu_time.steal, cpu_time.guest, cpu_time.guest_nice) = values
+    return cpu_time
+
+
+def make_sys_stat(*processors: SystemCpuTime) -> SystemStat:
+    stat = SystemStat()
+    stat.processor_times = list(processors)
+    return stat
+
+
+def test_calc_processor_usages_percent():
+    stat1 = make_sys_stat(make_cpu_time(0, 0, 0, 0, 0, 0, 0, 0, 0, 0), make_cpu_time(0, 0, 0, 0, 0, 0, 0, 0, 0, 0))
+    stat2 = make_sys_stat(make_cpu_time(30, 0, 10, 60, 0, 0, 0, 0, 0, 0), make_cpu_time(0, 0, 0, 0, 0, 0, 0, 0, 0, 0))
+    assert _calc_processor_usages_percent(stat1, stat2) == [40.0, 0.0]
+
+
+def test_processor_times_matrix():
+    np = pytest.importorskip("numpy")
+    lines = read_test_file().splitlines()
+    expected = get_expected_sys_stat()
+    matrix = processor_times_matrix(lines)
+    assert matrix.shape == (20, 10)
+    assert matrix.dtype == np.int64
+    assert (matrix == processor_times_matrix(expected)).all()
+    assert matrix[19, 0] == 2724
+    assert matrix[19, 6] == 314
+
+
+def test_compute_processor_usages_matches_python():
+    pytest.importorskip("numpy")
+    stat1 = make_sys_stat(make_cpu_time(10, 1, 5, 100, 2, 0, 1, 0, 0, 0), make_cpu_time(0, 0, 0, 0, 0, 0, 0, 0, 0, 0))
+    stat2 = make_sys_stat(make_cpu_time(40, 1, 15, 150, 6, 0, 3, 4, 0, 0), make_cpu_time(0, 0, 0, 0, 0, 0, 0, 0, 0, 0))
+    usages = compute_processor_usages(processor_times_matrix(stat1), processor_times_matrix(stat2))
+    assert usages["busy"].tolist() == pytest.approx(_calc_processor_usages_percent(stat1, stat2))
+    # 変化量が0のCPUは0%
+    assert usages["user"].tolist() == pytest.approx([30.0, 0.0])
+    assert usages["system"].tolist() == pytest.approx([10.0, 0.0])
+    assert usages["iowait"].tolist() == pytest.approx([4.0, 0.0])
+    assert usages["steal"].tolist() == pytest.approx([4.0, 0.0])
+    assert usages["idle"].tolist() == pytest.approx([50.0, 0.0])
+
+
+def test_compute_processor_usages_for_stack():
+    np = pytest.importorskip("numpy")
+    snapshots = np.zeros((4, 3, 10), dtype=np.int64)
+    for t in range(4):
+        snapshots[t, :, 0] = t * 10  # user
+        snapshots[t, :, 3] = t * 30  # idle
+    usages = compute_processor_usages(snapshots)
+    assert usages["user"].shape == (3, 3)
+    assert np.allclose(usages["user"], 25.0)
+    assert np.allclose(usages["busy"], 25.0)
@@ -0,0 +1,76 @@
+from pytest_mock import MockerFixture
+import os
+import threading
+
+from pidstat import ThreadSampler, StatFileCache, PidStatFile, SystemStatFile
+from pidstat import list_tids, create_sampler, define_argument_parser
+from tests.test_Sampler import make_process_stat, make_system_stat
+
+
+def test_list_tids():
+    event = threading.Event()
+    thread = threading.Thread(target=event.wait)
+    thread.start()
+    try:
+        tids = list_tids(os.getpid())
+        assert os.getpid() in tids
+        assert thread.native_id in tids
+    finally:
+        event.set()
+        thread.join()
+    assert list_tids(-1) == []
+
+
+def test_load_task():
+    thread_stat = PidStatFile.load_task(os.getpid(), threading.get_native_id())
+    assert thread_stat is not None
+    assert thread_stat.basic.pid == threading.get_native_id()
+    assert PidStatFile.load_task(os.getpid(), -1, quiet=True) is None
+
+
+def test_threads_appear_and_exit(mocker: MockerFixture):
+    mocker.patch.object(SystemStatFile, "load", side_effect=lambda cpu_only=False: make_system_stat(0, 0))
+    load_task = mocker.patch.object(
+        PidStatFile, "load_task",
+        side_effect=lambda pid, tid, quiet=False: make_process_stat(tid, 0, 0),
+    )
+    list_tids_mock = mocker.patch(
+        "pidstat.list_tids",
+        side_effect=[[10, 11], [10, 11, 12], [10, 12]],
+    )
+    sampler = ThreadSampler([10])
+
+    assert sampler.sample() == {}
+    results = sampler.sample()
+    assert sorted(results) == [10, 11]
+    assert all(result.tgid == 10 for result in results.values())
+    assert sorted(sampler.sample()) == [10, 12]
+    assert sorted(sampler._prev_processes) == [10, 12]
+    # 1 tick につき task ディレクトリの列挙は1回
+    assert list_tids_mock.call_count == 3
+    load_task.assert_called_with(10, 12, quiet=True)
+
+
+def test_sample_real_threads():
+    event = threading.Event()
+    thread = threading.Thread(target=event.wait)
+    thread.start()
+    try:
+        with StatFileCache() as cache:
+            sampler = ThreadSampler([os.getpid()], cache)
+            sampler.sample()
+            results = sampler.sample()
+    finally:
+        event.set()
+        thread.join()
+    assert thread.native_id in results
+    assert results[thread.native_id].tgid == os.getpid()
+
+
+def test_create_thread_sampler():
+    parser = define_argument_parser()
+    sampler = create_sampler(parser.parse_args(["-t", "1"]))
+    assert isinstance(sampler, ThreadSampler)
+    sampler = create_sampler(parser.parse_args(["-t", "-p", "ALL"]))
+    assert isinstance(sampler, ThreadSampler)
+    assert sampler.all_processes
@@ -0,0 +1,80 @@
+import pytest
+from pytest_mock import MockerFixture
+
+from pidstat import TickScheduler, define_argument_parser
+
+
+class FakeClock:
+    """time.monotonic / time.sleep の代わりに使う時計"""
+
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(mocker: MockerFixture) -> FakeClock:
+    fake = FakeClock()
+    mocker.patch("pidstat.time.monotonic", side_effect=fake.monotonic)
+    mocker.patch("pidstat.time.sleep", side_effect=fake.sleep)
+    return fake
+
+
+def test_count_limits_ticks(clock: FakeClock):
+    scheduler = TickScheduler(1.0, count=3)
+    assert list(scheduler) == [1, 2, 3]
+    assert clock.now == pytest.approx(103.0)
+
+
+def test_work_time_does_not_drift(clock: FakeClock):
+    scheduler = TickScheduler(1.0, count=5)
+    times = []
+    for _ in scheduler:
+        times.append(clock.now)
+        # 読み込みと表示に時間がかかっても次の締め切りは変わらない
+        clock.now += 0.3
+    assert times == pytest.approx([101.0, 102.0, 103.0, 104.0, 105.0])
+    assert clock.sleeps == pytest.approx([1.0, 0.7, 0.7, 0.7, 0.7])
+    assert scheduler.missed == 0
+
+
+def test_missed_deadlines_are_counted_and_skipped(clock: FakeClock):
+    scheduler = TickScheduler(0.5, count=3)
+    times = []
+    for tick in scheduler:
+        times.append(clock.now)
+        if tick == 1:
+            # 締め切りを 2.2 間隔分過ぎてしまう
+            clock.now += 1.6
+    assert scheduler.missed == 2
+    # 遅れた tick はすぐに実行し、その次からは元の格子に戻る
+    assert times == pytest.approx([100.5, 102.1, 102.5])
+
+
+def test_short_interval(clock: FakeClock):
+    scheduler = TickScheduler(0.01, count=100)
+    assert len(list(scheduler)) == 100
+    assert clock.now == pytest.approx(101.0)
+
+
+def test_invalid_interval():
+    with pytest.raises(ValueError):
+        TickScheduler(0.001)
+    with pytest.raises(ValueError):
+        TickScheduler(1.0, count=0)
+
+
+def test_interval_and_count_arguments():
+    parser = define_argument_parser()
+    args = parser.parse_args(["1", "-i", "0.5", "-c", "10"])
+    assert args.interval == 0.5
+    assert args.count == 10
+    with pytest.raises(SystemExit):
+        parser.parse_args(["1", "-i", "0.001"])
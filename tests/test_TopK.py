@@ -0,0 +1,73 @@
+from pytest_mock import MockerFixture
+import random
+import pytest
+
+from pidstat import TopK, AllProcessSampler, PidStatFile, SystemStatFile
+from pidstat import define_argument_parser
+from tests.test_Sampler import make_process_stat, make_system_stat
+from tests.define_test_measurement_result import make_result
+
+
+def test_keeps_k_largest():
+    rng = random.Random(0)
+    results = [make_result(pid, rng.random() * 100) for pid in range(1000)]
+    top = TopK(5)
+    for result in results:
+        top.push(result)
+    expected = sorted(results, key=lambda r: r.usage_percent, reverse=True)[:5]
+    assert [r.pid for r in top.items()] == [r.pid for r in expected]
+    assert len(top) == 5
+
+
+def test_ties_and_fewer_than_k():
+    top = TopK(3)
+    for pid in range(2):
+        top.push(make_result(pid, 0.0))
+    assert sorted(r.pid for r in top.items()) == [0, 1]
+    top.clear()
+    assert top.items() == []
+
+
+def test_sort_key():
+    top = TopK(1, "rss")
+    top.push(make_result(1, 90.0, rss=10))
+    top.push(make_result(2, 10.0, rss=20))
+    assert [r.pid for r in top.items()] == [2]
+    with pytest.raises(ValueError):
+        TopK(1, "unknown")
+    with pytest.raises(ValueError):
+        TopK(0)
+
+
+def test_sampler_selects_top_each_tick(mocker: MockerFixture):
+    mocker.patch.object(
+        SystemStatFile, "load",
+        side_effect=[make_system_stat(0, 0), make_system_stat(100, 0), make_system_stat(200, 0)],
+    )
+    usage = {1: [0, 10, 20], 2: [0, 30, 35], 3: [0, 20, 60]}
+    ticks = {1: 0, 2: 0, 3: 0}
+
+    def load(pid: int, quiet: bool = False):
+        stat = make_process_stat(pid, usage[pid][ticks[pid]], 0)
+        ticks[pid] += 1
+        return stat
+
+    mocker.patch.object(PidStatFile, "load", side_effect=load)
+    mocker.patch("pidstat.list_pids", return_value=[1, 2, 3])
+    sampler = AllProcessSampler()
+    sampler.top = TopK(2)
+    sampler.sample()
+    results = sampler.sample()
+    # 結果は全PID分を返し、上位は別に選ぶ
+    assert len(results) == 3
+    assert [r.pid for r in sampler.top.items()] == [2, 3]
+    sampler.sample()
+    assert [r.pid for r in sampler.top.items()] == [3, 1]
+
+
+def test_arguments():
+    parser = define_argument_parser()
+    args = parser.parse_args(["-p", "ALL", "--top", "10", "--sort", "majflt"])
+    assert (args.top, args.sort) == (10, "majflt")
+    with pytest.raises(SystemExit):
+        parser.parse_args(["-p", "ALL", "--top", "0"])